@@ -0,0 +1,7 @@
+"""
+Code shared by the crawler and the extractor - installed into both environments (pip install ./common)
+instead of being copied, so the two sides can never read the same files differently.
+
+- page_store - the segmented, compressed page store written by the crawler and read by the extractor
+- fields - the product fields (ExtractRegex) and extraction engines of the extractor, used inline by the crawler
+"""
@@ -0,0 +1,106 @@
+"""
+Product fields of an Open Food Facts page - the ExtractRegex patterns, their cleanup and the two extraction
+engines. The extractor writes its datasets with them and the crawler's inline pipeline extracts the same columns.
+"""
+import re
+from enum import Enum
+from loguru import logger
+from unidecode import unidecode
+
+# Bump on any change of the fields or their cleanup - pages extracted by another version are extracted again
+EXTRACTOR_VERSION = 1
+
+class ExtractRegex(Enum):
+    
+    # [\s\S]*?
+
+    TAG: re.Pattern = re.compile(r'<[^>]*>')
+    #END_TAG: re.Pattern = re.compile(r'</[^>]*>')
+    
+    PRODUCT_NAME: re.Pattern = re.compile(r'<h2\s+class=\"title-1\"\s+property=\"food:name\"\s+itemprop=\"name\">[\s\S]*?</h2>')
+    
+    BRANDS: re.Pattern = re.compile(r'<span\s+class=\"field_value\"\s+id=\"field_brands_value\">[\s\S]*?</span>')
+    
+    PACKAGING: re.Pattern = re.compile(r'<span\s+class=\"field_value\"\s+id=\"field_packaging_value\">[\s\S]*?</span>')
+    
+    CATEGORIES: re.Pattern = re.compile(r'<span\s+class=\"field_value\"\s+id=\"field_categories_value\">[\s\S]*?</span>')
+    
+    STORES: re.Pattern = re.compile(r'<span\s+class=\"field_value\"\s+id=\"field_stores_value\">[\s\S]*?</span>')
+    
+    COUNTRIES_WHERE_SOLD: re.Pattern = re.compile(r'<span\s+class=\"field_value\"\s+id=\"field_countries_value\">[\s\S]*?</span>')
+    
+    NUTRI_SCORE: re.Pattern = re.compile(r'<a\s+href=\"#panel_nutriscore_[0-9]{1,4}\"\s+onclick=\"[\s\S]*?\">[\s\S]*?</a>')  # TODO LOOK INTO THIS
+    
+    NOVA_SCORE: re.Pattern = re.compile(r'<a\s+href=\"#panel_nova\"\s+onclick=\"[\s\S]*?\">[\s\S]*?</a>')
+    
+    ECO_SCORE: re.Pattern = re.compile(r'<a\s+href=\"#panel_ecoscore\"\s+onclick=\"[\s\S]*?\">[\s\S]*?</a>')
+    
+    INGREDIENTS: re.Pattern = re.compile(r'<div\s+id=\"panel_ingredients_content\"\s+class=\"content\s+panel_content\s+active\s+expand-for-large\">[\s\S]*?</div>')
+    
+    ALLERGENS: re.Pattern = re.compile(r'(?<=Allergens:)</strong>[\s\S]*?</div>')
+    
+    TRACES: re.Pattern = re.compile(r'(?<=Traces:)</strong>[\s\S]*?</div>')
+    
+    ADDITIVES: re.Pattern = re.compile(r'<a\s+href=\"#panel_additive[\s\S]*?\"[\s\S]*?>[\s\S]*?</h4>')
+    
+    ADDITIVES_ANALYSIS: re.Pattern = re.compile(r'<a\s+href=\"#panel_ingredients_analysis(?!.*_details_content)[^\"]*?\"[^\>]*?>[\s\S]*?</h4>')
+    
+
+# Start of every ExtractRegex field (up to its first lazy span) in one pattern, the named group tells which field it is.
+# All of them begin with their only '<' and share it as the literal prefix, so one scan of the page finds the
+# candidate starts of every field without two of them ever overlapping. Allergens / Traces check their label behind.
+FIELD_ANCHOR: re.Pattern = re.compile(
+    r'<(?:(?P<PRODUCT_NAME>h2\s+class="title-1"\s+property="food:name"\s+itemprop="name">)'
+    r'|span\s+class="field_value"\s+id="field_(?:(?P<BRANDS>brands)|(?P<PACKAGING>packaging)|(?P<CATEGORIES>categories)|(?P<STORES>stores)|(?P<COUNTRIES_WHERE_SOLD>countries))_value">'
+    r'|a\s+href="#panel_(?:(?P<NUTRI_SCORE>nutriscore_[0-9]{1,4}"\s+onclick=")|(?P<NOVA_SCORE>nova"\s+onclick=")|(?P<ECO_SCORE>ecoscore"\s+onclick=")|(?P<ADDITIVES>additive)|(?P<ADDITIVES_ANALYSIS>ingredients_analysis))'
+    r'|(?P<INGREDIENTS>div\s+id="panel_ingredients_content"\s+class="content\s+panel_content\s+active\s+expand-for-large">)'
+    r'|/strong>(?:(?<=Allergens:</strong>)(?P<ALLERGENS>)|(?<=Traces:</strong>)(?P<TRACES>)))'
+)
+MULTIPLE_SPACES: re.Pattern = re.compile(r'\s{2,}')
+
+def extract_info(html: str):
+    #logger.info("Starting information extraction from HTML")
+    extracted_info = {}
+    for regex in ExtractRegex:
+        if regex == ExtractRegex.TAG:
+            continue
+        
+        matches = regex.value.findall(html)
+        if matches:
+            extracted_info[regex.name] = clean_matches(matches)
+            logger.debug(f"Extracted {len(matches)} items for {regex.name}")
+        else:
+            extracted_info[regex.name] = ''
+            logger.debug(f"No matches found for {regex.name}")
+    return extracted_info
+
+def clean_matches(matches: list) -> str:
+    _extracted = [ExtractRegex.TAG.value.sub(' ', match).strip() for match in matches] # CLEAR ALL HTML TAGS + Strip (only deletes whitespaces before and after) and merge to one sentence
+    _extracted_text = unidecode(' '.join(_extracted).replace('&nbsp;', ' ').replace('\n', ''))
+   # _extracted_text = re.sub(r'[^A-Za-z0-9]', ' ', extracted_text).lower()
+
+    return MULTIPLE_SPACES.sub(' ', _extracted_text)
+
+def extract_info_single_pass(html: str):
+    """
+    Same result as extract_info with one scan of the page - FIELD_ANCHOR finds the start candidates of all fields,
+    dispatched by the matched group name, and only there the full field pattern is tried. A candidate inside the
+    previous match of the same field is skipped, exactly like the non-overlapping findall.
+    """
+    matches = {regex.name: [] for regex in ExtractRegex if regex != ExtractRegex.TAG}
+    match_ends = dict.fromkeys(matches, 0)
+    for anchor in FIELD_ANCHOR.finditer(html):
+        name = anchor.lastgroup
+        start = anchor.start()
+        if start < match_ends[name]:
+            continue
+        match = ExtractRegex[name].value.match(html, start)
+        if match:
+            matches[name].append(match.group())
+            match_ends[name] = match.end()
+    return {name: clean_matches(field_matches) if field_matches else '' for name, field_matches in matches.items()}
+
+EXTRACT_ENGINES = {'regex': extract_info, 'single-pass': extract_info_single_pass}
+
+# Columns of the merged output, in ExtractRegex order
+COLUMNS = [regex.name for regex in ExtractRegex if regex != ExtractRegex.TAG] + ['LINK']
@@ -0,0 +1,140 @@
+import os
+import gzip
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+SEGMENT_EXTENSIONS = {'gzip': 'gz', 'zstd': 'zst'}
+INDEX_FILE = 'index.tsv'
+
+
+def _compressor(compression: str):
+    if compression == 'gzip':
+        return lambda data: gzip.compress(data, compresslevel=6)
+    if compression == 'zstd':
+        if zstandard is None:
+            raise ImportError("zstd page store needs the 'zstandard' package (pip install zstandard)")
+        return zstandard.ZstdCompressor(level=3).compress
+    raise ValueError("Invalid page store compression. Choose 'gzip' or 'zstd'.")
+
+
+def _decompressor(segment: str):
+    if segment.endswith('.gz'):
+        return gzip.decompress
+    if segment.endswith('.zst'):
+        if zstandard is None:
+            raise ImportError(f"Reading {segment} needs the 'zstandard' package (pip install zstandard)")
+        return zstandard.ZstdDecompressor().decompress
+    raise ValueError(f"Unknown page store segment: {segment}")
+
+
+class PageStoreWriter:
+    """
+    WARC-like page store - pages are appended to large segment files, every page compressed as its own
+    gzip member / zstd frame, and `index.tsv` maps url_hash -> (segment, offset, length, url).
+
+    Each start opens a new segment, so bytes of a record written right before a crash are never referenced
+    (the index line is written only after the record is flushed).
+    """
+
+    def __init__(self, directory: str = 'data', compression: str = 'gzip', segment_size: int = 1024 ** 3):
+        self.directory = directory
+        self.compression = compression
+        self.compress = _compressor(compression)
+        self.segment_size = segment_size
+        os.makedirs(directory, exist_ok=True)
+
+        self.hashes: set = set()
+        index_path = os.path.join(directory, INDEX_FILE)
+        if os.path.exists(index_path):
+            with open(index_path, 'r', encoding='utf-8') as f:
+                self.hashes = {line.split('\t', 1)[0] for line in f}
+        self.segment_number: int = sum(1 for f in os.listdir(directory) if f.startswith('segment-'))
+
+        self.index = open(index_path, 'a', encoding='utf-8')
+        self.segment = None
+        self.segment_name: str = None
+        self._open_segment()
+
+    def _open_segment(self):
+        if self.segment is not None:
+            self.segment.close()
+        self.segment_name = f"segment-{self.segment_number:05d}.{SEGMENT_EXTENSIONS[self.compression]}"
+        self.segment = open(os.path.join(self.directory, self.segment_name), 'ab')
+        self.segment_number += 1
+
+    def __contains__(self, url_hash: str) -> bool:
+        return url_hash in self.hashes
+
+    def __len__(self):
+        return len(self.hashes)
+
+    def write(self, url_hash: str, url: str, html: str) -> int:
+        """Appends one page and returns the number of compressed bytes written."""
+        if self.segment.tell() >= self.segment_size:
+            self._open_segment()
+
+        record = self.compress(html.encode('utf-8'))
+        offset = self.segment.tell()
+        self.segment.write(record)
+        self.segment.flush()
+
+        self.index.write(f"{url_hash}\t{self.segment_name}\t{offset}\t{len(record)}\t{url}\n")
+        self.index.flush()
+        self.hashes.add(url_hash)
+        return len(record)
+
+    def close(self):
+        self.segment.close()
+        self.index.close()
+
+
+class PageStoreReader:
+    """Reads a PageStoreWriter directory - sequentially segment by segment, or randomly by url_hash."""
+
+    def __init__(self, directory: str = 'data'):
+        self.directory = directory
+        self.entries: dict = {}  # url_hash -> (segment, offset, length, url)
+        with open(os.path.join(directory, INDEX_FILE), 'r', encoding='utf-8') as f:
+            for line in f:
+                url_hash, segment, offset, length, url = line.rstrip('\n').split('\t', 4)
+                self.entries[url_hash] = (segment, int(offset), int(length), url)
+
+    def __contains__(self, url_hash: str) -> bool:
+        return url_hash in self.entries
+
+    def __len__(self):
+        return len(self.entries)
+
+    def url(self, url_hash: str) -> str:
+        return self.entries[url_hash][3]
+
+    def get(self, url_hash: str) -> str:
+        segment, offset, length, _ = self.entries[url_hash]
+        with open(os.path.join(self.directory, segment), 'rb') as f:
+            f.seek(offset)
+            return _decompressor(segment)(f.read(length)).decode('utf-8')
+
+    def __iter__(self):
+        return self.pages()
+
+    def pages(self, url_hashes=None):
+        """Yields (url_hash, html) in storage order, reading every segment front to back once - only `url_hashes` when given."""
+        records = sorted(((url_hash, entry) for url_hash, entry in self.entries.items() if url_hashes is None or url_hash in url_hashes),
+                         key=lambda item: (item[1][0], item[1][1]))
+        segment_file, current_segment, decompress = None, None, None
+        try:
+            for url_hash, (segment, offset, length, _) in records:
+                if segment != current_segment:
+                    if segment_file is not None:
+                        segment_file.close()
+                    segment_file = open(os.path.join(self.directory, segment), 'rb')
+                    current_segment, decompress = segment, _decompressor(segment)
+                segment_file.seek(offset)
+                yield url_hash, decompress(segment_file.read(length)).decode('utf-8')
+        finally:
+            if segment_file is not None:
+                segment_file.close()
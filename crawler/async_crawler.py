@@ -0,0 +1,189 @@
+import asyncio
+import time
+import os
+import argparse
+from datetime import datetime, timedelta, timezone
+from urllib.parse import urlsplit
+
+import aiohttp
+from selenium.common.exceptions import WebDriverException
+
+from main import Crawler, CrawlWorker, logger
+from politeness import HostScheduler, parse_retry_after
+
+
+class AsyncCrawler(Crawler):
+    """
+    asyncio alternative to the blocking crawl loop - keeps up to `concurrency` fetches in flight while every
+    host is paced by its own AIMD controlled token bucket (see politeness.HostScheduler).
+    Pages missing the server-rendered content are rendered by a single browser worker when a driver is configured.
+    """
+
+    def __init__(self, concurrency=100, min_delay=0.5, **kwargs):
+        super().__init__(**kwargs)
+        self.concurrency: int = concurrency
+        self.min_delay: float = min_delay
+        self.scheduler: HostScheduler = None
+        self.browser_lock: asyncio.Lock = None
+        self.in_flight: int = 0
+        self.max_in_flight: int = 0
+        self.crawl_started: float = time.monotonic()
+
+    def crawl(self):
+        self.workers = [CrawlWorker(self, 0)] if self.driver_type else []
+        logger.info(f"Crawling asynchronously | Concurrency: {self.concurrency} | Browser fallback: {self.driver_type}")
+        asyncio.run(self._crawl())
+
+    async def _crawl(self):
+        # Created here so the restored crawl_delay from load_state is the starting rate
+        self.scheduler = HostScheduler(self.crawl_delay, min_delay=self.min_delay)
+        self.browser_lock = asyncio.Lock()
+        self.crawl_started = time.monotonic()
+
+        connector = aiohttp.TCPConnector(limit=self.concurrency)
+        timeout = aiohttp.ClientTimeout(total=15)
+        async with aiohttp.ClientSession(headers=self.headers, connector=connector, timeout=timeout) as session:
+            await asyncio.gather(*(self._worker(session) for _ in range(self.concurrency)))
+
+    async def _worker(self, session: aiohttp.ClientSession):
+        while not self.stop_event.is_set():
+            entry = self._next_url()
+            if entry is None:
+                return
+            if entry is False:
+                await asyncio.sleep(0.2)
+                continue
+
+            url, retry_count = entry
+            try:
+                await self._crawl_url(session, url, retry_count)
+            finally:
+                with self.state_lock:
+                    self.in_progress.discard(url)
+
+    def _record_outcome(self, host: str, status_code, latency=None, retry_after=None):
+        decision = self.scheduler.record(host, status_code, latency, retry_after)
+        self.metrics.record_response(status_code, latency)
+        if status_code == 429:
+            logger.warning(f"[429] Pausing {host} for {retry_after if retry_after is not None else self.scheduler.controller(host).delay:.2f}s")
+        if decision is None:
+            return
+
+        old_crawl_delay = self.crawl_delay
+        self.crawl_delay = self.scheduler.controller(host).delay
+        logger.info(f"Adjusting rate of {host} [{1 / old_crawl_delay:.2f} => {1 / self.crawl_delay:.2f} req/s] ({decision}) | In flight: {self.in_flight} | Too many requests: {self.too_many_requests_count} | Successful requests: {self.successful_requests_count}")
+        self.too_many_requests_count = 0
+        self.successful_requests_count = 0
+        self.last_delay_adjustment = datetime.now()
+
+    async def _crawl_url(self, session: aiohttp.ClientSession, url: str, retry_count: int):
+        host = urlsplit(url).netloc
+        await self.scheduler.acquire(host)
+
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        fetch_started = time.monotonic()
+        try:
+            async with session.get(url, allow_redirects=False) as response:
+                status_code, reason = response.status, response.reason
+                retry_after = parse_retry_after(response.headers.get('Retry-After'))
+                html = await response.text(encoding=None if response.charset else 'utf-8', errors='replace') if status_code == 200 else None
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            logger.warning(f"[ASYNC] Failed to load [Retry:{retry_count}] {url}: {type(e).__name__} {str(e)}")
+            self._record_outcome(host, None)
+            self.handle_failed_url(url, retry_count)
+            return
+        finally:
+            self.in_flight -= 1
+
+        if status_code == 429:
+            # Counted before _record_outcome, which may close the window this 429 belongs to
+            self.too_many_requests_count += 1
+        self._record_outcome(host, status_code, time.monotonic() - fetch_started, retry_after)
+
+        if status_code == 429:
+            self.handle_failed_url(url, retry_count)
+            return
+
+        if status_code in [404, 403, 443, 301, 302]:
+            with self.state_lock:
+                self.never_crawl.add(url)
+                self.successful_requests_count += 1
+            return
+
+        if status_code != 200:
+            logger.warning(f"[{status_code}][Retry:{retry_count}][Reason:{reason}] HTTP Error - {url}")
+            self.handle_failed_url(url, retry_count)
+            return
+
+        if self.workers and not self.has_required_content(url, html):
+            async with self.browser_lock:
+                # The render is a second request to the host - it waits for its own slot and is recorded on its own
+                await self.scheduler.acquire(host)
+                render_started = time.monotonic()
+                render_status, rendered = await asyncio.to_thread(self._render_in_browser, url)
+            self._record_outcome(host, render_status, time.monotonic() - render_started)
+            if rendered is None:
+                self.handle_failed_url(url, retry_count)
+                return
+            html = rendered
+
+        with self.state_lock:
+            self.successful_requests_count += 1
+            self.save_html(url, html)
+            self.visited.add(url)
+            self.extract_links(html, url)
+            logger.success(f"[ASYNC] Crawled: {url}")
+
+            if self.iteration % self.save_interval == 0:
+                self.save_state()
+        if self.pipeline is not None:
+            # A full extraction queue holds up this fetch only, not the state lock or the event loop
+            await asyncio.to_thread(self.submit_extraction, url, html)
+
+    def _render_in_browser(self, url: str):
+        # Returns (status_code, html) - html is None when the render failed, status_code too for driver errors
+        worker = self.workers[0]
+        with self.state_lock:
+            self.browser_fallback_count += 1
+        try:
+            render_started = time.monotonic()
+            del worker.driver.requests
+            worker.driver.get(url)
+            self.metrics.render_seconds.observe(time.monotonic() - render_started)
+            status_code = worker.driver.requests[0].response.status_code
+            if status_code != 200:
+                return status_code, None
+            html = worker.driver.page_source
+            worker.record_page(len(html))
+            return status_code, html
+        except WebDriverException as e:
+            logger.warning(f"[{worker.name}][DRIVER][WebDriverException] Selenium WebDriver Error: {str(e)}")
+            worker._remake_driver()
+            return None, None
+
+    def _log_worker_throughput(self):
+        elapsed = time.monotonic() - self.crawl_started
+        logger.info(f"[ASYNC] Pages: {self.pages_crawled} | Throughput: {self.pages_crawled / elapsed * 60 if elapsed > 0 else 0.0:.2f} pages/min | In flight: {self.in_flight} (max {self.max_in_flight})")
+        super()._log_worker_throughput()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Asynchronous Web Crawler')
+    parser.add_argument('--concurrency', type=int, default=100, help='Maximum number of fetches in flight')
+    parser.add_argument('--driver', type=str, choices=['chrome', 'firefox'], default=None, help='Browser driver used for pages that need rendering (default: no browser)')
+    parser.add_argument('--initial-delay', type=float, default=5, help='Starting delay between requests to one host (seconds)')
+    parser.add_argument('--min-delay', type=float, default=0.5, help='Lowest delay the AIMD controller may reach (seconds)')
+    parser.add_argument('--metrics-port', type=int, default=None, help='Serve Prometheus metrics on http://0.0.0.0:<port>/metrics')
+    parser.add_argument('--sitemaps', action='store_true', help='Discovery mode - seed the frontier with the product URLs of the sitemaps listed in robots.txt')
+    args = parser.parse_args()
+
+    start_time = datetime.now(tz=timezone(timedelta(hours=2), 'Europe/Bratislava'))
+    logger.info("=" * 50)
+    logger.info(f"Starting async crawler at: {start_time.strftime('%Y-%m-%d %H:%M:%S')}")
+    logger.info(f"Concurrency: {args.concurrency} | Browser fallback: {args.driver}")
+    logger.info(f"PID: {os.getpid()}")
+    logger.info("=" * 50)
+
+    crawler = AsyncCrawler(concurrency=args.concurrency, min_delay=args.min_delay, max_retries=10, save_interval=10, initial_crawl_delay=args.initial_delay, driver_type=args.driver, metrics_port=args.metrics_port, sitemaps=args.sitemaps)
+    crawler.run()
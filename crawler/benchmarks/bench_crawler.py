@@ -0,0 +1,189 @@
+"""
+Crawler throughput benchmark against the local replay server - reports pages/s, saved bytes/s,
+p50 / p99 fetch latency and RSS over time, so driver, frontier and delay controller changes can be compared.
+
+The crawl runs in a fresh temporary directory (state, data/ and logs/ are thrown away afterwards).
+
+Run from the crawler directory:
+    python -m benchmarks.bench_crawler --max-pages 500 [--engine async] [--rate-429 0.01 --rate-slow 0.05] [--output result.json]
+"""
+import os
+import sys
+import json
+import time
+import socket
+import shutil
+import signal
+import tempfile
+import argparse
+import subprocess
+from statistics import quantiles
+from threading import Thread, Event
+from urllib.request import urlopen
+
+CRAWLER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, CRAWLER_DIR)
+
+from benchmarks.replay_server import add_server_arguments
+from patterns import RegexPatterns
+
+
+def rss_mb() -> float:
+    try:
+        with open('/proc/self/statm', 'r') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / (1024 * 1024)
+    except (OSError, ValueError):
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def start_replay_server(args, port: int) -> subprocess.Popen:
+    command = [sys.executable, '-m', 'benchmarks.replay_server', '--port', str(port)]
+    for option in ['corpus', 'url_hashes', 'robots', 'products', 'per_list', 'page_kb', 'sitemap_size', 'rate_429', 'rate_timeout', 'rate_slow', 'slow_delay', 'timeout_delay', 'retry_after', 'seed']:
+        value = getattr(args, option)
+        if value is not None:
+            command += [f"--{option.replace('_', '-')}", str(os.path.abspath(value) if option in ['corpus', 'url_hashes', 'robots'] else value)]
+    server = subprocess.Popen(command, cwd=CRAWLER_DIR, stdout=subprocess.PIPE, text=True)
+
+    for _ in range(100):
+        try:
+            urlopen(f"http://127.0.0.1:{port}/robots.txt", timeout=1).read()
+            return server
+        except OSError:
+            time.sleep(0.1)
+    server.terminate()
+    raise RuntimeError('Replay server did not start')
+
+
+class MemorySampler(Thread):
+    def __init__(self, crawler, interval: float):
+        super().__init__(daemon=True)
+        self.crawler = crawler
+        self.interval = interval
+        self.samples: list = []  # (elapsed, rss_mb, pages, saved_bytes)
+        self.started = time.monotonic()
+        self.stopped = Event()
+
+    def sample(self):
+        self.samples.append((round(time.monotonic() - self.started, 2), round(rss_mb(), 1), self.crawler.pages_crawled, self.crawler.total_data_crawled))
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            self.sample()
+
+
+def build_crawler(args, base_url: str, latencies: list, saved_urls: list):
+    # Imported here - main configures its log files relative to the working directory
+    from main import Crawler
+    from async_crawler import AsyncCrawler
+
+    options = dict(max_retries=args.max_retries, save_interval=args.save_interval, initial_crawl_delay=args.delay, min_crawl_delay=args.min_delay,
+                   driver_type=args.driver, state_backend=args.state_backend, page_store=args.page_store,
+                   base_url=base_url, max_pages=args.max_pages, sitemaps=args.sitemaps)
+
+    if args.engine == 'async':
+        class BenchAsyncCrawler(AsyncCrawler):
+            def _record_outcome(self, host, status_code, latency=None, retry_after=None):
+                if latency is not None:
+                    latencies.append(latency)
+                super()._record_outcome(host, status_code, latency, retry_after)
+
+        crawler = BenchAsyncCrawler(concurrency=args.concurrency, min_delay=args.min_delay, **options)
+    else:
+        crawler = Crawler(workers=args.workers, **options)
+        record = crawler.delay_controller.record
+
+        def record_latency(status_code, latency=None):
+            if latency is not None:
+                latencies.append(latency)
+            record(status_code, latency)
+        crawler.delay_controller.record = record_latency
+
+    # Saved URLs are collected during the crawl - run() closes the SQLite state store, visited cannot be read afterwards
+    save_html = crawler.save_html
+
+    def record_saved(url, html, overwrite=False):
+        saved_urls.append(url)
+        return save_html(url, html, overwrite)
+    crawler.save_html = record_saved
+    return crawler
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Crawler benchmark against the local replay server')
+    parser.add_argument('--engine', type=str, choices=['sync', 'async'], default='sync', help='main.Crawler or async_crawler.AsyncCrawler')
+    parser.add_argument('--workers', type=int, default=1, help='sync engine - number of workers')
+    parser.add_argument('--concurrency', type=int, default=20, help='async engine - fetches in flight')
+    parser.add_argument('--driver', type=str, choices=['chrome', 'firefox'], default=None, help='Browser fallback (default: none)')
+    parser.add_argument('--state-backend', type=str, choices=['pickle', 'sqlite'], default='pickle')
+    parser.add_argument('--page-store', type=str, choices=['gzip', 'zstd'], default=None)
+    parser.add_argument('--max-pages', type=int, default=500, help='Pages to crawl')
+    parser.add_argument('--sitemaps', action='store_true', help='Seed the frontier from the replay server sitemaps (discovery mode)')
+    parser.add_argument('--max-retries', type=int, default=3)
+    parser.add_argument('--save-interval', type=int, default=100)
+    parser.add_argument('--delay', type=float, default=0.05, help='Initial crawl delay (seconds)')
+    parser.add_argument('--min-delay', type=float, default=0.01, help='Lowest delay the AIMD controller may reach (seconds)')
+    parser.add_argument('--sample-interval', type=float, default=1.0, help='RSS sampling interval (seconds)')
+    parser.add_argument('--output', type=str, default=None, help='Write the results as JSON')
+    parser.add_argument('--keep', action='store_true', help='Keep the temporary crawl directory')
+    add_server_arguments(parser)
+    parser.set_defaults(port=None)
+    args = parser.parse_args()
+
+    port = args.port or free_port()
+    server = start_replay_server(args, port)
+    workdir = tempfile.mkdtemp(prefix='bench_crawler_')
+    cwd = os.getcwd()
+    os.chdir(workdir)
+    try:
+        from loguru import logger
+        latencies: list = []
+        saved_urls: list = []
+        crawler = build_crawler(args, f"http://127.0.0.1:{port}", latencies, saved_urls)
+        logger.remove()
+        logger.add(sys.stderr, level='WARNING')
+
+        sampler = MemorySampler(crawler, args.sample_interval)
+        sampler.sample()
+        sampler.start()
+        started = time.monotonic()
+        crawler.run()
+        elapsed = time.monotonic() - started
+        sampler.stopped.set()
+        sampler.sample()
+    finally:
+        os.chdir(cwd)
+        server.send_signal(signal.SIGINT)
+        server_output = server.communicate()[0]
+        if not args.keep:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    percentiles = quantiles(latencies, n=100) if len(latencies) >= 2 else [latencies[0] if latencies else 0.0] * 99
+    result = {
+        'engine': args.engine, 'sitemaps': args.sitemaps, 'workers': args.workers if args.engine == 'sync' else args.concurrency,
+        'pages': crawler.pages_crawled, 'product_pages': sum(1 for url in saved_urls if RegexPatterns.PRODUCT_URL.search(url)), 'elapsed_s': round(elapsed, 2),
+        'pages_per_s': round(crawler.pages_crawled / elapsed, 2), 'saved_bytes_per_s': round(crawler.total_data_crawled / elapsed),
+        'fetches': len(latencies), 'latency_p50_ms': round(percentiles[49] * 1000, 1), 'latency_p99_ms': round(percentiles[98] * 1000, 1),
+        'final_crawl_delay_s': round(crawler.crawl_delay, 3), 'peak_rss_mb': max(sample[1] for sample in sampler.samples),
+        'rss_over_time': sampler.samples, 'server': server_output.strip().splitlines()[-1] if server_output.strip() else '',
+    }
+
+    print(f"Engine: {result['engine']} ({result['workers']}) | Sitemaps: {result['sitemaps']} | Pages: {result['pages']} ({result['product_pages']} products) in {result['elapsed_s']}s")
+    print(f"Throughput: {result['pages_per_s']} pages/s | {result['saved_bytes_per_s'] / 1024:.1f} KB/s saved")
+    print(f"Fetch latency: p50 {result['latency_p50_ms']} ms | p99 {result['latency_p99_ms']} ms | Final crawl delay: {result['final_crawl_delay_s']}s")
+    print(f"Peak RSS: {result['peak_rss_mb']} MB | {result['server']}")
+    print("RSS over time (s, MB, pages): " + ' '.join(f"{t}:{rss}/{pages}" for t, rss, pages, _ in sampler.samples[::max(1, len(sampler.samples) // 10)]))
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(result, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
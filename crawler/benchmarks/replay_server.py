@@ -0,0 +1,290 @@
+"""
+Local HTTP server replaying an Open Food Facts like site for crawler benchmarks - either a captured corpus
+(data/<hash>.html + url_hashes.txt, or the segmented page store) or a deterministic synthetic one, with
+injected 429s, timeouts and slow responses. The synthetic site also has a sitemap index of gzipped product
+sitemaps listed in its robots.txt (main.py --sitemaps).
+
+Run from the crawler directory: python -m benchmarks.replay_server [--port 8765] [--corpus data] [--rate-429 0.02]
+"""
+import os
+import sys
+import gzip
+import time
+import random
+import hashlib
+import argparse
+from threading import Lock
+from datetime import date, timedelta
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit
+
+from vinf_common.page_store import PageStoreReader, INDEX_FILE
+
+
+CAPTURED_BASE_URL = 'https://world.openfoodfacts.org'
+
+WORDS = ['chocolate', 'milk', 'organic', 'hazelnut', 'biscuit', 'yogurt', 'cereal', 'orange', 'juice', 'cheese',
+         'tomato', 'pasta', 'rice', 'olive', 'oil', 'sugar', 'salt', 'butter', 'almond', 'honey']
+BRANDS = ['Nestle', 'Danone', 'Carrefour', 'Lidl', 'Ferrero', 'Kellogg', 'Barilla', 'Auchan', 'Milka', 'Tesco']
+COUNTRIES = ['France', 'Germany', 'Spain', 'Italy', 'Slovakia', 'United Kingdom', 'Belgium', 'Poland']
+
+
+class SyntheticCorpus:
+    """
+    Deterministic product catalogue rendered on request - numbered list pages of `per_list` products, product pages
+    with every field extractor/extractor.py reads, and a few facet pages. Page sizes are padded by a script block.
+    """
+
+    def __init__(self, products: int = 2000, per_list: int = 50, page_kb: int = 60, seed: int = 42, sitemap_size: int = 1000):
+        self.products = products
+        self.per_list = per_list
+        self.page_kb = page_kb
+        self.seed = seed
+        self.lists = max(1, -(-products // per_list))
+        self.sitemap_size = sitemap_size
+        self.sitemaps = max(1, -(-products // sitemap_size))
+
+    def robots_txt(self, base_url: str) -> str:
+        return f"User-agent: *\nDisallow: /cgi/\nDisallow: /*?*sort_by=\nDisallow: /*.json$\n\nSitemap: {base_url}/sitemap_index.xml\n"
+
+    def lastmod(self, index: int) -> str:
+        return (date(2024, 1, 1) + timedelta(days=index * 37 % 600)).isoformat()
+
+    def sitemap_index(self, base_url: str) -> str:
+        entries = []
+        for number in range(self.sitemaps):
+            lastmod = max(self.lastmod(index) for index in range(number * self.sitemap_size, min((number + 1) * self.sitemap_size, self.products)))
+            entries.append(f"<sitemap><loc>{base_url}/sitemap_products_{number + 1}.xml.gz</loc><lastmod>{lastmod}</lastmod></sitemap>")
+        return f'<?xml version="1.0" encoding="UTF-8"?>\n<sitemapindex xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">{"".join(entries)}</sitemapindex>'
+
+    def product_sitemap(self, number: int, base_url: str) -> bytes:
+        first = (number - 1) * self.sitemap_size
+        entries = ''.join(f"<url><loc>{base_url}{self.product_path(index)}</loc><lastmod>{self.lastmod(index)}</lastmod></url>"
+                          for index in range(first, min(first + self.sitemap_size, self.products)))
+        return gzip.compress(f'<?xml version="1.0" encoding="UTF-8"?>\n<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">{entries}</urlset>'.encode('utf-8'))
+
+    def sitemap(self, path: str, base_url: str):
+        """Returns (body, content type) of a sitemap path, or None."""
+        if path == '/sitemap_index.xml':
+            return self.sitemap_index(base_url), 'application/xml'
+        if path.startswith('/sitemap_products_') and path.endswith('.xml.gz'):
+            number = path[len('/sitemap_products_'):-len('.xml.gz')]
+            if number.isdigit() and 1 <= int(number) <= self.sitemaps:
+                return self.product_sitemap(int(number), base_url), 'application/gzip'
+        return None
+
+    def product_code(self, index: int) -> int:
+        return 3_000_000_000_000 + index * 7919
+
+    def product_path(self, index: int) -> str:
+        rng = random.Random(self.seed + index)
+        return f"/product/{self.product_code(index)}/{rng.choice(WORDS)}-{rng.choice(WORDS)}"
+
+    def _padding(self, rng: random.Random) -> str:
+        # Scripts are stripped by the crawler before saving, like the real inline trackers and state blobs
+        size = self.page_kb * 1024
+        return f"<script>var state = \"{''.join(rng.choices('abcdefghijklmnopqrstuvwxyz0123456789', k=size))}\";</script>"
+
+    def _page(self, title: str, body: str, rng: random.Random) -> str:
+        return f"<!DOCTYPE html><html><head><title>{title}</title>{self._padding(rng)}</head><body>{body}</body></html>"
+
+    def list_page(self, number: int) -> str:
+        rng = random.Random(self.seed * 31 + number)
+        first = (number - 1) * self.per_list
+        links = ''.join(f'<li><a href="{self.product_path(index)}">Product {index}</a></li>' for index in range(first, min(first + self.per_list, self.products)))
+        pages = ''.join(f'<a href="/{page}">{page}</a>' for page in [number - 1, number + 1, number + 2] if 1 <= page <= self.lists)
+        facets = f'<a href="/category/{rng.choice(WORDS)}">category</a><a href="/brand/{rng.choice(BRANDS).lower()}">brand</a>' \
+                 f'<a href="/cgi/search.pl?search_terms={rng.choice(WORDS)}">search</a><a href="/?sort_by=popularity">sort</a>'
+        return self._page(f"Products - page {number}", f"<ul>{links}</ul><nav>{pages}</nav>{facets}", rng)
+
+    def product_page(self, index: int) -> str:
+        rng = random.Random(self.seed + index)
+        name = f"{rng.choice(WORDS).title()} {rng.choice(WORDS)} {rng.choice(WORDS)}"
+        related = ''.join(f'<a href="{self.product_path(rng.randrange(self.products))}">related</a>' for _ in range(5))
+        fields = {
+            'brands': ', '.join(rng.sample(BRANDS, 2)), 'packaging': rng.choice(['Plastic', 'Glass', 'Cardboard, Plastic film']),
+            'categories': ', '.join(rng.sample(WORDS, 3)), 'stores': ', '.join(rng.sample(BRANDS, 2)), 'countries': ', '.join(rng.sample(COUNTRIES, 3)),
+        }
+        body = (
+            f'<h2 class="title-1" property="food:name" itemprop="name">{name}</h2>'
+            + ''.join(f'<p><span class="field">{key}:</span> <span class="field_value" id="field_{key}_value">{value}</span></p>' for key, value in fields.items())
+            + f'<a href="#panel_nutriscore_2023" onclick="toggle()"><h4>Nutri-Score {rng.choice("ABCDE")}</h4></a>'
+            + f'<a href="#panel_nova" onclick="toggle()"><h4>NOVA {rng.randint(1, 4)}</h4></a>'
+            + f'<a href="#panel_ecoscore" onclick="toggle()"><h4>Eco-Score {rng.choice("ABCDE")}</h4></a>'
+            + f'<div id="panel_ingredients_content" class="content panel_content active expand-for-large">{", ".join(rng.sample(WORDS, 6))}</div>'
+            + f'<div><strong>Allergens:</strong> {rng.choice(["Milk", "Nuts", "Gluten", "None"])}</div>'
+            + f'<div><strong>Traces:</strong> {rng.choice(["Soybeans", "Eggs", "None"])}</div>'
+            + f'<a href="#panel_additive_e{rng.randint(100, 999)}" class="panel"><h4>E{rng.randint(100, 999)} - additive</h4>'
+            + f'<a href="#panel_ingredients_analysis_palm_oil" class="panel"><h4>Palm oil free</h4>'
+            + f'<div class="related">{related}</div>'
+        )
+        return self._page(name, body, rng)
+
+    def facet_page(self, path: str) -> str:
+        rng = random.Random(self.seed + int(hashlib.md5(path.encode()).hexdigest()[:8], 16))
+        links = ''.join(f'<a href="{self.product_path(rng.randrange(self.products))}">product</a>' for _ in range(10))
+        return self._page(path, f"<h1>{path}</h1>{links}<a href=\"/images/logo.png\">logo</a>", rng)
+
+    def get(self, path: str):
+        if path in ['', '/']:
+            return self.list_page(1)
+        parts = path.strip('/').split('/')
+        if len(parts) == 1 and parts[0].isdigit():
+            number = int(parts[0])
+            return self.list_page(number) if 1 <= number <= self.lists else None
+        if parts[0] == 'product' and len(parts) >= 2 and parts[1].isdigit():
+            index, remainder = divmod(int(parts[1]) - 3_000_000_000_000, 7919)
+            return self.product_page(index) if remainder == 0 and 0 <= index < self.products else None
+        if parts[0] in ['category', 'brand'] and len(parts) == 2:
+            return self.facet_page(path)
+        return None
+
+
+class CapturedCorpus:
+    """Pages saved by the crawler, served under their original paths - absolute links to the live site become relative."""
+
+    def __init__(self, data_folder: str, url_hashes_file: str = 'url_hashes.txt', robots_file: str = None):
+        self.data_folder = data_folder
+        self.reader = PageStoreReader(data_folder) if os.path.exists(os.path.join(data_folder, INDEX_FILE)) else None
+        self.paths: dict = {}  # path -> url_hash
+        with open(url_hashes_file, 'r', encoding='utf-8') as f:
+            for line in f:
+                url_hash, url = line.rstrip('\n').split('\t', 1)
+                parts = urlsplit(url)
+                self.paths[parts.path + (f"?{parts.query}" if parts.query else '')] = url_hash
+        self.robots = open(robots_file, 'r', encoding='utf-8').read() if robots_file else "User-agent: *\nDisallow: /cgi/\n"
+
+    def robots_txt(self, base_url: str) -> str:
+        return self.robots
+
+    def sitemap(self, path: str, base_url: str):
+        return None
+
+    def get(self, path: str):
+        url_hash = self.paths.get(path.rstrip('/') if path != '/' else '')
+        if url_hash is None:
+            return None
+        if self.reader is not None:
+            html = self.reader.get(url_hash) if url_hash in self.reader else None
+        else:
+            file_path = os.path.join(self.data_folder, f"{url_hash}.html")
+            html = open(file_path, 'r', encoding='utf-8').read() if os.path.exists(file_path) else None
+        return html.replace(f'href="{CAPTURED_BASE_URL}', 'href="') if html is not None else None
+
+
+class ReplayServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, corpus, rate_429: float = 0.0, rate_timeout: float = 0.0, rate_slow: float = 0.0,
+                 slow_delay: float = 2.0, timeout_delay: float = 20.0, retry_after: int = 1, seed: int = 42):
+        super().__init__(address, ReplayHandler)
+        self.corpus = corpus
+        self.rate_429 = rate_429
+        self.rate_timeout = rate_timeout
+        self.rate_slow = rate_slow
+        self.slow_delay = slow_delay
+        self.timeout_delay = timeout_delay
+        self.retry_after = retry_after
+        self.rng = random.Random(seed)
+        self.rng_lock = Lock()
+        self.counts: dict = {'200': 0, '404': 0, '429': 0, 'timeout': 0, 'slow': 0}
+
+    def handle_error(self, request, client_address):
+        # Crawlers dropping their keep-alive connections on exit are expected
+        if not isinstance(sys.exc_info()[1], (ConnectionResetError, BrokenPipeError)):
+            super().handle_error(request, client_address)
+
+    def draw(self) -> float:
+        with self.rng_lock:
+            return self.rng.random()
+
+
+class ReplayHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # Keep-alive, like the real site
+    disable_nagle_algorithm = True  # Headers and body are separate writes, avoid the delayed ACK stall
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status: int, body='', content_type: str = 'text/html; charset=utf-8', headers: dict = None):
+        payload = body if isinstance(body, bytes) else body.encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(payload)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_GET(self):
+        server: ReplayServer = self.server
+        base_url = f"http://{self.headers.get('Host', '%s:%d' % server.server_address[:2])}"
+        if self.path == '/robots.txt':
+            self._send(200, server.corpus.robots_txt(base_url), 'text/plain; charset=utf-8')
+            return
+        sitemap = server.corpus.sitemap(self.path, base_url)
+        if sitemap is not None:
+            self._send(200, *sitemap)
+            return
+
+        draw = server.draw()
+        if draw < server.rate_429:
+            server.counts['429'] += 1
+            self._send(429, 'Too Many Requests', headers={'Retry-After': str(server.retry_after)})
+            return
+        draw -= server.rate_429
+        if draw < server.rate_timeout:
+            # Longer than the crawler's request timeout
+            server.counts['timeout'] += 1
+            time.sleep(server.timeout_delay)
+        elif draw - server.rate_timeout < server.rate_slow:
+            server.counts['slow'] += 1
+            time.sleep(server.slow_delay)
+
+        html = server.corpus.get(self.path)
+        if html is None:
+            server.counts['404'] += 1
+            self._send(404, 'Not Found')
+            return
+        server.counts['200'] += 1
+        self._send(200, html)
+
+
+def create_server(args) -> ReplayServer:
+    corpus = CapturedCorpus(args.corpus, args.url_hashes, args.robots) if args.corpus else SyntheticCorpus(args.products, args.per_list, args.page_kb, args.seed, args.sitemap_size)
+    return ReplayServer((args.host, args.port), corpus, args.rate_429, args.rate_timeout, args.rate_slow, args.slow_delay, args.timeout_delay, args.retry_after, args.seed)
+
+
+def add_server_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument('--host', type=str, default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--corpus', type=str, default=None, help='Captured data folder (HTML files or page store) - synthetic corpus when omitted')
+    parser.add_argument('--url-hashes', type=str, default='url_hashes.txt', help='url_hashes.txt of the captured corpus')
+    parser.add_argument('--robots', type=str, default=None, help='robots.txt served with the captured corpus')
+    parser.add_argument('--products', type=int, default=2000, help='Synthetic corpus - number of product pages')
+    parser.add_argument('--per-list', type=int, default=50, help='Synthetic corpus - products per list page')
+    parser.add_argument('--page-kb', type=int, default=60, help='Synthetic corpus - script padding per page (KB)')
+    parser.add_argument('--sitemap-size', type=int, default=1000, help='Synthetic corpus - product URLs per sitemap file')
+    parser.add_argument('--rate-429', type=float, default=0.0, help='Share of requests answered with 429')
+    parser.add_argument('--rate-timeout', type=float, default=0.0, help='Share of requests held past the crawler timeout')
+    parser.add_argument('--rate-slow', type=float, default=0.0, help='Share of requests delayed by --slow-delay')
+    parser.add_argument('--slow-delay', type=float, default=2.0, help='Delay of slow responses (seconds)')
+    parser.add_argument('--timeout-delay', type=float, default=20.0, help='Delay of timed out responses (seconds)')
+    parser.add_argument('--retry-after', type=int, default=1, help='Retry-After of the injected 429s (seconds)')
+    parser.add_argument('--seed', type=int, default=42)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Replay server for crawler benchmarks')
+    add_server_arguments(parser)
+    args = parser.parse_args()
+
+    server = create_server(args)
+    print(f"Replaying {'captured corpus ' + args.corpus if args.corpus else 'synthetic corpus'} on http://{args.host}:{args.port}", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print(f"Responses: {server.counts}", flush=True)
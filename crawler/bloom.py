@@ -0,0 +1,134 @@
+import os
+import json
+import math
+import hashlib
+
+
+def _hash_pair(key: str):
+    digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+    return int.from_bytes(digest[:8], 'little'), int.from_bytes(digest[8:], 'little') | 1
+
+
+class BloomFilter:
+    """Fixed-size Bloom filter sized for `capacity` keys at `error_rate` false positives (double hashing)."""
+
+    def __init__(self, capacity: int, error_rate: float):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.num_bits = max(8, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.num_hashes = max(1, round(self.num_bits / capacity * math.log(2)))
+        self.bits = bytearray((self.num_bits + 7) // 8)
+        self.count = 0
+
+    def _indexes(self, hashes):
+        h1, h2 = hashes
+        return [(h1 + i * h2) % self.num_bits for i in range(self.num_hashes)]
+
+    def contains(self, hashes) -> bool:
+        return all(self.bits[index >> 3] & (1 << (index & 7)) for index in self._indexes(hashes))
+
+    def add(self, hashes):
+        for index in self._indexes(hashes):
+            self.bits[index >> 3] |= 1 << (index & 7)
+        self.count += 1
+
+
+class ScalableBloomFilter:
+    """
+    Scalable Bloom filter - a new, larger and tighter filter is appended whenever the current one is full,
+    so the overall false positive rate stays below `error_rate` however many keys are added.
+    """
+
+    def __init__(self, initial_capacity: int = 1_000_000, error_rate: float = 0.01, growth: int = 2, tightening: float = 0.5):
+        self.initial_capacity = initial_capacity
+        self.error_rate = error_rate
+        self.growth = growth
+        self.tightening = tightening
+        self.filters: list = []
+        self.tag = None  # Saved with the filter, lets the owner check it matches its own checkpoint
+
+    def _grow(self):
+        index = len(self.filters)
+        capacity = self.initial_capacity * self.growth ** index
+        # Geometric series of error rates sums up to error_rate
+        error_rate = self.error_rate * (1 - self.tightening) * self.tightening ** index
+        self.filters.append(BloomFilter(capacity, error_rate))
+
+    def add(self, key: str) -> bool:
+        """Adds the key, returns False when it was (probably) present already."""
+        hashes = _hash_pair(key)
+        if any(bloom.contains(hashes) for bloom in self.filters):
+            return False
+        if not self.filters or self.filters[-1].count >= self.filters[-1].capacity:
+            self._grow()
+        self.filters[-1].add(hashes)
+        return True
+
+    def __contains__(self, key: str) -> bool:
+        hashes = _hash_pair(key)
+        return any(bloom.contains(hashes) for bloom in self.filters)
+
+    def __len__(self):
+        return sum(bloom.count for bloom in self.filters)
+
+    def size_bytes(self) -> int:
+        return sum(len(bloom.bits) for bloom in self.filters)
+
+    def save(self, path: str):
+        header = {
+            'initial_capacity': self.initial_capacity, 'error_rate': self.error_rate,
+            'growth': self.growth, 'tightening': self.tightening, 'tag': self.tag,
+            'filters': [{'capacity': bloom.capacity, 'error_rate': bloom.error_rate, 'count': bloom.count} for bloom in self.filters],
+        }
+        with open(f"{path}.tmp", 'wb') as f:
+            f.write(json.dumps(header).encode() + b'\n')
+            for bloom in self.filters:
+                f.write(bloom.bits)
+        os.replace(f"{path}.tmp", path)
+
+    @classmethod
+    def load(cls, path: str) -> 'ScalableBloomFilter':
+        with open(path, 'rb') as f:
+            header = json.loads(f.readline())
+            scalable = cls(header['initial_capacity'], header['error_rate'], header['growth'], header['tightening'])
+            scalable.tag = header.get('tag')
+            for entry in header['filters']:
+                bloom = BloomFilter(entry['capacity'], entry['error_rate'])
+                bloom.bits = bytearray(f.read(len(bloom.bits)))
+                bloom.count = entry['count']
+                scalable.filters.append(bloom)
+        return scalable
+
+
+class CompactUrlSet:
+    """
+    set-like URL membership for very large crawls - the Bloom filter answers most lookups from memory
+    and only its positives are confirmed against the exact on-disk set (a state_store.SqliteUrlSet).
+    """
+
+    def __init__(self, exact, bloom: ScalableBloomFilter):
+        self.exact = exact
+        self.bloom = bloom
+        self.false_positives: int = 0
+
+    def add(self, url: str):
+        self.bloom.add(url)
+        self.exact.add(url)
+
+    def discard(self, url: str):
+        # Bloom filters cannot forget keys, the exact check keeps a discarded URL out
+        self.exact.discard(url)
+
+    def __contains__(self, url: str) -> bool:
+        if url not in self.bloom:
+            return False
+        if url in self.exact:
+            return True
+        self.false_positives += 1
+        return False
+
+    def __len__(self):
+        return len(self.exact)
+
+    def __iter__(self):
+        return iter(self.exact)
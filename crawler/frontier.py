@@ -0,0 +1,132 @@
+import re
+import sys
+import time
+import heapq
+import html
+from urllib.parse import urlsplit, urlunsplit
+
+from patterns import RegexPatterns
+
+
+# URL classes in crawl priority order - products first, then numbered product lists, then everything else
+URL_CLASS_PRODUCT = 0
+URL_CLASS_PRODUCT_LIST = 1
+URL_CLASS_OTHER = 2
+
+PAGE_NUMBER = re.compile(r'/(\d+)$')
+
+# Query parameters that only track the referrer / campaign and never change the page
+TRACKING_PARAMS = re.compile(r'^(utm_\w+|fbclid|gclid|dclid|msclkid|yclid|mc_cid|mc_eid|_ga|igshid|ref|ref_src)$', re.IGNORECASE)
+
+
+def canonicalize_url(url: str, base_url: str):
+    """
+    Canonical form of an extracted link, or None for links that are not http(s) -
+    https scheme (the base_url scheme for links to its host), lower-case host without default port,
+    no fragment, no tracking parameters, no trailing slash.
+    """
+    url = html.unescape(url.strip())
+    if url.startswith('//'):
+        url = f"https:{url}"
+    elif url.startswith('/'):
+        url = f"{base_url.rstrip('/')}{url}"
+
+    parts = urlsplit(url)
+    if parts.scheme not in ['http', 'https'] or not parts.netloc:
+        return None
+
+    netloc = parts.netloc.lower()
+    if netloc.endswith(':443') or netloc.endswith(':80'):
+        netloc = netloc.rsplit(':', 1)[0]
+
+    base = urlsplit(base_url)
+    scheme = base.scheme if netloc == base.netloc.lower() else 'https'
+    query = '&'.join(param for param in parts.query.split('&') if param and not TRACKING_PARAMS.match(param.split('=', 1)[0]))
+    return urlunsplit((scheme, netloc, parts.path.rstrip('/'), query, ''))
+
+
+def classify_url(url: str, lastmod: float = None):
+    """
+    Returns (url_class, page_number) - product list pages are ordered by their page number, products with a sitemap
+    <lastmod> (POSIX timestamp) newest first and ahead of the products without one.
+    """
+    if RegexPatterns.PRODUCT_URL.search(url):
+        return URL_CLASS_PRODUCT, -int(lastmod) if lastmod else 0
+
+    if RegexPatterns.PRODUCT_LIST.search(url):
+        match = PAGE_NUMBER.search(url)
+        return URL_CLASS_PRODUCT_LIST, int(match.group(1)) if match else sys.maxsize
+
+    return URL_CLASS_OTHER, 0
+
+
+class PriorityFrontier:
+    """
+    In-memory crawl frontier with O(log n) push / pop, replacing the periodically reordered deque.
+
+    Ready URLs are popped by (url_class, page_number, insertion order). Retried URLs wait in a second heap
+    keyed by their backoff time and move to the ready heap once it passes. It keeps the deque interface
+    the crawler and the pickled state rely on (append, extend, popleft, len, iteration).
+    """
+
+    def __init__(self, entries=()):
+        self.ready: list = []    # (url_class, page_number, seq, url, retry_count)
+        self.delayed: list = []  # (not_before, seq, url, retry_count)
+        self.seq: int = 0
+        self.class_counts: dict = {URL_CLASS_PRODUCT: 0, URL_CLASS_PRODUCT_LIST: 0, URL_CLASS_OTHER: 0}
+        self.extend(entries)
+
+    def push(self, url: str, retry_count: int = 0, delay: float = 0, lastmod: float = None):
+        self.seq += 1
+        if delay > 0:
+            heapq.heappush(self.delayed, (time.time() + delay, self.seq, url, retry_count))
+            return
+
+        url_class, page_number = classify_url(url, lastmod)
+        heapq.heappush(self.ready, (url_class, page_number, self.seq, url, retry_count))
+        self.class_counts[url_class] += 1
+
+    def append(self, entry):
+        self.push(entry[0], entry[1])
+
+    def extend(self, entries):
+        for entry in entries:
+            self.append(entry)
+
+    def _release_delayed(self):
+        now = time.time()
+        while self.delayed and self.delayed[0][0] <= now:
+            _, _, url, retry_count = heapq.heappop(self.delayed)
+            self.push(url, retry_count)
+
+    def pop_ready(self):
+        """Returns the next [url, retry_count] whose backoff has passed, or None."""
+        self._release_delayed()
+        if not self.ready:
+            return None
+
+        url_class, _, _, url, retry_count = heapq.heappop(self.ready)
+        self.class_counts[url_class] -= 1
+        return [url, retry_count]
+
+    def popleft(self):
+        entry = self.pop_ready()
+        if entry is not None:
+            return entry
+        if not self.delayed:
+            raise IndexError('pop from an empty frontier')
+        _, _, url, retry_count = heapq.heappop(self.delayed)
+        return [url, retry_count]
+
+    def counts(self) -> dict:
+        return {'product': self.class_counts[URL_CLASS_PRODUCT], 'product_list': self.class_counts[URL_CLASS_PRODUCT_LIST],
+                'other': self.class_counts[URL_CLASS_OTHER], 'backed_off': len(self.delayed)}
+
+    def __len__(self):
+        return len(self.ready) + len(self.delayed)
+
+    def __iter__(self):
+        for entry in sorted(self.ready):
+            yield [entry[3], entry[4]]
+        for entry in sorted(self.delayed):
+            yield [entry[2], entry[3]]
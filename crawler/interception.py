@@ -0,0 +1,88 @@
+import re
+from urllib.parse import urlsplit
+
+
+# Sec-Fetch-Dest values / extensions / hosts of the resources a policy level aborts
+BLOCKED_DESTINATIONS = {
+    'off': set(),
+    'default': {'image', 'video', 'audio', 'track', 'font', 'object', 'embed'},
+    'strict': {'image', 'video', 'audio', 'track', 'font', 'object', 'embed', 'style', 'manifest'},
+}
+BLOCKED_EXTENSIONS = {
+    'off': set(),
+    'default': {'jpg', 'jpeg', 'png', 'gif', 'bmp', 'svg', 'webp', 'avif', 'ico', 'mp4', 'webm', 'mp3', 'ogg', 'wav', 'woff', 'woff2', 'ttf', 'otf', 'eot'},
+    'strict': {'jpg', 'jpeg', 'png', 'gif', 'bmp', 'svg', 'webp', 'avif', 'ico', 'mp4', 'webm', 'mp3', 'ogg', 'wav', 'woff', 'woff2', 'ttf', 'otf', 'eot', 'css'},
+}
+ANALYTICS_HOSTS = [
+    'google-analytics.com', 'googletagmanager.com', 'doubleclick.net', 'googlesyndication.com', 'googleadservices.com',
+    'facebook.net', 'hotjar.com', 'matomo.cloud', 'clarity.ms', 'segment.io', 'scorecardresearch.com',
+]
+ANALYTICS_HOST_PREFIXES = ('analytics.', 'matomo.', 'stats.', 'piwik.')
+
+
+class ResourcePolicy:
+    """
+    Which subresources the browser may load - the page source is all the crawler keeps, so images, media, fonts
+    and analytics are aborted in the selenium-wire proxy before they are fetched.
+
+    selenium-wire intercepts and records only requests in `driver.scopes`, so the scopes are limited to the crawled
+    host (the document and its first-party requests) plus the URLs the policy blocks - every other request is
+    streamed through the proxy without being stored. Images are additionally disabled in the browser itself.
+    """
+
+    def __init__(self, base_url: str, level: str = 'default'):
+        if level not in BLOCKED_DESTINATIONS:
+            raise ValueError("Invalid resource policy. Choose 'off', 'default' or 'strict'.")
+        self.level = level
+        self.host = urlsplit(base_url).netloc.lower()
+        self.blocked_destinations: set = BLOCKED_DESTINATIONS[level]
+        self.blocked_extensions: set = BLOCKED_EXTENSIONS[level]
+        self.blocked_hosts: list = ANALYTICS_HOSTS if level != 'off' else []
+        self.blocked_count: int = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.level != 'off'
+
+    @property
+    def block_images(self) -> bool:
+        return 'image' in self.blocked_destinations
+
+    def is_blocked(self, url: str, destination: str = None) -> bool:
+        if destination in ['document', 'iframe']:
+            return False
+        if destination in self.blocked_destinations:
+            return True
+
+        parts = urlsplit(url)
+        host = parts.hostname or ''
+        if host.startswith(ANALYTICS_HOST_PREFIXES) and self.blocked_hosts:
+            return True
+        if any(host == blocked or host.endswith(f".{blocked}") for blocked in self.blocked_hosts):
+            return True
+
+        path = parts.path.rsplit('/', 1)[-1]
+        return '.' in path and path.rsplit('.', 1)[-1].lower() in self.blocked_extensions
+
+    def request_interceptor(self, request):
+        # Runs in the selenium-wire proxy thread for every in-scope request
+        if self.is_blocked(request.url, request.headers.get('Sec-Fetch-Dest')):
+            self.blocked_count += 1
+            request.abort(error_code=403)
+
+    def scopes(self) -> list:
+        scopes = [rf'^https?://{re.escape(self.host)}(:\d+)?/']
+        if self.blocked_extensions:
+            scopes.append(rf'\.({"|".join(sorted(self.blocked_extensions))})(\?|$)')
+        if self.blocked_hosts:
+            hosts = '|'.join(re.escape(host) for host in self.blocked_hosts)
+            prefixes = '|'.join(re.escape(prefix) for prefix in ANALYTICS_HOST_PREFIXES)
+            scopes.append(rf'^https?://(({prefixes})[^/]*|([^/]*\.)?({hosts}))(:\d+)?/')
+        return scopes
+
+    def apply(self, driver):
+        """Installs the interceptor and the capture scopes on a selenium-wire driver."""
+        if not self.enabled:
+            return
+        driver.scopes = self.scopes()
+        driver.request_interceptor = self.request_interceptor
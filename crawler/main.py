@@ -1,10 +1,8 @@
 import requests
 import pickle
 from datetime import datetime, timedelta
-import re
 import hashlib
-from collections import deque
-from threading import Thread
+from threading import Thread, RLock, Lock, Event
 import time
 import copy
 import os
@@ -24,11 +22,20 @@ from seleniumwire import webdriver
 from urllib3.exceptions import MaxRetryError
 
 from requests.exceptions import HTTPError
+from requests.adapters import HTTPAdapter
 
 from loguru import logger
 
+from politeness import AIMDController, parse_retry_after
+from patterns import RegexPatterns
+from state_store import CrawlStateStore
+from frontier import PriorityFrontier, canonicalize_url
+from vinf_common.page_store import PageStoreWriter
+from interception import ResourcePolicy
+from robots import RobotsRules
+from metrics import CrawlerMetrics, start_metrics_server
+from sitemap import SitemapReader, parse_lastmod
 
-from enum import Enum
 
 import traceback
 import argparse
@@ -41,20 +48,80 @@ logger.add("logs/crawler_debug.log", rotation="50 MB", level="DEBUG")
 logger.add("logs/crawler_info.log", rotation="50 MB", level="INFO")
 
 
-class RegexPatterns:
-    HTML_A_HREF = re.compile(r'<a\s+(?:[^>]*?\s+)?href="([^"]*)"')
-    PRODUCT_LIST = re.compile(r'(https://world\.openfoodfacts\.org/\d+$)|(https://world.openfoodfacts.org$)')
-    REMOVE_JAVASCRIPT = re.compile(r'<script\b[^<]*(?:(?!<\/script>)<[^<]*)*<\/script>')
-    PRODUCT_URL = re.compile(r'https://world\.openfoodfacts\.org/product/.*')
+class CrawlWorker(Thread):
+    """Crawl worker with its own pooled webdriver, pulling URLs from the crawler's shared frontier."""
+    
+    def __init__(self, crawler: 'Crawler', worker_id: int):
+        super().__init__(name=f"worker-{worker_id}", daemon=True)
+        self.crawler = crawler
+        self._driver = None  # Started lazily - pages served by the HTTP fast path never need a browser
+        self.pages_crawled: int = 0
+        self.bytes_crawled: int = 0
+        self.driver_restarts: int = 0
+        self.started_at: float = time.monotonic()
+
+    @property
+    def driver(self):
+        if self._driver is None:
+            self._driver = self.crawler.create_driver()
+        return self._driver
+
+    def _remake_driver(self):
+        self.quit_driver()
+        self.driver_restarts += 1
+
+    def _close_driver(self):
+        self.driver.close()
+        self.driver.quit()
+
+    def quit_driver(self):
+        if self._driver is None:
+            return
+        try:
+            self._driver.quit()
+        except WebDriverException:
+            pass
+        self._driver = None
+
+    def record_page(self, saved_bytes: int):
+        self.pages_crawled += 1
+        self.bytes_crawled += saved_bytes
+
+    def pages_per_minute(self) -> float:
+        elapsed = time.monotonic() - self.started_at
+        return self.pages_crawled / elapsed * 60 if elapsed > 0 else 0.0
+
+    def run(self):
+        while not self.crawler.stop_event.is_set():
+            entry = self.crawler._next_url()
+            if entry is None:
+                break
+            if entry is False:
+                time.sleep(0.5)
+                continue
+            
+            url, retry_count = entry
+            self.crawler.crawl_url(self, url, retry_count)
+        
+        logger.info(f"[{self.name}] Finished | Pages: {self.pages_crawled} | Throughput: {self.pages_per_minute():.2f} pages/min")
 
 
 class Crawler:
-    def __init__(self, max_retries=10, save_interval=20, initial_crawl_delay=5, driver_type='chrome'):
-        self.base_url: str = "https://world.openfoodfacts.org"
-        self.to_visit: deque = deque([[self.base_url, 0]])  # [url, retry_count]
+    # Containers a CrawlStateStore keeps in its own tables instead of the checkpointed counters
+    STATE_CONTAINERS = ['to_visit', 'visited', 'failed', 'never_crawl', 'seen', 'url_hashes', 'url_lastmod']
+    
+    def __init__(self, max_retries=10, save_interval=20, initial_crawl_delay=5, driver_type='chrome', workers=1, http_fast_path=True, state_backend='pickle', bloom_error_rate=None, page_store=None, resource_policy='default', extract_to=None,
+                 base_url='https://world.openfoodfacts.org', robots_url=None, max_pages=None, min_crawl_delay=0.5, metrics_port=None, sitemaps=False, sitemap_since=None):
+        self.base_url: str = base_url.rstrip('/')
+        self.robots_url: str = robots_url or f"{self.base_url}/robots.txt"
+        self.max_pages: int = max_pages  # Stop after this many pages saved in this run (benchmarks)
+        self.pages_crawled: int = 0
+        self.to_visit: PriorityFrontier = PriorityFrontier([[self.base_url, 0]])  # [url, retry_count]
         self.visited: set = set()
         self.failed: set = set()
         self.never_crawl: set = set()
+        self.seen: set = {self.base_url}  # Every URL ever enqueued, in canonical form
+        self.duplicates_suppressed: int = 0
         self.max_retries: int = max_retries
         self.save_interval: int = save_interval
         self.iteration: int = 0
@@ -62,17 +129,52 @@ class Crawler:
         self.headers: dict = {
             'User-Agent': 'University Project Crawler (Contact: xstrbol@stuba.sk)'
         }
-        self.robots_cache: set = set()
+        self.num_workers: int = max(1, workers)
+        
+        # Keep-alive HTTP session shared by robots.txt and the fast path, one pooled connection per worker
+        self.session: requests.Session = requests.Session()
+        self.session.headers.update(self.headers)
+        self.session.mount('https://', HTTPAdapter(pool_connections=1, pool_maxsize=self.num_workers))
+        self.session.mount('http://', HTTPAdapter(pool_connections=1, pool_maxsize=self.num_workers))
+        self.http_fast_path: bool = http_fast_path
+        self.http_fast_path_count: int = 0
+        self.browser_fallback_count: int = 0
+        self.robots: RobotsRules = RobotsRules()
         self.url_hashes: dict = {}
+        
+        # Discovery mode - product URLs from the robots.txt sitemaps are seeded before crawling
+        self.sitemaps: bool = sitemaps
+        self.sitemap_since: datetime = parse_lastmod(sitemap_since) if isinstance(sitemap_since, str) else sitemap_since
+        if sitemap_since and self.sitemap_since is None:
+            raise ValueError(f"Invalid sitemap_since date: {sitemap_since}")
+        self.sitemap_lastmod: dict = {}  # Child sitemap -> its <lastmod> when it was last read completely
+        self.url_lastmod: dict = {}  # Seeded product URL -> its <lastmod> (POSIX timestamp) - frontier priority and recrawl baseline
+        
+        # SQLite backend keeps the frontier, visited sets and URL hashes on disk and checkpoints only the deltas
+        # With bloom_error_rate the visited / seen lookups hit an in-memory Bloom filter first and SQLite only on its positives
+        self.store: CrawlStateStore = None
+        if bloom_error_rate is not None and state_backend != 'sqlite':
+            raise ValueError("The Bloom filter URL sets need the 'sqlite' state backend for the exact check.")
+        if state_backend == 'sqlite':
+            self.store = CrawlStateStore('crawler_state.db', bloom_error_rate=bloom_error_rate)
+            self.to_visit = self.store.frontier
+            self.visited = self.store.visited
+            self.failed = self.store.failed
+            self.never_crawl = self.store.never_crawl
+            self.seen = self.store.seen
+            self.url_hashes = self.store.url_hashes
+            self.url_lastmod = self.store.url_lastmod
+        elif state_backend != 'pickle':
+            raise ValueError("Invalid state backend. Choose 'pickle' or 'sqlite'.")
         self.total_data_crawled: int = 0
         self.last_save_data_crawled: int = 0
         self.too_many_requests_count: int = 0
         self.successful_requests_count: int = 0
         self.last_delay_adjustment: datetime = datetime.now()
-        
-        self.reorder_interval: int = 500
+        self.delay_controller: AIMDController = AIMDController(initial_crawl_delay, min_delay=min_crawl_delay)
+        self.paused_until: float = 0.0  # Retry-After of the last 429 - no fetch starts before it
 
-        self.forbidden_extensions = [
+        self.forbidden_extensions = {
             'jpg', 'jpeg', 'png', 'gif', 'bmp', 'svg', 'webp',  # Images
             'mp4', 'avi', 'mov', 'wmv', 'flv', 'webm',  # Videos
             'mp3', 'wav', 'ogg', 'flac',  # Audio
@@ -81,91 +183,118 @@ class Crawler:
             'exe', 'msi', 'bin',  # Executables
             'css', 'js', 'json', 'xml',  # Web assets and data formats
             'ico', 'ttf', 'woff', 'woff2',  # Icons and fonts
-        ]
+        }
 
         self.get_robots_rules()
         
         self.driver_type = driver_type
-        self.setup_driver()
+        self.resource_policy: ResourcePolicy = ResourcePolicy(self.base_url, resource_policy)
+        
+        # Worker pool - every worker owns one webdriver and pulls from the shared to_visit frontier
+        self.workers: list = []
+        self.state_lock: RLock = RLock()
+        self.fetch_slot_lock: Lock = Lock()
+        self.next_fetch_at: float = 0.0
+        self.in_progress: set = set()
+        self.stop_event: Event = Event()
         
         # Create data directory if it doesn't exist
         if not os.path.exists('data'):
             os.makedirs('data')
-
-    def setup_driver(self):
+        
+        # Prometheus text metrics, served on /metrics when a port is given
+        self.metrics: CrawlerMetrics = CrawlerMetrics(self)
+        self.metrics_server = start_metrics_server(self.metrics.registry, metrics_port) if metrics_port else None
+        
+        # Pages go either to one data/<hash>.html file each or, with page_store ('gzip' / 'zstd'), into compressed segments
+        self.page_store: PageStoreWriter = PageStoreWriter('data', compression=page_store) if page_store else None
+        self.url_hashes_file = open('url_hashes.txt', 'a', buffering=1)
+        
+        # Optional inline extraction - saved pages are extracted in the background and appended to `extract_to`
+        self.pipeline = None
+        if extract_to:
+            from pipeline import ExtractionPipeline
+            self.pipeline = ExtractionPipeline(extract_to)
+            self.pipeline.start()
+
+    def create_driver(self):
         if self.driver_type == 'chrome':
-            self.CHROMEDRIVER_PATH = '/usr/local/bin/chromedriver'
-            self.chrome_service = Service(self.CHROMEDRIVER_PATH)
-            self.chrome_options = Options()
-            self.chrome_options.add_argument("--headless")
-            self.chrome_options.add_argument("--no-sandbox")
-            self.chrome_options.add_argument('--disable-dev-shm-usage')
-            self.chrome_options.add_argument('--disable-blink-features=AutomationControlled')
-            self.chrome_options.add_argument('--no-zygote')
-            self.chrome_options.add_argument(f"user-agent={self.headers['User-Agent']}")
-            self.driver = webdriver.Chrome(service=self.chrome_service, options=self.chrome_options)
+            chrome_service = Service('/usr/local/bin/chromedriver')
+            chrome_options = Options()
+            chrome_options.add_argument("--headless")
+            chrome_options.add_argument("--no-sandbox")
+            chrome_options.add_argument('--disable-dev-shm-usage')
+            chrome_options.add_argument('--disable-blink-features=AutomationControlled')
+            chrome_options.add_argument('--no-zygote')
+            chrome_options.add_argument(f"user-agent={self.headers['User-Agent']}")
+            if self.resource_policy.block_images:
+                chrome_options.add_argument('--blink-settings=imagesEnabled=false')
+                chrome_options.add_experimental_option('prefs', {'profile.managed_default_content_settings.images': 2})
+            driver = webdriver.Chrome(service=chrome_service, options=chrome_options)
         elif self.driver_type == 'firefox':
-            self.FIREFOX_GECKO_PATH = '/usr/local/bin/geckodriver'
-            self.firefox_service = FirefoxService(self.FIREFOX_GECKO_PATH)
-            self.firefox_options = FirefoxOptions()
-            self.firefox_options.add_argument("--headless")
-            self.firefox_options.set_preference("general.useragent.override", self.headers['User-Agent'])
-            self.firefox_options.set_preference("dom.webdriver.enabled", False)
-            self.firefox_options.set_preference('useAutomationExtension', False)
-            self.driver = webdriver.Firefox(options=self.firefox_options, service=self.firefox_service)
+            firefox_service = FirefoxService('/usr/local/bin/geckodriver')
+            firefox_options = FirefoxOptions()
+            firefox_options.add_argument("--headless")
+            firefox_options.set_preference("general.useragent.override", self.headers['User-Agent'])
+            firefox_options.set_preference("dom.webdriver.enabled", False)
+            firefox_options.set_preference('useAutomationExtension', False)
+            if self.resource_policy.block_images:
+                firefox_options.set_preference('permissions.default.image', 2)
+            driver = webdriver.Firefox(options=firefox_options, service=firefox_service)
         else:
             raise ValueError("Invalid driver type. Choose 'chrome' or 'firefox'.")
         
 
-        self.driver.set_page_load_timeout(15)
-            
-    def _remake_driver(self):
-        self.driver.quit()
-        self.setup_driver()
+        # Only the document and first-party requests are recorded, images / media / fonts / analytics are aborted
+        self.resource_policy.apply(driver)
+        driver.set_page_load_timeout(15)
+        return driver
     
     def load_state(self):
         logger.info("=" * 50)
         logger.info("Loading previous state...")
+        if self.store is not None:
+            self._load_store_state()
+            return
         try:
             with open('crawler_state.pkl', 'rb') as f:
                 state = pickle.load(f)
                 
                 self.iteration = state.get('iteration', 0)
                 
-                _combined = list(set([x[0] for x in state.get('to_visit', [])] + [x[0] for x in state.get('failed', [])]))
-                
-                combined_with_retry = [[url, 0] for url in _combined]
-                
-                self.to_visit = deque(combined_with_retry)
                 _failed = state.get('failed', [])
-                
                 _to_visit = state.get('to_visit', [])
                 
-                # Add failed URLs to the end of the to_visit deque
-                self.to_visit.extend(_failed)
+                # Failed URLs get another chance, everything restarts with a clean retry count
+                _combined = set([x[0] for x in _to_visit] + list(_failed))
+                
+                # Sitemap URLs keep their newest first order
+                self.url_lastmod = state.get('url_lastmod', {})
+                self.to_visit = PriorityFrontier()
+                for url in _combined:
+                    self.to_visit.push(url, lastmod=self.url_lastmod.get(url))
                 
                 self.visited = state.get('visited', set())
                 self.failed = set()
                 self.never_crawl = state.get('never_crawl', set())
+                self.seen = state.get('seen') or (_combined | self.visited | self.never_crawl | {self.base_url})
+                self.duplicates_suppressed = state.get('duplicates_suppressed', 0)
+                self.sitemap_lastmod = state.get('sitemap_lastmod', {})
                 self.url_hashes = state.get('url_hashes', {})
-                self.total_data_crawled = sum(os.path.getsize(os.path.join('data', f)) for f in os.listdir('data') if os.path.isfile(os.path.join('data', f)))
+                self.total_data_crawled = state['total_data_crawled'] if 'total_data_crawled' in state else sum(os.path.getsize(os.path.join('data', f)) for f in os.listdir('data') if os.path.isfile(os.path.join('data', f)))
                 self.last_save_data_crawled = state.get('last_save_data_crawled', 0)
                 self.crawl_delay = state.get('crawl_delay', self.crawl_delay)
                 
                 if self.crawl_delay < 5:
                     self.crawl_delay = 5
+                self.delay_controller.delay = self.crawl_delay
                 
-                self.reorder_interval = state.get('reorder_interval', 500)
                 self.too_many_requests_count = state.get('too_many_requests_count', 0)
                 self.successful_requests_count = state.get('successful_requests_count', 0)
                 self.last_delay_adjustment = state.get('last_delay_adjustment', datetime.now())
                 
-                self.reorder_to_visit()
-                
-                self.next_reorder_iteration = self.iteration + self.reorder_interval
-                
                 logger.success(f"Previous state loaded | Iteration: {self.iteration} | To visit: {len(self.to_visit)} (Previously: {len(_to_visit)}) | Visited: {len(self.visited)} | Previously Failed: {len(_failed)} | Never crawl: {len(self.never_crawl)} | Total data crawled: {self.total_data_crawled / (1024 * 1024):.2f} MB")
-                logger.info(f"Reorder interval: {self.reorder_interval} (at {self.next_reorder_iteration} iteration) | Crawl delay: {self.crawl_delay:.2f}s | Too many requests: {self.too_many_requests_count} | Successful requests: {self.successful_requests_count}")
+                logger.info(f"Frontier: {self.to_visit.counts()} | Crawl delay: {self.crawl_delay:.2f}s | Too many requests: {self.too_many_requests_count} | Successful requests: {self.successful_requests_count}")
                 
                 
                 logger.info("=" * 50)
@@ -174,6 +303,41 @@ class Crawler:
         except FileNotFoundError:
             logger.info("No previous state found ... Starting from the beginning")
 
+    def _load_store_state(self):
+        if self.store.is_new:
+            self.to_visit.append([self.base_url, 0])
+            self.seen.add(self.base_url)
+            if os.path.exists('crawler_state.pkl'):
+                logger.info("Migrating crawler_state.pkl into crawler_state.db ...")
+                with open('crawler_state.pkl', 'rb') as f:
+                    state = pickle.load(f)
+                self.store.import_state(state)
+                self.store.checkpoint({key: value for key, value in state.items() if key not in self.STATE_CONTAINERS})
+            else:
+                logger.info("No previous state found ... Starting from the beginning")
+                return
+        
+        state = self.store.meta
+        self.iteration = state.get('iteration', 0)
+        self.total_data_crawled = state.get('total_data_crawled', 0)
+        self.last_save_data_crawled = state.get('last_save_data_crawled', 0)
+        self.crawl_delay = max(state.get('crawl_delay', self.crawl_delay), 5)
+        self.delay_controller.delay = self.crawl_delay
+        self.too_many_requests_count = state.get('too_many_requests_count', 0)
+        self.successful_requests_count = state.get('successful_requests_count', 0)
+        self.duplicates_suppressed = state.get('duplicates_suppressed', 0)
+        self.sitemap_lastmod = state.get('sitemap_lastmod', {})
+        
+        # Failed URLs get another chance on every restart, same as with the pickled state
+        _failed = list(self.failed)
+        for url in _failed:
+            self.failed.discard(url)
+            self.to_visit.append([url, 0])
+        
+        logger.success(f"Previous state loaded from {self.store.path} | Iteration: {self.iteration} | To visit: {len(self.to_visit)} | Visited: {len(self.visited)} | Previously Failed: {len(_failed)} | Never crawl: {len(self.never_crawl)} | Total data crawled: {self.total_data_crawled / (1024 * 1024):.2f} MB")
+        logger.info(f"Crawl delay: {self.crawl_delay:.2f}s | Too many requests: {self.too_many_requests_count} | Successful requests: {self.successful_requests_count}")
+        logger.info("=" * 50)
+
     def save_state(self):
         state = {
             'iteration': self.iteration,
@@ -181,48 +345,81 @@ class Crawler:
             'visited': self.visited,
             'failed': self.failed,
             'never_crawl': self.never_crawl,
+            'seen': self.seen,
             'url_hashes': self.url_hashes,
+            'url_lastmod': self.url_lastmod,
             'total_data_crawled': self.total_data_crawled,
             'last_save_data_crawled': self.last_save_data_crawled,
             'crawl_delay': self.crawl_delay,
             'too_many_requests_count': self.too_many_requests_count,
             'successful_requests_count': self.successful_requests_count,
             'last_delay_adjustment': self.last_delay_adjustment,
-            'reorder_interval': self.reorder_interval
+            'duplicates_suppressed': self.duplicates_suppressed,
+            'sitemap_lastmod': self.sitemap_lastmod
         }
-        with open('crawler_state.pkl', 'wb') as f:
-            pickle.dump(state, f)
+        if self.store is not None:
+            # Only the counters are written, the tables already hold every change since the last checkpoint
+            self.store.checkpoint({key: value for key, value in state.items() if key not in self.STATE_CONTAINERS})
+        else:
+            with open('crawler_state.pkl', 'wb') as f:
+                pickle.dump(state, f)
 
         data_crawled_since_last_save = self.total_data_crawled - self.last_save_data_crawled
         self.last_save_data_crawled = self.total_data_crawled
 
         logger.success(f"Saved current state | Iteration: {self.iteration} | To visit: {len(self.to_visit)} | Visited: {len(self.visited)} | Failed: {len(self.failed)} | Never crawl: {len(self.never_crawl)}")
         logger.info(f"Data crawled in last {self.save_interval} iterations: {data_crawled_since_last_save / (1024 * 1024):.2f} MB")
-        logger.info(f"Total data crawled: {self.total_data_crawled / (1024 * 1024):.2f} MB | Average file size: {(self.total_data_crawled / len(self.visited) / (1024 * 1024)):.3f} MB")
-        logger.info(f"Reorder interval: {self.reorder_interval} (at {self.iteration + self.reorder_interval} iteration - left: {self.reorder_interval - self.iteration % self.reorder_interval}) | Current crawl delay: {self.crawl_delay:.2f}s | Too many requests: {self.too_many_requests_count} | Successful requests: {self.successful_requests_count}")
+        # A shard may own none of the crawled URLs
+        average_file_size = self.total_data_crawled / len(self.visited) if self.visited else 0
+        logger.info(f"Total data crawled: {self.total_data_crawled / (1024 * 1024):.2f} MB | Average file size: {(average_file_size / (1024 * 1024)):.3f} MB")
+        logger.info(f"Frontier: {self.to_visit.counts()} | Seen: {len(self.seen)} | Duplicates suppressed: {self.duplicates_suppressed} | Current crawl delay: {self.crawl_delay:.2f}s | Too many requests: {self.too_many_requests_count} | Successful requests: {self.successful_requests_count}")
+        logger.info(f"HTTP fast path pages: {self.http_fast_path_count} | Browser fallbacks: {self.browser_fallback_count} | Blocked browser requests: {self.resource_policy.blocked_count}")
+        if self.store is not None and self.store.bloom_error_rate:
+            logger.info(f"Bloom filters: {self.store.bloom_stats()}")
+        self._log_worker_throughput()
 
     def get_robots_rules(self):
         try:
-            robots_url = f"{self.base_url}/robots.txt"
-            response = requests.get(robots_url, timeout=10, headers=self.headers)
+            response = self.session.get(self.robots_url, timeout=10)
             response.raise_for_status()
-            robots_content = response.text
-            
-            parsing_user_agent_all = False
-            for line in robots_content.split('\n'):
-                line = line.strip().lower()
-                if line.startswith('user-agent:'):
-                    parsing_user_agent_all = (line.split(':', 1)[1].strip() == '*')
-                elif parsing_user_agent_all and line.startswith('disallow:'):
-                    path = line.split(':', 1)[1].strip()
-                    self.robots_cache.add(re.compile(re.escape(path).replace('\*', '.*')))
+            self.robots = RobotsRules.parse(response.text)
+            logger.info(f"Loaded robots.txt | Rules: {len(self.robots.rules)} | Sitemaps: {len(self.robots.sitemaps)}")
             
         except requests.RequestException:
             logger.error(f"Failed to fetch robots.txt. Exiting...")
             exit(1)
 
+    def seed_from_sitemaps(self):
+        if not self.robots.sitemaps:
+            logger.warning("Sitemap discovery: robots.txt lists no sitemaps")
+            return
+        
+        # Sitemap downloads take fetch slots like pages, unchanged child sitemaps are not downloaded again
+        reader = SitemapReader(self.session, known_lastmod=self.sitemap_lastmod, before_fetch=self._wait_for_fetch_slot)
+        seeded = 0
+        for entry in reader.entries(self.robots.sitemaps, since=self.sitemap_since):
+            url = canonicalize_url(entry.loc, self.base_url)
+            if url is None or not RegexPatterns.PRODUCT_URL.search(url) or not self.can_crawl(url):
+                continue
+            if not self.owns(url):
+                # Another shard's URL - it reads the same sitemaps and seeds it itself
+                continue
+            lastmod = parse_lastmod(entry.lastmod)
+            lastmod = lastmod.timestamp() if lastmod is not None else None
+            with self.state_lock:
+                if url in self.seen:
+                    self.duplicates_suppressed += 1
+                    continue
+                self.seen.add(url)
+                if lastmod is not None:
+                    # Only with a newly seeded URL - the page crawled from it is at least this new, the recrawl starts from it
+                    self.url_lastmod[url] = lastmod
+                self.enqueue_link(url, lastmod)
+            seeded += 1
+        logger.info(f"Sitemap discovery: seeded {seeded} product URLs | Sitemaps: {reader.stats()} | Frontier: {self.to_visit.counts()}")
+
     def can_crawl(self, url):
-        if url.startswith('https://'):
+        if url.startswith('https://') or url.startswith('http://'):
             if not url.startswith(self.base_url):
                 return False
             path = url[len(self.base_url):]
@@ -231,182 +428,289 @@ class Crawler:
         else:
             return False
 
-        # Check if the URL has a forbidden extension
-        if any(url.lower().endswith(f'.{ext}') for ext in self.forbidden_extensions):
+        # Check if the URL has a forbidden extension - one set lookup of the suffix after the last dot
+        if url.rsplit('.', 1)[-1].lower() in self.forbidden_extensions:
             return False
 
-        return not any(rule.match(path) for rule in self.robots_cache)
+        return self.robots.allowed(path)
 
     def hash_url(self, url):
         return hashlib.sha256(url.encode()).hexdigest()
 
     def save_url_hash(self, url_hash, url):
         self.url_hashes[url_hash] = url
-        with open('url_hashes.txt', 'a') as f:
-            f.write(f"{url_hash}\t{url}\n")
+        self.url_hashes_file.write(f"{url_hash}\t{url}\n")
     
-    def save_html(self, url, html):
+    def save_html(self, url, html, overwrite=False):
+        # overwrite - a recrawled page replacing its stored copy (recrawl.py), the URL hash is already recorded.
+        # Called under state_lock - inline extraction is queued afterwards by the caller (submit_extraction)
+        save_started = time.monotonic()
         url_hash = self.hash_url(url)
+        html_without_javascript = RegexPatterns.REMOVE_JAVASCRIPT.sub('', html)
+        if self.page_store is not None:
+            if url_hash in self.page_store and not overwrite:
+                logger.critical(f"Saving the same file twice: [Hash: {url_hash}] => {url}")
+            saved_bytes = self.page_store.write(url_hash, url, html_without_javascript)
+            if not overwrite:
+                self.save_url_hash(url_hash, url)
+                self.pages_crawled += 1
+            self.total_data_crawled += saved_bytes
+            self.metrics.record_page(saved_bytes, time.monotonic() - save_started)
+            return saved_bytes
+        
         file_path = f'data/{url_hash}.html'
-        if os.path.exists(file_path):
+        if os.path.exists(file_path) and not overwrite:
             logger.critical(f"Saving the same file twice: [Hash: {url_hash}] => {url}")
         
-        html_without_javascript = RegexPatterns.REMOVE_JAVASCRIPT.sub('', html)
         with open(file_path, 'w', encoding='utf-8') as f:
             f.write(html_without_javascript)
-        self.save_url_hash(url_hash, url)
-        self.total_data_crawled += os.path.getsize(file_path)
+        if not overwrite:
+            self.save_url_hash(url_hash, url)
+            self.pages_crawled += 1
+        saved_bytes = os.path.getsize(file_path)
+        self.total_data_crawled += saved_bytes
+        self.metrics.record_page(saved_bytes, time.monotonic() - save_started)
+        return saved_bytes
+
+    def submit_extraction(self, url, html):
+        # Queues a newly saved page for inline extraction - blocks while the pipeline is full, so it is called
+        # after state_lock is released and only the saving worker waits. Recrawled pages (overwrite) are not
+        # submitted, the append-only output already has their row and changed_urls.txt drives their re-extraction
+        if self.pipeline is not None:
+            self.pipeline.submit(self.hash_url(url), url, html)
 
     def adjust_crawl_delay(self):
-        now = datetime.now()
-        if (now - self.last_delay_adjustment).total_seconds() >= 30 or self.too_many_requests_count > 4 :  # Check every 5 minutes
-            old_crawl_delay = self.crawl_delay
-            adjusted = False
-            if self.too_many_requests_count > 2:
-                self.crawl_delay = min(self.crawl_delay * 1.25, 15)  # Increase delay, max 30 seconds
-                logger.info(f"Increased crawl delay to {self.crawl_delay:.2f}s due to too many requests")
-                adjusted = True
-            elif self.successful_requests_count > 20:
-                self.crawl_delay = max(self.crawl_delay * 0.75, 0.5)  # Decrease delay, min 5 seconds
-                logger.info(f"Decreased crawl delay to {self.crawl_delay:.2f}s due to successful requests")
-                adjusted = True
-            
-            if adjusted:
-                logger.info(f"Adjusting crawl delay [{old_crawl_delay:.2f}s => {self.crawl_delay:.2f}s] | Too many requests: {self.too_many_requests_count} | Successful requests: {self.successful_requests_count}")
-                self.too_many_requests_count = 0
-                self.successful_requests_count = 0
-                self.last_delay_adjustment = now
-
-    def reorder_to_visit(self):
-        logger.warning(f"Reordering to_visit queue | Iteration: {self.iteration}")
-        product_urls = deque()
-        other_urls = deque()
-        product_list_urls = deque()
+        # AIMD on the request rate - 429s, errors or slow responses in the last window back off multiplicatively,
+        # a clean window speeds up additively, so the delay tracks what the server tolerates
+        old_crawl_delay = self.crawl_delay
+        decision = self.delay_controller.update()
+        if decision is None:
+            return
         
-        for entry in self.to_visit:
-            if isinstance(entry, list):
-                url, retry_count = entry
+        self.crawl_delay = self.delay_controller.delay
+        if self.crawl_delay != old_crawl_delay:
+            logger.info(f"Adjusting crawl delay [{old_crawl_delay:.2f}s => {self.crawl_delay:.2f}s] ({decision}) | Too many requests: {self.too_many_requests_count} | Successful requests: {self.successful_requests_count}")
+        self.too_many_requests_count = 0
+        self.successful_requests_count = 0
+        self.last_delay_adjustment = datetime.now()
+
+    def pause_fetching(self, retry_after):
+        seconds = retry_after if retry_after is not None else self.crawl_delay
+        with self.fetch_slot_lock:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+        logger.warning(f"Pausing fetches for {seconds:.2f}s (Retry-After)")
+
+    def _wait_for_fetch_slot(self):
+        # A single worker keeps the plain sleep, a pool shares one politeness budget -
+        # fetch starts are spaced by crawl_delay across all workers together
+        with self.fetch_slot_lock:
+            now = time.monotonic()
+            if self.num_workers == 1:
+                slot = max(now + self.crawl_delay, self.paused_until)
             else:
-                url = entry[0]
-                retry_count = 0
+                slot = max(now, self.next_fetch_at, self.paused_until)
+                self.next_fetch_at = slot + self.crawl_delay
+        time.sleep(slot - now)
+
+    def _next_url(self):
+        # Returns (url, retry_count), None when the frontier is exhausted or False when it is empty only for now
+        with self.state_lock:
+            if self.max_pages and self.pages_crawled + len(self.in_progress) >= self.max_pages:
+                return False if self.in_progress else None
             
-            if RegexPatterns.PRODUCT_URL.search(url):
-                product_urls.append([url, retry_count])
-            elif RegexPatterns.PRODUCT_LIST.search(url):
-                product_list_urls.append([url, retry_count])
-            else:
-                other_urls.append([url, retry_count])
-        
-        # Sort product_list_urls by the lowest number in the URL
-        sorted_product_list_urls = sorted(product_list_urls, key=lambda x: int(re.search(r'/(\d+)$', x[0]).group(1)) if re.search(r'/(\d+)$', x[0]) else float('inf'))
-        
-        self.to_visit = deque(list(product_urls) + sorted_product_list_urls + list(other_urls))
-        
-        self.reorder_interval = len(product_urls) + len(sorted_product_list_urls) + round(len(other_urls)*0.00025)
-        
-        self.next_reorder_iteration = self.iteration + self.reorder_interval
+            while self.to_visit:
+                entry = self.to_visit.pop_ready()
+                if entry is None:
+                    # Only retries waiting for their backoff are left
+                    return False
+                
+                url, retry_count = entry
+                self.iteration += 1
+                
+                if url in self.visited or url in self.never_crawl or url in self.in_progress or not self.can_crawl(url):
+                    continue
+                
+                self.in_progress.add(url)
+                return url, retry_count
+            
+            # Other workers can still add new links while they have pages in progress
+            return False if self.in_progress else None
+
+    def crawl(self):
+        self.workers = [CrawlWorker(self, worker_id) for worker_id in range(self.num_workers)]
+        logger.info(f"Crawling with {self.num_workers} worker(s) | Driver: {self.driver_type}")
         
-        #self.to_visit = product_urls + other_urls
-        logger.info(f"Reordered to_visit queue | Product URLs: {len(product_urls)} | Product list URLs: {len(sorted_product_list_urls)} | Other URLs: {len(other_urls)} | New reorder at: {self.next_reorder_iteration} ({self.next_reorder_iteration - self.iteration} iterations left)")
+        if self.num_workers == 1:
+            self.workers[0].run()
+            return
         
-        logger.success(f"Reordered to_visit queue | Iteration: {self.iteration}")
-
-    def _close_driver(self):
-        self.driver.close()
-        self.driver.quit()
+        for worker in self.workers:
+            worker.start()
         
+        try:
+            while any(worker.is_alive() for worker in self.workers):
+                for worker in self.workers:
+                    worker.join(timeout=1)
+        except KeyboardInterrupt:
+            self.stop_event.set()
+            for worker in self.workers:
+                worker.join()
+            raise
 
-
-    def crawl(self):
-        #reorder_interval = 2000  # Reorder every 100 iterations
-        while self.to_visit:
-            if self.iteration >= self.next_reorder_iteration:
-                self.reorder_to_visit()
-
+    def crawl_url(self, worker, url, retry_count):
+        status_code = None
+        try:
+            self._wait_for_fetch_slot()
+            #input("Press Enter to continue...")
+            with self.state_lock:
+                self.adjust_crawl_delay()
             
-            url, retry_count = self.to_visit.popleft()
-        
-            if url in self.visited or url in self.never_crawl or not self.can_crawl(url):
-                self.iteration += 1
-                continue
+            fetch_started = time.monotonic()
+            status_code, reason, headers, html = self.fetch_http(url) if self.http_fast_path else (None, None, None, None)
             
-            try:
-                self.iteration += 1
-                time.sleep(self.crawl_delay)
-                #input("Press Enter to continue...")
-                self.adjust_crawl_delay()
-                
-                #self._remake_driver()
+            if status_code is None:
+                if self.http_fast_path:
+                    # The fast path request used this slot, the render is a second request to the host and takes its own
+                    self._wait_for_fetch_slot()
+                    fetch_started = time.monotonic()
+                render_started = time.monotonic()
+                del worker.driver.requests
+                worker.driver.get(url)
+                self.metrics.render_seconds.observe(time.monotonic() - render_started)
                 
-                del self.driver.requests
-                self.driver.get(url)
                 
-                
-                status_code = self.driver.requests[0].response.status_code
-                reason = self.driver.requests[0].response.reason
+                status_code = worker.driver.requests[0].response.status_code
+                reason = worker.driver.requests[0].response.reason
+                headers = worker.driver.requests[0].response.headers
                 
                 if status_code != 200:
-                    self._close_driver()
-                    raise HTTPError(f"[{status_code}][Retry:{retry_count}][Reason:{reason}] HTTP Error - {url}")
-                
-                html: str = self.driver.page_source
+                    worker._close_driver()
                 
+                html = worker.driver.page_source if status_code == 200 else None
+            
+            with self.state_lock:
+                self.delay_controller.record(status_code, time.monotonic() - fetch_started)
+            self.metrics.record_response(status_code)
+            
+            if status_code == 429:
+                self.pause_fetching(parse_retry_after(headers.get('Retry-After')))
+            
+            if status_code != 200:
+                raise HTTPError(f"[{status_code}][Retry:{retry_count}][Reason:{reason}] HTTP Error - {url}")
+            
+            with self.state_lock:
                 self.successful_requests_count += 1
-                self.save_html(url, html)
+                saved_bytes = self.save_html(url, html)
                 self.visited.add(url)
                 self.extract_links(html, url)
-                logger.success(f"Crawled: {url}")
+                worker.record_page(saved_bytes)
+                logger.success(f"[{worker.name}] Crawled: {url}")
 
-                #self._close_driver()
                 if self.iteration % self.save_interval == 0:
                     self.save_state()
-
-            except TimeoutException as e:
-                logger.warning(f"[TIMEOUT] Failed to load [Retry:{retry_count}] {url}: {str(e)}")
-                self.handle_failed_url(url, retry_count)
-                
-            except MaxRetryError as e:
-                logger.warning(f"[DRIVER][MaxRetryError] Driver Error, remake driver")
-                self._remake_driver()
-                self.handle_failed_url(url, retry_count)
-                
-            except WebDriverException as e:
-                logger.warning(f"[DRIVER][WebDriverException] Selenium WebDriver Error: {str(e)}")
-                self._remake_driver()
-                self.handle_failed_url(url, retry_count)
-                
-            except Exception as e:
-                error_message = str(e)
-                logger.warning(error_message)
-                
-                if status_code == 429:
+            self.submit_extraction(url, html)
+
+        except TimeoutException as e:
+            logger.warning(f"[{worker.name}][TIMEOUT] Failed to load [Retry:{retry_count}] {url}: {str(e)}")
+            with self.state_lock:
+                self.delay_controller.record(None)
+            self.metrics.record_response(None)
+            self.handle_failed_url(url, retry_count)
+            
+        except MaxRetryError as e:
+            logger.warning(f"[{worker.name}][DRIVER][MaxRetryError] Driver Error, remake driver")
+            self.metrics.record_response(None)
+            worker._remake_driver()
+            self.handle_failed_url(url, retry_count)
+            
+        except WebDriverException as e:
+            logger.warning(f"[{worker.name}][DRIVER][WebDriverException] Selenium WebDriver Error: {str(e)}")
+            self.metrics.record_response(None)
+            worker._remake_driver()
+            self.handle_failed_url(url, retry_count)
+            
+        except Exception as e:
+            error_message = str(e)
+            logger.warning(error_message)
+            
+            if status_code == 429:
+                with self.state_lock:
                     self.too_many_requests_count += 1
-                    #logger.warning(f"[429] Too many requests [Retry:{retry_count}][Reason: {reason}] => {url}")
-                    
-                    logger.debug(f"Current crawl delay: {self.crawl_delay:.2f}s")
-                    self.handle_failed_url(url, retry_count)
-                    continue
                 
-                if status_code in [404, 403, 443, 301,302]:
-                    #logger.warning(f"[404] Not Found [Reason: {reason}] => {url}")
+                logger.debug(f"Current crawl delay: {self.crawl_delay:.2f}s")
+                self.handle_failed_url(url, retry_count)
+                return
+            
+            if status_code in [404, 403, 443, 301,302]:
+                with self.state_lock:
                     self.never_crawl.add(url)
                     self.successful_requests_count += 1
-                    continue
+                return
 
-                #logger.warning(f"[{status_code}] Selenium failed to load [Retry:{retry_count}][Reason: {reason}] => {url}: {error_message}")
-                self.handle_failed_url(url, retry_count)
+            self.handle_failed_url(url, retry_count)
+        
+        finally:
+            with self.state_lock:
+                self.in_progress.discard(url)
+
+    def has_required_content(self, url: str, html: str) -> bool:
+        if RegexPatterns.PRODUCT_URL.search(url):
+            return bool(RegexPatterns.PRODUCT_NAME.search(html) and RegexPatterns.PRODUCT_FIELD.search(html))
+        if RegexPatterns.PRODUCT_LIST.search(url):
+            return bool(RegexPatterns.PRODUCT_LINK.search(html))
+        return bool(RegexPatterns.HTML_A_HREF.search(html))
+
+    def fetch_http(self, url: str):
+        # Plain HTTP fast path - returns (status_code, reason, headers, html), or Nones when the page has to be
+        # rendered by the browser (request failed or the fields the extractor needs are missing)
+        try:
+            fetch_started = time.monotonic()
+            response = self.session.get(url, timeout=15, allow_redirects=False)
+            self.metrics.fetch_seconds.observe(time.monotonic() - fetch_started)
+        except requests.RequestException as e:
+            logger.debug(f"[HTTP] Fast path failed, falling back to browser - {url}: {str(e)}")
+            with self.state_lock:
+                self.delay_controller.record(None)
+                self.browser_fallback_count += 1
+            return None, None, None, None
+        
+        if response.status_code != 200:
+            return response.status_code, response.reason, response.headers, None
+        
+        if 'charset' not in response.headers.get('Content-Type', ''):
+            response.encoding = 'utf-8'
+        html = response.text
+        
+        if not self.has_required_content(url, html):
+            logger.debug(f"[HTTP] Required content missing, falling back to browser - {url}")
+            with self.state_lock:
+                # Recorded as its own request, the browser render that follows records the second one
+                self.delay_controller.record(response.status_code, time.monotonic() - fetch_started)
+                self.browser_fallback_count += 1
+            return None, None, None, None
+        
+        with self.state_lock:
+            self.http_fast_path_count += 1
+        return response.status_code, response.reason, response.headers, html
+
+    def _log_worker_throughput(self):
+        for worker in self.workers:
+            logger.info(f"[{worker.name}] Pages: {worker.pages_crawled} | Throughput: {worker.pages_per_minute():.2f} pages/min | Data: {worker.bytes_crawled / (1024 * 1024):.2f} MB | Driver restarts: {worker.driver_restarts}")
+
+    def close_workers(self):
+        for worker in self.workers:
+            worker.quit_driver()
                 
 
     def handle_failed_url(self, url, retry_count):
         retry_count += 1
-        if retry_count > self.max_retries:
-            self.failed.add(url)
-            logger.error(f"URL {url} failed more than {self.max_retries} times. Moving to failed set.")
-        else:
-            if len(self.to_visit) > 10:
-                self.to_visit.insert(10, [url, retry_count])
+        with self.state_lock:
+            if retry_count > self.max_retries:
+                self.failed.add(url)
+                logger.error(f"URL {url} failed more than {self.max_retries} times. Moving to failed set.")
             else:
-                self.to_visit.append([url, retry_count])
+                # Exponential backoff keeps a struggling URL from being retried right away
+                self.to_visit.push(url, retry_count, delay=min(self.crawl_delay * 2 ** retry_count, 300))
 
     def extract_links(self, html, base_url):
         links = RegexPatterns.HTML_A_HREF.findall(html)
@@ -414,38 +718,48 @@ class Crawler:
         unique_links = set()
         
         for link in links:
-            if link.startswith('http://'):
-                link = link.replace('http://', 'https://')
-            
-            if link.startswith('/'):
-                link = f"{self.base_url}{link}"
-                
-            link = link.rstrip('/')
-            unique_links.add(link)
+            # Canonicalized once here - relative links resolve against the crawled site
+            _link = canonicalize_url(link, self.base_url)
+            if _link is None:
+                logger.debug(f"Wrong Link: {link}")
+                continue
+            unique_links.add(_link)
                 
         for link in unique_links:
-            if link in self.visited or link in self.never_crawl:
-                logger.debug(f"Link already visited or in never_crawl: {link}")
+            owned = self.owns(link)
+            if owned and link in self.seen:
+                self.duplicates_suppressed += 1
                 continue
             
             if not self.can_crawl(link):
                 logger.debug(f"Link cannot be crawled: {link}")
                 continue
             
-            if link.startswith('https://'):
-                self.to_visit.append((link.rstrip('/'), 0))
-                logger.debug(f"Added link: {link.rstrip('/')}")
-                
-            elif link.startswith('/'):
-                _link = f"{base_url.rstrip('/')}{link.rstrip('/')}"
-                self.to_visit.append((_link, 0))
-                logger.debug(f"Added link: {_link.rstrip('/')}")
-            else:
-                logger.debug(f"Wrong Link: {link}")
+            if not owned:
+                # Only owned URLs enter `seen` - the owner deduplicates the links forwarded to it
+                self.forward_link(link)
+                continue
+            
+            self.seen.add(link)
+            self.enqueue_link(link)
+
+    def owns(self, url):
+        # Whether `url` belongs to this crawler's frontier and seen set - sharding.ShardedCrawler owns only its partition
+        return True
+
+    def forward_link(self, link):
+        # New, crawlable link owned by another crawler - never called while owns() is always True (sharding.ShardedCrawler)
+        pass
+
+    def enqueue_link(self, link, lastmod=None):
+        self.to_visit.push(link, lastmod=lastmod)
+        logger.debug(f"Added link: {link}")
 
     def run(self):
         self.load_state()
         try:
+            if self.sitemaps:
+                self.seed_from_sitemaps()
             self.crawl()
         except KeyboardInterrupt:
             logger.warning("Crawler stopped by user")
@@ -453,19 +767,44 @@ class Crawler:
             logger.error(f"Unexpected error occurred - {str(e)}")
             logger.debug(f"Traceback:\n\n{traceback.format_exc()}\n\n")
         finally:
-            self.save_state()
+            with self.state_lock:
+                self.save_state()
+            self.close_workers()
+            if self.store is not None:
+                self.store.close()
+            if self.page_store is not None:
+                self.page_store.close()
+            if self.pipeline is not None:
+                self.pipeline.close()
+            if self.metrics_server is not None:
+                self.metrics_server.shutdown()
+            self.url_hashes_file.close()
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description='Web Crawler')
     parser.add_argument('--driver', type=str, choices=['chrome', 'firefox'], default='chrome', help='Choose the browser driver (chrome or firefox)')
+    parser.add_argument('--workers', type=int, default=1, help='Number of pooled browser drivers crawling in parallel (sharing one crawl delay budget)')
+    parser.add_argument('--no-http-fast-path', action='store_true', help='Render every page in the browser instead of trying a plain HTTP request first')
+    parser.add_argument('--state-backend', type=str, choices=['pickle', 'sqlite'], default='pickle', help='Keep the crawl state in one pickle or in a disk-backed SQLite store (crawler_state.db)')
+    parser.add_argument('--resource-policy', type=str, choices=['off', 'default', 'strict'], default='default', help='Subresources the browser aborts - default: images, media, fonts and analytics, strict: also stylesheets')
+    parser.add_argument('--page-store', type=str, choices=['gzip', 'zstd'], default=None, help='Append pages to compressed segment files in data/ instead of one HTML file per URL')
+    parser.add_argument('--extract-to', type=str, default=None, help='Extract every saved page in the background and append the rows to this merged TSV')
+    parser.add_argument('--base-url', type=str, default='https://world.openfoodfacts.org', help='Site to crawl (e.g. a local benchmarks/replay_server.py)')
+    parser.add_argument('--robots-url', type=str, default=None, help='robots.txt location (default: <base-url>/robots.txt)')
+    parser.add_argument('--max-pages', type=int, default=None, help='Stop after this many pages saved in this run')
+    parser.add_argument('--metrics-port', type=int, default=None, help='Serve Prometheus metrics on http://0.0.0.0:<port>/metrics')
+    parser.add_argument('--sitemaps', action='store_true', help='Discovery mode - seed the frontier with the product URLs of the sitemaps listed in robots.txt')
+    parser.add_argument('--sitemap-since', type=str, default=None, help='Only seed sitemap URLs with <lastmod> at or after this date (e.g. 2024-01-01)')
+    parser.add_argument('--bloom-error-rate', type=float, default=None, help='Keep visited / seen URLs in Bloom filters with this false positive rate, checked against SQLite (requires --state-backend sqlite)')
     args = parser.parse_args()
 
     start_time = datetime.now(tz=timezone(timedelta(hours=2), 'Europe/Bratislava'))
     logger.info("=" * 50)
     logger.info(f"Starting crawler at: {start_time.strftime('%Y-%m-%d %H:%M:%S')}")
-    logger.info(f"Using {args.driver} driver")
+    logger.info(f"Using {args.driver} driver | Workers: {args.workers}")
     logger.info(f"PID: {os.getpid()}")
     logger.info("=" * 50)
     
-    crawler = Crawler(max_retries=10, save_interval=10, initial_crawl_delay=5, driver_type=args.driver)
+    crawler = Crawler(max_retries=10, save_interval=10, initial_crawl_delay=5, driver_type=args.driver, workers=args.workers, http_fast_path=not args.no_http_fast_path, state_backend=args.state_backend, bloom_error_rate=args.bloom_error_rate, page_store=args.page_store, resource_policy=args.resource_policy, extract_to=args.extract_to,
+                      base_url=args.base_url, robots_url=args.robots_url, max_pages=args.max_pages, metrics_port=args.metrics_port, sitemaps=args.sitemaps, sitemap_since=args.sitemap_since)
     crawler.run()
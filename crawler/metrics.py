@@ -0,0 +1,202 @@
+import time
+import math
+from collections import deque
+from threading import Lock, Thread
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+
+def _format_labels(labels: dict) -> str:
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{key}="{str(value)}"' for key, value in labels.items()) + '}'
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    """Base of the Prometheus metric types - values per label set, or one value read from `function` at scrape time."""
+
+    type = 'untyped'
+
+    def __init__(self, name: str, help: str, label_names=(), function=None):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(label_names)
+        self.function = function
+        self.values: dict = {}  # label values tuple -> value
+        self.lock = Lock()
+
+    def _key(self, labels: dict) -> tuple:
+        return tuple(labels.get(name, '') for name in self.label_names)
+
+    def samples(self):
+        """Yields (suffix, labels, value)."""
+        if self.function is not None:
+            value = self.function()
+            if isinstance(value, dict):
+                for label_value, sample in value.items():
+                    yield '', {self.label_names[0]: label_value}, sample
+            else:
+                yield '', {}, value
+            return
+
+        with self.lock:
+            values = list(self.values.items())
+        for key, value in values:
+            yield '', dict(zip(self.label_names, key)), value
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.type}"]
+        for suffix, labels, value in self.samples():
+            lines.append(f"{self.name}{suffix}{_format_labels(labels)} {_format_value(value)}")
+        return '\n'.join(lines)
+
+
+class Counter(Metric):
+    type = 'counter'
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    type = 'gauge'
+
+    def set(self, value: float, **labels):
+        with self.lock:
+            self.values[self._key(labels)] = value
+
+
+class Histogram(Metric):
+    type = 'histogram'
+
+    DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 15, 30)
+
+    def __init__(self, name: str, help: str, buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        self.counts: list = [0] * len(self.buckets)
+        self.sum: float = 0.0
+        self.count: int = 0
+
+    def observe(self, value: float):
+        with self.lock:
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    self.counts[index] += 1
+                    break
+            self.sum += value
+            self.count += 1
+
+    def samples(self):
+        with self.lock:
+            counts, total, count = list(self.counts), self.sum, self.count
+        cumulative = 0
+        for bound, bucket_count in zip(self.buckets, counts):
+            cumulative += bucket_count
+            yield '_bucket', {'le': _format_value(bound) if bound == math.inf else str(bound)}, cumulative
+        yield '_sum', {}, total
+        yield '_count', {}, count
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self.metrics: list = []
+
+    def register(self, metric: Metric) -> Metric:
+        self.metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        return '\n'.join(metric.render() for metric in self.metrics) + '\n'
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        if self.path.split('?', 1)[0] not in ['/', '/metrics']:
+            self.send_error(404)
+            return
+        try:
+            payload = self.server.registry.render().encode('utf-8')
+        except Exception as e:
+            self.send_error(500, str(e))
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+
+def start_metrics_server(registry: MetricsRegistry, port: int, host: str = '0.0.0.0') -> ThreadingHTTPServer:
+    """Serves the registry at http://host:port/metrics from a daemon thread - call .shutdown() to stop it."""
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    server.daemon_threads = True
+    server.registry = registry
+    Thread(target=server.serve_forever, name='metrics-server', daemon=True).start()
+    return server
+
+
+class CrawlerMetrics:
+    """The crawler's metrics - counters and histograms recorded by the crawl loop, gauges read from the crawler on scrape."""
+
+    def __init__(self, crawler, throughput_window: float = 60):
+        self.registry = MetricsRegistry()
+        self.throughput_window = throughput_window
+        self.page_times: deque = deque()
+        self.page_times_lock = Lock()
+        self.started: float = time.monotonic()
+        register = self.registry.register
+
+        self.pages = register(Counter('crawler_pages_total', 'Pages saved'))
+        self.bytes_written = register(Counter('crawler_bytes_written_total', 'Bytes of saved pages written to disk'))
+        self.responses = register(Counter('crawler_responses_total', 'Fetch outcomes by status class (2xx, 3xx, 4xx, 429, 5xx, error)', ['status']))
+        self.fetch_seconds = register(Histogram('crawler_fetch_seconds', 'HTTP fetch latency'))
+        self.render_seconds = register(Histogram('crawler_render_seconds', 'Browser render latency'))
+        self.save_seconds = register(Histogram('crawler_save_seconds', 'Page save latency', buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1)))
+
+        register(Gauge('crawler_pages_per_second', f'Pages saved per second over the last {throughput_window:.0f}s', function=self.pages_per_second))
+        register(Gauge('crawler_frontier_urls', 'URLs waiting in the frontier by class', ['class'], function=lambda: crawler.to_visit.counts()))
+        register(Gauge('crawler_visited_urls', 'Visited URLs', function=lambda: len(crawler.visited)))
+        register(Gauge('crawler_seen_urls', 'URLs ever enqueued', function=lambda: len(crawler.seen)))
+        register(Gauge('crawler_in_progress_urls', 'URLs being fetched right now', function=lambda: len(crawler.in_progress)))
+        register(Gauge('crawler_crawl_delay_seconds', 'Current delay between fetches', function=lambda: crawler.crawl_delay))
+        register(Counter('crawler_driver_restarts_total', 'Webdriver restarts', function=lambda: sum(worker.driver_restarts for worker in crawler.workers)))
+        register(Counter('crawler_duplicates_suppressed_total', 'Links dropped as already seen', function=lambda: crawler.duplicates_suppressed))
+        register(Counter('crawler_http_fast_path_pages_total', 'Pages served by the plain HTTP fast path', function=lambda: crawler.http_fast_path_count))
+        register(Counter('crawler_browser_fallbacks_total', 'Pages rendered by the browser', function=lambda: crawler.browser_fallback_count))
+
+    def record_response(self, status_code, latency: float = None):
+        if status_code is None:
+            status = 'error'
+        elif status_code == 429:
+            status = '429'
+        else:
+            status = f"{status_code // 100}xx"
+        self.responses.inc(status=status)
+        if latency is not None:
+            self.fetch_seconds.observe(latency)
+
+    def record_page(self, saved_bytes: int, save_seconds: float):
+        self.pages.inc()
+        self.bytes_written.inc(saved_bytes)
+        self.save_seconds.observe(save_seconds)
+        with self.page_times_lock:
+            self.page_times.append(time.monotonic())
+
+    def pages_per_second(self) -> float:
+        now = time.monotonic()
+        with self.page_times_lock:
+            while self.page_times and self.page_times[0] < now - self.throughput_window:
+                self.page_times.popleft()
+            pages = len(self.page_times)
+        return pages / max(min(self.throughput_window, now - self.started), 1e-9)
@@ -0,0 +1,15 @@
+import re
+
+
+class RegexPatterns:
+    HTML_A_HREF = re.compile(r'<a\s+(?:[^>]*?\s+)?href="([^"]*)"')
+    # Host independent, so the crawler can be pointed at another base_url (e.g. benchmarks/replay_server.py)
+    PRODUCT_LIST = re.compile(r'^https?://[^/?#]+(/\d+)?$')
+    REMOVE_JAVASCRIPT = re.compile(r'<script\b[^<]*(?:(?!<\/script>)<[^<]*)*<\/script>')
+    PRODUCT_URL = re.compile(r'^https?://[^/?#]+/product/')
+    
+    # Server-rendered markers of the content extractor/extractor.py and extract_links need - if they are missing
+    # from the plain HTTP response, the page has to be rendered by the browser
+    PRODUCT_NAME = re.compile(r'<h2\s+class="title-1"\s+property="food:name"\s+itemprop="name">')
+    PRODUCT_FIELD = re.compile(r'<span\s+class="field_value"\s+id="field_\w+_value">|<div\s+id="panel_ingredients_content"')
+    PRODUCT_LINK = re.compile(r'<a\s+(?:[^>]*?\s+)?href="(?:https?://[^/"]+)?/product/')
@@ -0,0 +1,65 @@
+import queue
+from threading import Thread
+
+from loguru import logger
+
+from patterns import RegexPatterns
+
+# The extraction stage uses the extractor's own field set, shared through vinf_common
+from vinf_common.fields import COLUMNS, extract_info_single_pass as extract_info
+
+logger.disable('vinf_common.fields')  # extract_info logs every field at DEBUG
+
+
+class ExtractionPipeline(Thread):
+    """
+    Inline extraction - saved pages are queued and a background thread runs the extractor's single-pass `extract_info`
+    on them, appending one TSV row per page (same columns as the merged output of extractor.py) while crawling.
+    The queue is bounded, so a slow extraction stage slows the crawl down instead of growing memory.
+    """
+
+    def __init__(self, merged_output: str, max_queue: int = 1000):
+        super().__init__(name='extraction-pipeline', daemon=True)
+        self.merged_output = merged_output
+        self.queue: queue.Queue = queue.Queue(maxsize=max_queue)
+        self.header: list = COLUMNS
+        self.extracted_count: int = 0
+        self.failed_count: int = 0
+
+        # Appending to an existing dataset keeps its header
+        self.output = open(merged_output, 'a', encoding='utf-8')
+        if self.output.tell() == 0:
+            self.output.write('\t'.join(self.header) + '\n')
+            self.output.flush()
+
+    def submit(self, url_hash: str, url: str, html: str):
+        self.queue.put((url_hash, url, html))
+
+    def run(self):
+        while True:
+            entry = self.queue.get()
+            if entry is None:
+                break
+            self._extract(*entry)
+
+            # Flush once the backlog is drained, rows become visible to the indexer right away
+            if self.queue.empty():
+                self.output.flush()
+        self.output.flush()
+
+    def _extract(self, url_hash: str, url: str, html: str):
+        try:
+            # Scripts are stripped here like in the saved copy, off the crawling threads
+            extracted_info = extract_info(RegexPatterns.REMOVE_JAVASCRIPT.sub('', html))
+            extracted_info['LINK'] = url
+            self.output.write('\t'.join(str(extracted_info.get(column, '')) for column in self.header) + '\n')
+            self.extracted_count += 1
+        except Exception as e:
+            self.failed_count += 1
+            logger.error(f"[PIPELINE] Extraction failed [Hash: {url_hash}] => {url}: {str(e)}")
+
+    def close(self):
+        self.queue.put(None)
+        self.join()
+        self.output.close()
+        logger.info(f"[PIPELINE] Extracted: {self.extracted_count} | Failed: {self.failed_count} | Output: {self.merged_output}")
@@ -0,0 +1,160 @@
+import time
+import asyncio
+from email.utils import parsedate_to_datetime
+from datetime import datetime, timezone
+from statistics import median
+from typing import Optional, Union
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Parses a Retry-After header (delta-seconds or HTTP-date) into seconds to wait."""
+    if not value:
+        return None
+
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+
+
+class AIMDController:
+    """
+    Additive-increase / multiplicative-decrease controller of the request rate towards one host.
+
+    Every window the observed outcomes decide the next rate - any 429, an error rate above `max_error_rate` or
+    a median latency above `target_latency` cuts the rate by `decrease_factor`, a clean window with enough
+    samples adds `additive_step` requests per second. The rate is exposed as the crawl delay between requests.
+    """
+
+    def __init__(self, initial_delay: float, min_delay: float = 0.5, max_delay: float = 15,
+                 additive_step: float = 0.05, decrease_factor: float = 0.8, target_latency: float = 3.0,
+                 max_error_rate: float = 0.1, window: float = 30, min_samples: int = 20, max_throttled: int = 4):
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.additive_step = additive_step
+        self.decrease_factor = decrease_factor
+        self.target_latency = target_latency
+        self.max_error_rate = max_error_rate
+        self.window = window
+        self.min_samples = min_samples
+        self.max_throttled = max_throttled
+
+        self.delay = initial_delay
+        self.latencies: list = []
+        self.errors: int = 0
+        self.throttled: int = 0
+        self.window_started: float = time.monotonic()
+
+    @property
+    def delay(self) -> float:
+        return 1 / self.rate
+
+    @delay.setter
+    def delay(self, value: float):
+        self.rate = 1 / min(max(value, self.min_delay), self.max_delay)
+
+    @property
+    def samples(self) -> int:
+        return len(self.latencies) + self.errors + self.throttled
+
+    def record(self, status_code: Optional[int], latency: Optional[float] = None):
+        if status_code == 429:
+            self.throttled += 1
+        elif status_code is None or status_code >= 500:
+            self.errors += 1
+        elif latency is not None:
+            self.latencies.append(latency)
+
+    def update(self) -> Union[str, None]:
+        """Closes the window when it is due and adapts the rate - returns 'increase', 'decrease' or None."""
+        now = time.monotonic()
+        if now - self.window_started < self.window and self.throttled <= self.max_throttled:
+            return None
+
+        decision = None
+        samples = self.samples
+        error_rate = (self.errors + self.throttled) / samples if samples else 0.0
+        latency = median(self.latencies) if self.latencies else 0.0
+
+        if self.throttled or error_rate > self.max_error_rate or latency > self.target_latency:
+            self.delay = 1 / (self.rate * self.decrease_factor)
+            decision = 'decrease'
+        elif samples >= self.min_samples:
+            self.delay = 1 / (self.rate + self.additive_step)
+            decision = 'increase'
+
+        self.latencies = []
+        self.errors = 0
+        self.throttled = 0
+        self.window_started = now
+        return decision
+
+
+class TokenBucket:
+    """Token bucket spacing requests to one host, with a hard pause for Retry-After."""
+
+    def __init__(self, rate: float, capacity: float = 1.0):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens: float = capacity
+        self.updated: float = time.monotonic()
+        self.paused_until: float = 0.0
+
+    def pause(self, seconds: float):
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+        self.tokens = 0.0
+
+    def reserve(self) -> float:
+        """Takes a token and returns 0, or returns the number of seconds until one is available."""
+        now = time.monotonic()
+        if now < self.paused_until:
+            self.updated = self.paused_until
+            return self.paused_until - now
+
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+
+class HostScheduler:
+    """Per-host politeness for the asyncio engine - one AIMD controlled token bucket per host."""
+
+    def __init__(self, initial_delay: float, **controller_options):
+        self.initial_delay = initial_delay
+        self.controller_options = controller_options
+        self.controllers: dict = {}
+        self.buckets: dict = {}
+
+    def controller(self, host: str) -> AIMDController:
+        if host not in self.controllers:
+            self.controllers[host] = AIMDController(self.initial_delay, **self.controller_options)
+            self.buckets[host] = TokenBucket(self.controllers[host].rate)
+        return self.controllers[host]
+
+    async def acquire(self, host: str):
+        controller = self.controller(host)
+        bucket = self.buckets[host]
+        while True:
+            bucket.rate = controller.rate
+            wait = bucket.reserve()
+            if wait <= 0:
+                return
+            await asyncio.sleep(wait)
+
+    def record(self, host: str, status_code: Optional[int], latency: Optional[float] = None, retry_after: Optional[float] = None):
+        controller = self.controller(host)
+        controller.record(status_code, latency)
+        if status_code == 429:
+            self.buckets[host].pause(retry_after if retry_after is not None else controller.delay)
+        return controller.update()
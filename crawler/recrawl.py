@@ -0,0 +1,292 @@
+import os
+import time
+import sqlite3
+import hashlib
+import argparse
+from html import unescape
+from email.utils import formatdate
+from datetime import datetime, timedelta, timezone
+
+import requests
+from unidecode import unidecode
+from selenium.common.exceptions import WebDriverException
+
+from main import Crawler, CrawlWorker, logger
+from patterns import RegexPatterns
+from politeness import parse_retry_after
+from vinf_common.page_store import PageStoreReader
+from vinf_common.fields import extract_info_single_pass
+
+
+class PageMetadataStore:
+    """
+    Per-page recrawl metadata in SQLite - validators for conditional requests, hash of the page's product
+    fields (content_hash) and the adaptive revisit schedule.
+    """
+
+    SCHEMA = '''
+        CREATE TABLE IF NOT EXISTS pages (
+            url TEXT PRIMARY KEY,
+            etag TEXT,
+            last_modified TEXT,
+            content_hash TEXT,
+            interval REAL NOT NULL,
+            next_visit REAL NOT NULL,
+            last_visit REAL,
+            checks INTEGER NOT NULL DEFAULT 0,
+            changes INTEGER NOT NULL DEFAULT 0,
+            gone INTEGER NOT NULL DEFAULT 0
+        ) WITHOUT ROWID;
+        CREATE INDEX IF NOT EXISTS pages_due ON pages (gone, next_visit);
+    '''
+
+    def __init__(self, path: str = 'recrawl.db'):
+        self.path = path
+        self.connection = sqlite3.connect(path)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('PRAGMA synchronous=NORMAL')
+        self.connection.executescript(self.SCHEMA)
+
+    def seed(self, urls, interval: float, lastmod=None) -> int:
+        """
+        Schedules every known URL that is not tracked yet - for an immediate visit, or `interval` after its sitemap
+        <lastmod> (url -> POSIX timestamp) with that as the If-Modified-Since validator when it is known.
+        """
+        now = time.time()
+        lastmod = lastmod if lastmod is not None else {}
+
+        def rows():
+            for url in urls:
+                modified = lastmod.get(url)
+                if modified is None:
+                    yield url, None, interval, now
+                else:
+                    yield url, formatdate(modified, usegmt=True), interval, modified + interval
+        cursor = self.connection.executemany('INSERT OR IGNORE INTO pages (url, last_modified, interval, next_visit) VALUES (?, ?, ?, ?)', rows())
+        self.connection.commit()
+        return cursor.rowcount
+
+    def due(self, limit: int = 100) -> list:
+        return self.connection.execute('SELECT url, etag, last_modified, content_hash, interval FROM pages WHERE gone = 0 AND next_visit <= ? ORDER BY next_visit LIMIT ?',
+                                       (time.time(), limit)).fetchall()
+
+    def next_visit(self):
+        row = self.connection.execute('SELECT MIN(next_visit) FROM pages WHERE gone = 0').fetchone()
+        return row[0]
+
+    def update(self, url: str, interval: float, changed: bool, etag=None, last_modified=None, content_hash=None):
+        now = time.time()
+        self.connection.execute('''
+            UPDATE pages SET etag = COALESCE(?, etag), last_modified = COALESCE(?, last_modified), content_hash = COALESCE(?, content_hash),
+                             interval = ?, next_visit = ?, last_visit = ?, checks = checks + 1, changes = changes + ?
+            WHERE url = ?''', (etag, last_modified, content_hash, interval, now + interval, now, int(changed), url))
+
+    def postpone(self, url: str, seconds: float):
+        self.connection.execute('UPDATE pages SET next_visit = ? WHERE url = ?', (time.time() + seconds, url))
+
+    def mark_gone(self, url: str):
+        self.connection.execute('UPDATE pages SET gone = 1, last_visit = ? WHERE url = ?', (time.time(), url))
+
+    def commit(self):
+        self.connection.commit()
+
+    def close(self):
+        self.connection.commit()
+        self.connection.close()
+
+
+class Recrawler(Crawler):
+    """
+    Incremental recrawl of the already visited pages.
+
+    Every page is revisited with If-None-Match / If-Modified-Since and its product fields are compared by their
+    hash, so only pages that really changed are rewritten and appended to `changed_urls.txt` (url_hash, url)
+    for re-extraction and re-indexing. The revisit interval halves when a page changed and grows by `backoff`
+    when it did not, within [min_interval, max_interval].
+    """
+
+    def __init__(self, initial_interval=86400, min_interval=3600, max_interval=30 * 86400, backoff=1.5, once=False, **kwargs):
+        super().__init__(**kwargs)
+        self.initial_interval: float = initial_interval
+        self.min_interval: float = min_interval
+        self.max_interval: float = max_interval
+        self.backoff: float = backoff
+        self.once: bool = once
+        self.metadata: PageMetadataStore = PageMetadataStore('recrawl.db')
+        self.page_reader: PageStoreReader = None
+        self.changed_urls_file = open('changed_urls.txt', 'a', buffering=1)
+        self.checked_count: int = 0
+        self.not_modified_count: int = 0
+        self.unchanged_count: int = 0
+        self.changed_count: int = 0
+
+    def crawl(self):
+        if self.page_store is not None:
+            self.page_reader = PageStoreReader('data')
+        self.workers = [CrawlWorker(self, 0)] if self.driver_type else []
+
+        added = self.metadata.seed(self.visited, self.initial_interval, self.url_lastmod)
+        logger.info(f"Recrawling {len(self.visited)} visited pages | Newly scheduled: {added} | Browser fallback: {self.driver_type}")
+
+        try:
+            while True:
+                due = self.metadata.due()
+                if not due:
+                    next_visit = self.metadata.next_visit()
+                    if self.once or next_visit is None:
+                        break
+                    # Nothing is due - sleep until the earliest scheduled page, a minute at most to stay responsive
+                    time.sleep(min(max(next_visit - time.time(), 1), 60))
+                    continue
+
+                for url, etag, last_modified, content_hash, interval in due:
+                    self.recrawl_url(url, etag, last_modified, content_hash, interval)
+                    self.iteration += 1
+                    if self.iteration % self.save_interval == 0:
+                        self.metadata.commit()
+                        self._log_recrawl_progress()
+        finally:
+            self.metadata.close()
+            self.changed_urls_file.close()
+            self._log_recrawl_progress()
+
+    def _log_recrawl_progress(self):
+        logger.info(f"[RECRAWL] Checked: {self.checked_count} | Not modified (304): {self.not_modified_count} | Unchanged: {self.unchanged_count} | Changed: {self.changed_count} | Crawl delay: {self.crawl_delay:.2f}s")
+
+    def content_hash(self, html: str) -> str:
+        # Hash of the extracted product fields, not of the markup - a plain response, a browser render (page_source)
+        # and the stored copy of the same product differ in markup, newlines and entity escaping, and every render
+        # differs a little, so hashing the HTML would report most pages as changed. Entities, transliteration and
+        # whitespace of the fields are normalized for the same reason
+        fields = extract_info_single_pass(RegexPatterns.REMOVE_JAVASCRIPT.sub('', html))
+        normalized = '\t'.join(' '.join(unidecode(unescape(value)).split()) for value in fields.values())
+        return hashlib.sha256(normalized.encode('utf-8')).hexdigest()
+
+    def stored_content_hash(self, url: str):
+        # Baseline for pages crawled before the recrawl metadata existed - hashed from the stored copy
+        url_hash = self.hash_url(url)
+        if self.page_reader is not None:
+            return self.content_hash(self.page_reader.get(url_hash)) if url_hash in self.page_reader else None
+
+        file_path = f'data/{url_hash}.html'
+        if not os.path.exists(file_path):
+            return None
+        # newline='' - read back exactly what save_html wrote, CRLF included
+        with open(file_path, 'r', encoding='utf-8', newline='') as f:
+            return self.content_hash(f.read())
+
+    def recrawl_url(self, url: str, etag: str, last_modified: str, content_hash: str, interval: float):
+        conditional_headers = {}
+        if etag:
+            conditional_headers['If-None-Match'] = etag
+        if last_modified:
+            conditional_headers['If-Modified-Since'] = last_modified
+
+        self._wait_for_fetch_slot()
+        self.adjust_crawl_delay()
+        fetch_started = time.monotonic()
+        try:
+            response = self.session.get(url, headers=conditional_headers, timeout=15, allow_redirects=False)
+        except requests.RequestException as e:
+            logger.warning(f"[RECRAWL] Failed to load {url}: {type(e).__name__} {str(e)}")
+            self.delay_controller.record(None)
+            self.metadata.postpone(url, self.min_interval)
+            return
+        self.delay_controller.record(response.status_code, time.monotonic() - fetch_started)
+        self.checked_count += 1
+
+        if response.status_code == 304:
+            self.not_modified_count += 1
+            self.metadata.update(url, min(interval * self.backoff, self.max_interval), changed=False)
+            logger.debug(f"[RECRAWL][304] Not modified - {url}")
+            return
+
+        if response.status_code == 429:
+            self.too_many_requests_count += 1
+            retry_after = parse_retry_after(response.headers.get('Retry-After'))
+            self.pause_fetching(retry_after)
+            self.metadata.postpone(url, retry_after if retry_after is not None else self.crawl_delay)
+            return
+
+        if response.status_code in [404, 410]:
+            logger.warning(f"[RECRAWL][{response.status_code}] Page is gone - {url}")
+            self.metadata.mark_gone(url)
+            return
+
+        if response.status_code != 200:
+            logger.warning(f"[RECRAWL][{response.status_code}][Reason:{response.reason}] HTTP Error - {url}")
+            self.metadata.postpone(url, self.min_interval)
+            return
+
+        self.successful_requests_count += 1
+        if 'charset' not in response.headers.get('Content-Type', ''):
+            response.encoding = 'utf-8'
+        html = response.text
+        if not self.has_required_content(url, html):
+            html = self._render_in_browser(url)
+            if html is None:
+                logger.warning(f"[RECRAWL] Required content missing - {url}")
+                self.metadata.postpone(url, self.min_interval)
+                return
+
+        new_content_hash = self.content_hash(html)
+        if content_hash is None:
+            content_hash = self.stored_content_hash(url)
+
+        changed = new_content_hash != content_hash
+        if changed:
+            self.changed_count += 1
+            self.save_html(url, html, overwrite=True)
+            self.changed_urls_file.write(f"{self.hash_url(url)}\t{url}\n")
+            logger.success(f"[RECRAWL] Changed: {url}")
+            interval = max(interval / 2, self.min_interval)
+        else:
+            self.unchanged_count += 1
+            interval = min(interval * self.backoff, self.max_interval)
+
+        self.metadata.update(url, interval, changed, etag=response.headers.get('ETag'), last_modified=response.headers.get('Last-Modified'), content_hash=new_content_hash)
+
+    def _render_in_browser(self, url: str):
+        if not self.workers:
+            return None
+
+        worker = self.workers[0]
+        self.browser_fallback_count += 1
+        # The plain request already used its slot, the render is a second request to the host
+        self._wait_for_fetch_slot()
+        fetch_started = time.monotonic()
+        try:
+            del worker.driver.requests
+            worker.driver.get(url)
+            status_code = worker.driver.requests[0].response.status_code
+            self.delay_controller.record(status_code, time.monotonic() - fetch_started)
+            if status_code != 200:
+                return None
+            return worker.driver.page_source
+        except WebDriverException as e:
+            logger.warning(f"[{worker.name}][DRIVER][WebDriverException] Selenium WebDriver Error: {str(e)}")
+            self.delay_controller.record(None)
+            worker._remake_driver()
+            return None
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Incremental recrawl of visited pages')
+    parser.add_argument('--driver', type=str, choices=['chrome', 'firefox'], default=None, help='Browser driver for pages whose plain HTTP response lacks the content (default: no browser)')
+    parser.add_argument('--state-backend', type=str, choices=['pickle', 'sqlite'], default='pickle', help='Crawl state holding the visited pages')
+    parser.add_argument('--page-store', type=str, choices=['gzip', 'zstd'], default=None, help='Pages are kept in the compressed segment store in data/')
+    parser.add_argument('--initial-interval', type=float, default=24, help='First revisit interval of a page (hours)')
+    parser.add_argument('--min-interval', type=float, default=1, help='Shortest revisit interval (hours)')
+    parser.add_argument('--max-interval', type=float, default=30 * 24, help='Longest revisit interval (hours)')
+    parser.add_argument('--once', action='store_true', help='Exit when no page is due instead of waiting for the next one')
+    args = parser.parse_args()
+
+    start_time = datetime.now(tz=timezone(timedelta(hours=2), 'Europe/Bratislava'))
+    logger.info("=" * 50)
+    logger.info(f"Starting recrawl at: {start_time.strftime('%Y-%m-%d %H:%M:%S')}")
+    logger.info(f"PID: {os.getpid()}")
+    logger.info("=" * 50)
+
+    crawler = Recrawler(initial_interval=args.initial_interval * 3600, min_interval=args.min_interval * 3600, max_interval=args.max_interval * 3600, once=args.once,
+                        max_retries=10, save_interval=10, initial_crawl_delay=5, driver_type=args.driver, state_backend=args.state_backend, page_store=args.page_store)
+    crawler.run()
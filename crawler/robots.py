@@ -0,0 +1,61 @@
+import re
+
+
+class RobotsRules:
+    """
+    robots.txt rules of one host following RFC 9309 - the group of our user agent (or `*`), Allow / Disallow
+    with `*` wildcards and `$` end anchors, the longest matching rule wins and Allow wins a tie.
+
+    All rules are compiled into one regex whose alternatives are ordered from the longest rule to the shortest,
+    so the first alternative that matches at the start of the path is the winning rule (`match.lastindex`).
+    """
+
+    def __init__(self, rules=(), sitemaps=()):
+        # Longest pattern first, Allow before Disallow of the same length
+        self.rules: list = sorted(set(rules), key=lambda rule: (-len(rule[1]), not rule[0], rule[1]))  # (allow, pattern)
+        self.sitemaps: list = list(sitemaps)
+        self.matcher: re.Pattern = re.compile('|'.join(f"({self._to_regex(pattern)})" for _, pattern in self.rules)) if self.rules else None
+
+    @staticmethod
+    def _to_regex(pattern: str) -> str:
+        anchored = pattern.endswith('$')
+        regex = '.*'.join(re.escape(part) for part in pattern.rstrip('$').split('*'))
+        return f"{regex}\\Z" if anchored else regex
+
+    @classmethod
+    def parse(cls, content: str, user_agent: str = '*') -> 'RobotsRules':
+        groups: dict = {}  # user agent -> [(allow, pattern)]
+        sitemaps: list = []
+        current_agents: list = []
+        in_rules = False
+
+        for line in content.splitlines():
+            line = line.split('#', 1)[0].strip()
+            if ':' not in line:
+                continue
+            field, value = (part.strip() for part in line.split(':', 1))
+            field = field.lower()
+
+            if field == 'user-agent':
+                # Consecutive user-agent lines share one group
+                if in_rules:
+                    current_agents, in_rules = [], False
+                current_agents.append(value.lower())
+                groups.setdefault(value.lower(), [])
+            elif field in ['allow', 'disallow']:
+                in_rules = True
+                if value:  # An empty Disallow allows everything
+                    for agent in current_agents:
+                        groups[agent].append((field == 'allow', value))
+            elif field == 'sitemap':
+                sitemaps.append(value)
+
+        user_agent = user_agent.lower()
+        rules = groups.get(user_agent) if user_agent in groups else groups.get('*', [])
+        return cls(rules, sitemaps)
+
+    def allowed(self, path: str) -> bool:
+        if self.matcher is None:
+            return True
+        match = self.matcher.match(path or '/')
+        return match is None or self.rules[match.lastindex - 1][0]
@@ -0,0 +1,330 @@
+"""
+Sharded crawling - K crawler processes partition the URL space by the SHA-256 `hash_url` of the canonical URL.
+
+Every shard owns the frontier, visited set and pages of its URLs and keeps them in its own working directory.
+Links owned by another shard are forwarded to it over a `multiprocessing.connection` socket (shard i listens on
+base_port + i), so the shards can run on one machine or on several (--peers). Each shard multiplies its crawl delay
+by the number of shards - all of them together stay within the politeness budget of a single crawler.
+
+One shard:         cd shard-0 && python ../sharding.py --shard-id 0 --num-shards 4
+All shards here:   python sharding.py --num-shards 4 --spawn
+"""
+import os
+import sys
+import time
+import queue
+import argparse
+import multiprocessing
+from multiprocessing.connection import Listener, Client
+from threading import Thread
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from main import Crawler, logger
+
+
+def shard_of(url_hash: str, num_shards: int) -> int:
+    return int(url_hash, 16) % num_shards
+
+
+class LinkForwarder(Thread):
+    """
+    Batches links for one peer shard and sends them - links wait in the queue while the peer is not reachable.
+    A peer that stays unreachable for `give_up_after` seconds has exited (or never started), the forwarder stops
+    trying and its links are handed back by close().
+    """
+
+    def __init__(self, shard_id: int, address: tuple, authkey: bytes, batch_size: int = 500, retry_interval: float = 1.0, give_up_after: float = 60):
+        super().__init__(name=f"forwarder-{shard_id}", daemon=True)
+        self.shard_id = shard_id
+        self.address = address
+        self.authkey = authkey
+        self.batch_size = batch_size
+        self.retry_interval = retry_interval
+        self.give_up_after = give_up_after
+        self.queue: queue.Queue = queue.Queue()
+        self.batch: list = []  # Taken from the queue, not sent yet
+        self.connection = None
+        self.sent_count: int = 0
+        self.stopped: bool = False
+        self.gave_up: bool = False
+        self.failing_since: float = None  # Since when the current batch could not be sent
+
+    def forward(self, url: str):
+        self.queue.put(url)
+
+    def pending(self) -> int:
+        # Links for a peer that was given up on are not waited for, they are saved with the state
+        return 0 if self.gave_up else self.queue.qsize() + len(self.batch)
+
+    def _fill_batch(self):
+        if not self.batch:
+            try:
+                self.batch.append(self.queue.get(timeout=0.5))
+            except queue.Empty:
+                return
+        while len(self.batch) < self.batch_size:
+            try:
+                self.batch.append(self.queue.get_nowait())
+            except queue.Empty:
+                break
+
+    def run(self):
+        while not self.stopped:
+            self._fill_batch()
+            if not self.batch:
+                continue
+            try:
+                if self.connection is None:
+                    self.connection = Client(self.address, authkey=self.authkey)
+                self.connection.send(self.batch)
+                self.sent_count += len(self.batch)
+                self.batch = []
+                self.failing_since = None
+            except (OSError, EOFError):
+                # Peer not started yet or restarting - keep the batch and try again until give_up_after
+                self._disconnect()
+                if self.failing_since is None:
+                    self.failing_since = time.monotonic()
+                elif time.monotonic() - self.failing_since >= self.give_up_after:
+                    self.gave_up = True
+                    logger.warning(f"Shard {self.shard_id} unreachable for {self.give_up_after:.0f}s - keeping its {self.queue.qsize() + len(self.batch)} links for the next run")
+                    return
+                time.sleep(self.retry_interval)
+    def _disconnect(self):
+        if self.connection is not None:
+            try:
+                self.connection.close()
+            except OSError:
+                pass
+            self.connection = None
+
+    def close(self) -> list:
+        """Stops the thread and returns the links that were not delivered."""
+        self.stopped = True
+        self.join()
+        self._disconnect()
+        undelivered = self.batch
+        while True:
+            try:
+                undelivered.append(self.queue.get_nowait())
+            except queue.Empty:
+                return undelivered
+
+
+class ShardedCrawler(Crawler):
+    """
+    Crawler of one shard - keeps the links it owns and forwards the rest to their owner.
+
+    A shard does not stop when its frontier runs dry, other shards may still forward links to it.
+    It exits once it has been idle (nothing queued, in progress, received or waiting to be forwarded) for `idle_timeout` seconds.
+    """
+
+    def __init__(self, shard_id: int, num_shards: int, peers: list, authkey: bytes = b'vinf-crawler', idle_timeout: float = 60, **crawler_options):
+        if not 0 <= shard_id < num_shards:
+            raise ValueError(f"Invalid shard id {shard_id} for {num_shards} shards.")
+        if len(peers) != num_shards:
+            raise ValueError(f"Expected {num_shards} peer addresses, got {len(peers)}.")
+        self.shard_id: int = shard_id
+        self.num_shards: int = num_shards
+        self.peers: list = peers  # (host, port) of every shard, indexed by shard id
+        self.authkey: bytes = authkey
+        self.idle_timeout: float = idle_timeout
+        self.last_activity: float = time.monotonic()
+        self.received_count: int = 0
+        self.forwarders: dict = {}
+        super().__init__(**crawler_options)
+
+        # K shards crawl the same host - each one keeps K times the delay of a single crawler
+        self.delay_controller.min_delay *= num_shards
+        self.delay_controller.max_delay *= num_shards
+        self.delay_controller.delay = self.crawl_delay * num_shards
+        self.crawl_delay = self.delay_controller.delay
+
+        self.forwarders = {peer_id: LinkForwarder(peer_id, tuple(address), authkey, give_up_after=idle_timeout) for peer_id, address in enumerate(peers) if peer_id != shard_id}
+        self.listener: Listener = None
+
+    def owner(self, url: str) -> int:
+        return shard_of(self.hash_url(url), self.num_shards)
+
+    def owns(self, url):
+        # `seen` and the frontier hold only this shard's partition of the URL space
+        return self.owner(url) == self.shard_id
+
+    def forward_link(self, link):
+        owner = self.owner(link)
+        self.forwarders[owner].forward(link)
+        logger.debug(f"Forwarded link to shard {owner}: {link}")
+
+    def receive_links(self, urls: list):
+        with self.state_lock:
+            for url in urls:
+                if url in self.seen:
+                    self.duplicates_suppressed += 1
+                    continue
+                self.seen.add(url)
+                self.to_visit.append([url, 0])
+            self.received_count += len(urls)
+            self.last_activity = time.monotonic()
+
+    def _listen(self):
+        while True:
+            try:
+                connection = self.listener.accept()
+            except (OSError, EOFError):
+                if self.stop_event.is_set():
+                    return
+                continue
+            Thread(target=self._receive, args=(connection,), name='shard-receiver', daemon=True).start()
+
+    def _receive(self, connection):
+        with connection:
+            while True:
+                try:
+                    self.receive_links(connection.recv())
+                except (OSError, EOFError):
+                    return
+
+    def _next_url(self):
+        while True:
+            entry = super()._next_url()
+            if entry is None:
+                if self.max_pages and self.pages_crawled >= self.max_pages:
+                    # Page limit of this run - links not forwarded yet are saved with the state
+                    return None
+                # Peers may still send links - wait until the whole shard has been quiet for idle_timeout.
+                # A forwarder waits at most idle_timeout for its peer before giving up, so this always ends
+                with self.state_lock:
+                    if any(forwarder.pending() for forwarder in self.forwarders.values()) or time.monotonic() - self.last_activity < self.idle_timeout:
+                        return False
+                return None
+            if entry is False:
+                return entry
+
+            url, retry_count = entry
+            owner = self.owner(url)
+            if owner == self.shard_id:
+                with self.state_lock:
+                    self.last_activity = time.monotonic()
+                return entry
+
+            # The base URL seed or state from a run with a different shard count
+            with self.state_lock:
+                self.in_progress.discard(url)
+            self.forwarders[owner].forward(url)
+
+    def crawl(self):
+        self.listener = Listener(tuple(self.peers[self.shard_id]), authkey=self.authkey)
+        Thread(target=self._listen, name='shard-listener', daemon=True).start()
+        for forwarder in self.forwarders.values():
+            forwarder.start()
+        logger.info(f"Shard {self.shard_id}/{self.num_shards} listening on {self.peers[self.shard_id][0]}:{self.peers[self.shard_id][1]} | Crawl delay: {self.crawl_delay:.2f}s")
+        try:
+            super().crawl()
+        finally:
+            self.close_shard()
+
+    def close_shard(self):
+        self.stop_event.set()
+        self.listener.close()
+
+        # Undelivered links go back to the local frontier - saved with the state and forwarded again on the next start
+        undelivered = 0
+        for forwarder in self.forwarders.values():
+            urls = forwarder.close()
+            undelivered += len(urls)
+            with self.state_lock:
+                for url in urls:
+                    self.to_visit.append([url, 0])
+        sent = sum(forwarder.sent_count for forwarder in self.forwarders.values())
+        logger.info(f"Shard {self.shard_id}: forwarded {sent} | received {self.received_count} | undelivered {undelivered}")
+
+
+def parse_peers(peers: str, num_shards: int, host: str, base_port: int) -> list:
+    if not peers:
+        return [(host, base_port + shard_id) for shard_id in range(num_shards)]
+    addresses = []
+    for peer in peers.split(','):
+        peer_host, port = peer.strip().rsplit(':', 1)
+        addresses.append((peer_host, int(port)))
+    return addresses
+
+
+def run_shard(shard_id: int, num_shards: int, peers: list, crawler_options: dict, idle_timeout: float):
+    start_time = datetime.now(tz=timezone(timedelta(hours=2), 'Europe/Bratislava'))
+    logger.info("=" * 50)
+    logger.info(f"Starting shard {shard_id}/{num_shards} at: {start_time.strftime('%Y-%m-%d %H:%M:%S')}")
+    logger.info(f"PID: {os.getpid()} | Working directory: {os.getcwd()}")
+    logger.info("=" * 50)
+
+    crawler = ShardedCrawler(shard_id, num_shards, peers, idle_timeout=idle_timeout, **crawler_options)
+    crawler.run()
+
+
+def spawn_shards(num_shards: int, peers: list, crawler_options: dict, idle_timeout: float, root: str = 'shards'):
+    """Runs every shard as a local process, each one in its own <root>/shard-<i> directory (with its own extract_to TSV)."""
+    context = multiprocessing.get_context('spawn')
+    processes = []
+    cwd = os.getcwd()
+    for shard_id in range(num_shards):
+        options = dict(crawler_options)
+        if options.get('metrics_port'):
+            options['metrics_port'] += shard_id
+        workdir = os.path.join(root, f"shard-{shard_id}")
+        if options.get('extract_to'):
+            # One TSV per shard in its directory - K processes appending to one file would interleave their rows
+            options['extract_to'] = os.path.join(os.path.abspath(workdir), os.path.basename(options['extract_to']))
+
+        # A spawned process starts in the parent's current directory - main.py opens logs/ relative to it on import
+        os.makedirs(os.path.join(workdir, 'logs'), exist_ok=True)
+        os.chdir(workdir)
+        try:
+            process = context.Process(target=run_shard, args=(shard_id, num_shards, peers, options, idle_timeout), name=f"shard-{shard_id}")
+            process.start()
+        finally:
+            os.chdir(cwd)
+        processes.append(process)
+
+    try:
+        for process in processes:
+            process.join()
+    except KeyboardInterrupt:
+        # The shards got the SIGINT too - let them save their state
+        for process in processes:
+            process.join()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Sharded web crawler - one process per hash partition of the URL space')
+    parser.add_argument('--num-shards', type=int, required=True, help='Number of shards K')
+    parser.add_argument('--shard-id', type=int, default=None, help='Shard to run in the current directory (0..K-1)')
+    parser.add_argument('--spawn', action='store_true', help='Run all K shards as local processes in shards/shard-<i>')
+    parser.add_argument('--host', type=str, default='127.0.0.1', help='Listen / peer host when --peers is not given')
+    parser.add_argument('--base-port', type=int, default=7600, help='Shard i listens on base-port + i')
+    parser.add_argument('--peers', type=str, default=None, help='host:port of every shard in shard id order, comma separated (multi-node)')
+    parser.add_argument('--authkey', type=str, default='vinf-crawler', help='Shared secret of the link forwarding connections')
+    parser.add_argument('--idle-timeout', type=float, default=60, help='Exit after the shard has been idle for this many seconds')
+    parser.add_argument('--driver', type=str, choices=['chrome', 'firefox'], default='chrome', help='Choose the browser driver (chrome or firefox)')
+    parser.add_argument('--workers', type=int, default=1, help='Number of pooled browser drivers per shard')
+    parser.add_argument('--no-http-fast-path', action='store_true', help='Render every page in the browser instead of trying a plain HTTP request first')
+    parser.add_argument('--state-backend', type=str, choices=['pickle', 'sqlite'], default='pickle', help='Crawl state of every shard in one pickle or in SQLite')
+    parser.add_argument('--page-store', type=str, choices=['gzip', 'zstd'], default=None, help='Append pages to compressed segment files in data/')
+    parser.add_argument('--base-url', type=str, default='https://world.openfoodfacts.org', help='Site to crawl')
+    parser.add_argument('--max-pages', type=int, default=None, help='Stop every shard after this many pages saved in this run')
+    parser.add_argument('--sitemaps', action='store_true', help='Discovery mode - every shard seeds its own product URLs from the robots.txt sitemaps')
+    parser.add_argument('--metrics-port', type=int, default=None, help='Serve Prometheus metrics, shard i on <port> + i with --spawn')
+    args = parser.parse_args()
+
+    if args.spawn == (args.shard_id is not None):
+        parser.error('Give either --shard-id or --spawn')
+
+    peers = parse_peers(args.peers, args.num_shards, args.host, args.base_port)
+    crawler_options = dict(max_retries=10, save_interval=10, initial_crawl_delay=5, driver_type=args.driver, workers=args.workers, http_fast_path=not args.no_http_fast_path,
+                           state_backend=args.state_backend, page_store=args.page_store, base_url=args.base_url, max_pages=args.max_pages, metrics_port=args.metrics_port, sitemaps=args.sitemaps)
+    authkey = args.authkey.encode('utf-8')
+
+    if args.spawn:
+        spawn_shards(args.num_shards, peers, dict(crawler_options, authkey=authkey), args.idle_timeout)
+    else:
+        run_shard(args.shard_id, args.num_shards, peers, dict(crawler_options, authkey=authkey), args.idle_timeout)
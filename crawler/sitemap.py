@@ -0,0 +1,162 @@
+"""
+Sitemap discovery - streams sitemap indexes and url sets (plain or gzipped XML) listed in robots.txt.
+
+Documents are parsed incrementally with iterparse and every element is dropped once read, so sitemaps with
+tens of thousands of URLs each are never held in memory. Works on URLs and on local files (fixtures).
+
+Run from the crawler directory: python sitemap.py <sitemap url or file> [--since 2024-01-01] [--limit 20]
+"""
+import io
+import gzip
+import argparse
+from collections import namedtuple
+from datetime import datetime, timezone
+from xml.etree.ElementTree import iterparse, ParseError
+
+import requests
+
+
+SitemapEntry = namedtuple('SitemapEntry', ['loc', 'lastmod'])
+
+GZIP_MAGIC = b'\x1f\x8b'
+
+
+def parse_lastmod(value: str):
+    """W3C datetime of <lastmod> (a date or a full timestamp) as an aware datetime, None when missing or invalid."""
+    if not value:
+        return None
+    try:
+        parsed = datetime.fromisoformat(value.strip().replace('Z', '+00:00'))
+    except ValueError:
+        return None
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
+
+def _local_name(tag: str) -> str:
+    return tag.rsplit('}', 1)[-1]
+
+
+def parse_sitemap(stream):
+    """Yields (kind, loc, lastmod) for every <sitemap> (kind 'sitemap') or <url> (kind 'url') entry of the document."""
+    loc = lastmod = None
+    root = None
+    for event, element in iterparse(stream, events=('start', 'end')):
+        if event == 'start':
+            if root is None:
+                root = element
+            continue
+
+        name = _local_name(element.tag)
+        if name == 'loc':
+            loc = (element.text or '').strip()
+        elif name == 'lastmod':
+            lastmod = (element.text or '').strip() or None
+        elif name in ['url', 'sitemap']:
+            if loc:
+                yield name, loc, lastmod
+            loc = lastmod = None
+            # Drop the finished entry - the root would otherwise keep every parsed <url>
+            root.clear()
+
+
+def open_sitemap(session: requests.Session, location: str, timeout: float = 30):
+    """Binary stream of a sitemap URL or local file, transparently un-gzipped (.xml.gz or gzip Content-Encoding)."""
+    if location.startswith('http://') or location.startswith('https://'):
+        response = session.get(location, stream=True, timeout=timeout)
+        response.raise_for_status()
+        response.raw.decode_content = True
+        response.raw.auto_close = False  # Closed by the caller - a fully read small body would close the buffer under it
+        stream = io.BufferedReader(response.raw)
+    else:
+        stream = open(location, 'rb')
+
+    if stream.peek(2)[:2] == GZIP_MAGIC:
+        return gzip.GzipFile(fileobj=stream)
+    return stream
+
+
+class SitemapReader:
+    """
+    Walks sitemap indexes down to their url sets and yields a SitemapEntry per URL.
+
+    `known_lastmod` maps a child sitemap to the <lastmod> it had in the index when it was last read completely -
+    unchanged children are skipped, so a resumed crawl only re-reads the sitemaps that were updated.
+    `before_fetch` is called before every download (the crawler's politeness delay).
+    """
+
+    def __init__(self, session: requests.Session = None, known_lastmod: dict = None, before_fetch=None, max_depth: int = 3):
+        self.session = session or requests.Session()
+        self.known_lastmod: dict = known_lastmod if known_lastmod is not None else {}
+        self.before_fetch = before_fetch
+        self.max_depth = max_depth
+        self.sitemaps_read: int = 0
+        self.sitemaps_skipped: int = 0
+        self.sitemaps_failed: int = 0
+        self.urls_read: int = 0
+
+    def read(self, location: str, depth: int = 0):
+        if depth > self.max_depth:
+            return
+        if self.before_fetch is not None:
+            self.before_fetch()
+
+        try:
+            stream = open_sitemap(self.session, location)
+        except (requests.RequestException, OSError):
+            self.sitemaps_failed += 1
+            return
+
+        children = []
+        with stream:
+            try:
+                for kind, loc, lastmod in parse_sitemap(stream):
+                    if kind == 'url':
+                        self.urls_read += 1
+                        yield SitemapEntry(loc, lastmod)
+                    else:
+                        children.append((loc, lastmod))
+            except (ParseError, OSError, EOFError, requests.RequestException):
+                # Truncated or broken document - the entries read so far are kept, it is not marked as read
+                self.sitemaps_failed += 1
+                return
+        self.sitemaps_read += 1
+
+        # Children are read after the index is closed, one open download at a time
+        for loc, lastmod in children:
+            if lastmod is not None and self.known_lastmod.get(loc) == lastmod:
+                self.sitemaps_skipped += 1
+                continue
+            failed = self.sitemaps_failed
+            yield from self.read(loc, depth + 1)
+            if lastmod is not None and self.sitemaps_failed == failed:
+                self.known_lastmod[loc] = lastmod
+
+    def entries(self, locations, since: datetime = None):
+        """Entries of every sitemap in `locations`, only the ones modified at or after `since` (or without <lastmod>) when given."""
+        for location in locations:
+            for entry in self.read(location):
+                if since is not None:
+                    lastmod = parse_lastmod(entry.lastmod)
+                    if lastmod is not None and lastmod < since:
+                        continue
+                yield entry
+
+    def stats(self) -> dict:
+        return {'read': self.sitemaps_read, 'skipped': self.sitemaps_skipped, 'failed': self.sitemaps_failed, 'urls': self.urls_read}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Stream the URLs of a sitemap (index)')
+    parser.add_argument('location', type=str, help='Sitemap URL or local file (.xml or .xml.gz)')
+    parser.add_argument('--since', type=str, default=None, help='Only URLs with <lastmod> at or after this date')
+    parser.add_argument('--limit', type=int, default=20, help='Number of URLs to print')
+    args = parser.parse_args()
+
+    reader = SitemapReader()
+    since = parse_lastmod(args.since) if args.since else None
+    count = 0
+    for entry in reader.entries([args.location], since=since):
+        if count < args.limit:
+            print(f"{entry.loc}\t{entry.lastmod or ''}")
+        count += 1
+    print(f"URLs: {count} | Sitemaps: {reader.stats()}")
@@ -0,0 +1,310 @@
+import os
+import json
+import time
+import sqlite3
+from threading import RLock
+from datetime import datetime
+
+from frontier import classify_url, URL_CLASS_PRODUCT, URL_CLASS_PRODUCT_LIST, URL_CLASS_OTHER
+from bloom import ScalableBloomFilter, CompactUrlSet
+
+
+class CrawlStateStore:
+    """
+    Disk-backed crawl state in SQLite (WAL mode).
+
+    The frontier, visited / never_crawl / failed sets, URL hashes and the sitemap <lastmod> of seeded URLs live in
+    tables and are exposed through deque-, set- and dict-like views, so the Crawler uses them exactly like the
+    in-memory containers.
+    Every change is written into the open transaction immediately - `checkpoint` only commits those deltas
+    together with the counters, and opening the store again resumes without loading anything into memory.
+
+    With `bloom_error_rate` the visited, never_crawl and seen sets get a scalable Bloom filter in front of
+    their tables (bloom.CompactUrlSet), saved next to the database at every checkpoint.
+    """
+
+    COMPACT_SETS = ['visited', 'never_crawl', 'seen']
+
+    SCHEMA = '''
+        CREATE TABLE IF NOT EXISTS frontier (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            url TEXT NOT NULL UNIQUE,
+            retry_count INTEGER NOT NULL,
+            url_class INTEGER NOT NULL,
+            page_number INTEGER NOT NULL,
+            not_before REAL NOT NULL DEFAULT 0
+        );
+        CREATE INDEX IF NOT EXISTS frontier_priority ON frontier (url_class, page_number, seq);
+        CREATE TABLE IF NOT EXISTS visited (url TEXT PRIMARY KEY) WITHOUT ROWID;
+        CREATE TABLE IF NOT EXISTS never_crawl (url TEXT PRIMARY KEY) WITHOUT ROWID;
+        CREATE TABLE IF NOT EXISTS failed (url TEXT PRIMARY KEY) WITHOUT ROWID;
+        CREATE TABLE IF NOT EXISTS seen (url TEXT PRIMARY KEY) WITHOUT ROWID;
+        CREATE TABLE IF NOT EXISTS url_hashes (hash TEXT PRIMARY KEY, url TEXT NOT NULL) WITHOUT ROWID;
+        CREATE TABLE IF NOT EXISTS url_lastmod (url TEXT PRIMARY KEY, lastmod REAL NOT NULL) WITHOUT ROWID;
+        CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL) WITHOUT ROWID;
+    '''
+
+    def __init__(self, path: str = 'crawler_state.db', bloom_error_rate: float = None):
+        self.path = path
+        self.bloom_error_rate = bloom_error_rate
+        self.lock = RLock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('PRAGMA synchronous=NORMAL')
+        self.connection.executescript(self.SCHEMA)
+        if 'not_before' not in [column[1] for column in self.connection.execute('PRAGMA table_info(frontier)')]:
+            self.connection.execute('ALTER TABLE frontier ADD COLUMN not_before REAL NOT NULL DEFAULT 0')
+
+        self.meta: dict = {key: json.loads(value) for key, value in self.connection.execute('SELECT key, value FROM meta')}
+        self.is_new: bool = not self.meta
+
+        # Row counts are kept with the checkpoint, so resuming never runs COUNT(*) over the tables
+        counts = self.meta.get('counts', {})
+        self.frontier = SqliteFrontier(self, counts.get('frontier', 0), counts.get('frontier_classes', {}), counts.get('frontier_delayed'))
+        self.url_sets: dict = {table: SqliteUrlSet(self, table, counts.get(table, 0)) for table in ['visited', 'never_crawl', 'failed', 'seen']}
+        if not self.is_new and 'seen' not in counts:
+            self._backfill_seen()
+        self.url_hashes = SqliteUrlHashes(self, counts.get('url_hashes', 0))
+        self.url_lastmod = SqliteUrlLastmod(self, counts.get('url_lastmod', 0))
+
+        self.visited = self.url_sets['visited']
+        self.never_crawl = self.url_sets['never_crawl']
+        self.failed = self.url_sets['failed']
+        self.seen = self.url_sets['seen']
+        if bloom_error_rate:
+            self.visited, self.never_crawl, self.seen = [CompactUrlSet(self.url_sets[table], self._load_bloom(table)) for table in self.COMPACT_SETS]
+
+    def execute(self, sql: str, parameters=()):
+        with self.lock:
+            return self.connection.execute(sql, parameters)
+
+    def fetchone(self, sql: str, parameters=()):
+        with self.lock:
+            return self.connection.execute(sql, parameters).fetchone()
+
+    def fetchall(self, sql: str, parameters=()):
+        with self.lock:
+            return self.connection.execute(sql, parameters).fetchall()
+
+    def _backfill_seen(self):
+        # State created before the seen index - every URL ever enqueued is in one of these tables
+        with self.lock:
+            cursor = self.connection.execute('INSERT OR IGNORE INTO seen (url) SELECT url FROM frontier UNION SELECT url FROM visited UNION SELECT url FROM never_crawl UNION SELECT url FROM failed')
+            self.url_sets['seen'].count += cursor.rowcount
+
+    def _bloom_path(self, table: str) -> str:
+        return f"{self.path}.{table}.bloom"
+
+    def _load_bloom(self, table: str) -> ScalableBloomFilter:
+        path = self._bloom_path(table)
+        if os.path.exists(path):
+            bloom = ScalableBloomFilter.load(path)
+            if bloom.tag == self.meta.get('checkpoint_id') and bloom.error_rate == self.bloom_error_rate:
+                return bloom
+
+        # Missing or older than the last commit (e.g. crash right after it) - rebuild from the exact table
+        bloom = ScalableBloomFilter(max(1_000_000, len(self.url_sets[table])), self.bloom_error_rate)
+        with self.lock:
+            for (url,) in self.connection.execute(f'SELECT url FROM {table}'):
+                bloom.add(url)
+        return bloom
+
+    def checkpoint(self, state: dict):
+        """Commits all changes since the last checkpoint together with the crawler counters."""
+        state = dict(state)
+        state['counts'] = {
+            'frontier': len(self.frontier),
+            'frontier_classes': self.frontier.class_counts,
+            'frontier_delayed': self.frontier.delayed_count,
+            'visited': len(self.visited),
+            'never_crawl': len(self.never_crawl),
+            'failed': len(self.failed),
+            'seen': len(self.seen),
+            'url_hashes': len(self.url_hashes),
+            'url_lastmod': len(self.url_lastmod),
+        }
+        if isinstance(state.get('last_delay_adjustment'), datetime):
+            state['last_delay_adjustment'] = state['last_delay_adjustment'].isoformat()
+        state['checkpoint_id'] = self.meta.get('checkpoint_id', 0) + 1
+
+        with self.lock:
+            self.connection.executemany('INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)',
+                                        [(key, json.dumps(value)) for key, value in state.items()])
+            self.connection.commit()
+
+            # Saved after the commit and tagged with it, a filter from an older checkpoint is never trusted
+            if self.bloom_error_rate:
+                for table, compact_set in zip(self.COMPACT_SETS, [self.visited, self.never_crawl, self.seen]):
+                    compact_set.bloom.tag = state['checkpoint_id']
+                    compact_set.bloom.save(self._bloom_path(table))
+        self.meta = state
+        self.is_new = False
+
+    def bloom_stats(self) -> dict:
+        if not self.bloom_error_rate:
+            return {}
+        return {table: {'size_mb': round(compact_set.bloom.size_bytes() / (1024 * 1024), 2), 'false_positives': compact_set.false_positives}
+                for table, compact_set in zip(self.COMPACT_SETS, [self.visited, self.never_crawl, self.seen])}
+
+    def import_state(self, state: dict):
+        """One-time migration of a pickled crawler_state.pkl into the store."""
+        for entry in state.get('to_visit', []):
+            self.frontier.append(entry)
+        for entry in state.get('failed', []):
+            self.frontier.append([entry, 0] if isinstance(entry, str) else entry)
+        for url in state.get('visited', set()):
+            self.visited.add(url)
+        for url in state.get('never_crawl', set()):
+            self.never_crawl.add(url)
+        for url_hash, url in state.get('url_hashes', {}).items():
+            self.url_hashes[url_hash] = url
+        for url, lastmod in state.get('url_lastmod', {}).items():
+            self.url_lastmod[url] = lastmod
+        self._backfill_seen()
+        if self.bloom_error_rate:
+            # The backfill went straight into the table
+            self.seen.bloom = self._load_bloom('seen')
+
+    def close(self):
+        with self.lock:
+            self.connection.commit()
+            self.connection.close()
+
+
+class SqliteFrontier:
+    """
+    Priority frontier in the frontier table with the same interface as frontier.PriorityFrontier.
+
+    URLs pop by (url_class, page_number, seq) through the frontier_priority index, skipping retries whose
+    backoff (not_before) has not passed yet.
+    """
+
+    def __init__(self, store: CrawlStateStore, count: int, class_counts: dict, delayed_count: int = None):
+        self.store = store
+        self.count = count
+        self.class_counts: dict = {url_class: class_counts.get(str(url_class), 0) for url_class in [URL_CLASS_PRODUCT, URL_CLASS_PRODUCT_LIST, URL_CLASS_OTHER]}
+        # Checkpoints from before the backoff count was saved - counted once from the table
+        if delayed_count is None:
+            delayed_count = store.connection.execute('SELECT COUNT(*) FROM frontier WHERE not_before > 0').fetchone()[0]
+        self.delayed_count: int = delayed_count
+
+    def push(self, url: str, retry_count: int = 0, delay: float = 0, lastmod: float = None):
+        url_class, page_number = classify_url(url, lastmod)
+        not_before = time.time() + delay if delay > 0 else 0
+        with self.store.lock:
+            cursor = self.store.execute('INSERT OR IGNORE INTO frontier (url, retry_count, url_class, page_number, not_before) VALUES (?, ?, ?, ?, ?)',
+                                        (url, retry_count, url_class, page_number, not_before))
+            self.count += cursor.rowcount
+            self.class_counts[url_class] += cursor.rowcount
+            if not_before:
+                self.delayed_count += cursor.rowcount
+
+    def append(self, entry):
+        self.push(entry[0], entry[1])
+
+    def extend(self, entries):
+        for entry in entries:
+            self.append(entry)
+
+    def _pop(self, sql: str, parameters=()):
+        with self.store.lock:
+            row = self.store.fetchone(sql, parameters)
+            if row is None:
+                return None
+            seq, url, retry_count, url_class, not_before = row
+            self.store.execute('DELETE FROM frontier WHERE seq = ?', (seq,))
+            self.count -= 1
+            self.class_counts[url_class] -= 1
+            if not_before:
+                self.delayed_count = max(0, self.delayed_count - 1)
+        return [url, retry_count]
+
+    def pop_ready(self):
+        """Returns the next [url, retry_count] whose backoff has passed, or None."""
+        return self._pop('SELECT seq, url, retry_count, url_class, not_before FROM frontier WHERE not_before <= ? ORDER BY url_class, page_number, seq LIMIT 1', (time.time(),))
+
+    def popleft(self):
+        entry = self.pop_ready() or self._pop('SELECT seq, url, retry_count, url_class, not_before FROM frontier ORDER BY not_before LIMIT 1')
+        if entry is None:
+            raise IndexError('pop from an empty frontier')
+        return entry
+
+    def counts(self) -> dict:
+        return {'product': self.class_counts[URL_CLASS_PRODUCT], 'product_list': self.class_counts[URL_CLASS_PRODUCT_LIST],
+                'other': self.class_counts[URL_CLASS_OTHER], 'backed_off': self.delayed_count}
+
+    def __len__(self):
+        return self.count
+
+    def __iter__(self):
+        for url, retry_count in self.store.fetchall('SELECT url, retry_count FROM frontier ORDER BY url_class, page_number, seq'):
+            yield [url, retry_count]
+
+
+class SqliteUrlSet:
+    """set-like view of a single column URL table."""
+
+    def __init__(self, store: CrawlStateStore, table: str, count: int):
+        self.store = store
+        self.table = table
+        self.count = count
+
+    def add(self, url: str):
+        with self.store.lock:
+            cursor = self.store.execute(f'INSERT OR IGNORE INTO {self.table} (url) VALUES (?)', (url,))
+            self.count += cursor.rowcount
+
+    def discard(self, url: str):
+        with self.store.lock:
+            cursor = self.store.execute(f'DELETE FROM {self.table} WHERE url = ?', (url,))
+            self.count -= cursor.rowcount
+
+    def __contains__(self, url: str) -> bool:
+        return self.store.fetchone(f'SELECT 1 FROM {self.table} WHERE url = ?', (url,)) is not None
+
+    def __len__(self):
+        return self.count
+
+    def __iter__(self):
+        for (url,) in self.store.fetchall(f'SELECT url FROM {self.table}'):
+            yield url
+
+
+class SqliteUrlHashes:
+    """dict-like view of the url_hashes table (hash -> url)."""
+
+    TABLE, KEY, VALUE = 'url_hashes', 'hash', 'url'
+
+    def __init__(self, store: CrawlStateStore, count: int):
+        self.store = store
+        self.count = count
+
+    def __setitem__(self, key: str, value):
+        with self.store.lock:
+            exists = key in self
+            self.store.execute(f'INSERT OR REPLACE INTO {self.TABLE} ({self.KEY}, {self.VALUE}) VALUES (?, ?)', (key, value))
+            self.count += 0 if exists else 1
+
+    def __getitem__(self, key: str):
+        row = self.store.fetchone(f'SELECT {self.VALUE} FROM {self.TABLE} WHERE {self.KEY} = ?', (key,))
+        if row is None:
+            raise KeyError(key)
+        return row[0]
+
+    def get(self, key: str, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def __contains__(self, key: str) -> bool:
+        return self.store.fetchone(f'SELECT 1 FROM {self.TABLE} WHERE {self.KEY} = ?', (key,)) is not None
+
+    def __len__(self):
+        return self.count
+
+
+class SqliteUrlLastmod(SqliteUrlHashes):
+    """dict-like view of the url_lastmod table (url -> sitemap <lastmod> as a POSIX timestamp)."""
+
+    TABLE, KEY, VALUE = 'url_lastmod', 'url', 'lastmod'
@@ -0,0 +1,63 @@
+"""
+Per-page comparison of the extraction engines - extract_info (one findall per ExtractRegex field) against
+extract_info_single_pass (one anchor scan of the page), checking that both return the same fields for every page.
+
+Pages come from a crawled data folder (data/<hash>.html or the page store) or, without --data, from the
+synthetic product pages of the crawler's replay server.
+
+Run from the extractor directory: python -m benchmarks.bench_extract_engines [--data ../crawler/data] [--pages 500] [--repeat 3]
+"""
+import os
+import sys
+import glob
+import timeit
+import argparse
+from itertools import islice
+
+from loguru import logger
+
+from extractor import read_html_file
+from vinf_common.fields import extract_info, extract_info_single_pass
+from vinf_common.page_store import PageStoreReader, INDEX_FILE
+
+
+def load_pages(data_folder: str, count: int) -> list:
+    if data_folder is None:
+        # Synthetic corpus of benchmarks/replay_server.py in the crawler
+        sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), '..', 'crawler'))
+        from benchmarks.replay_server import SyntheticCorpus
+        corpus = SyntheticCorpus(products=count, page_kb=60)
+        return [corpus.product_page(index) for index in range(count)]
+
+    if os.path.exists(os.path.join(data_folder, INDEX_FILE)):
+        return [html for _, html in islice(PageStoreReader(data_folder), count)]
+    return [read_html_file(html_file)[1] for html_file in sorted(glob.glob(os.path.join(data_folder, '*.html')))[:count]]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark of the extraction engines')
+    parser.add_argument('--data', type=str, default=None, help='Crawled pages (HTML files or page store) - synthetic pages when omitted')
+    parser.add_argument('--pages', type=int, default=500, help='Number of pages')
+    parser.add_argument('--repeat', type=int, default=3, help='Timing repetitions, the best one is reported')
+    args = parser.parse_args()
+
+    logger.remove()  # Time the extraction, not the per-field debug logging
+    pages = load_pages(args.data, args.pages)
+    if not pages:
+        parser.error(f"No pages found in {args.data}")
+    megabytes = sum(len(page.encode('utf-8')) for page in pages) / (1024 * 1024)
+
+    mismatches = sum(extract_info(page) != extract_info_single_pass(page) for page in pages)
+    results = {}
+    for name, engine in [('regex', extract_info), ('single-pass', extract_info_single_pass)]:
+        best = min(timeit.repeat(lambda: [engine(page) for page in pages], number=1, repeat=args.repeat))
+        results[name] = best
+        print(f"{name:>11}: {best / len(pages) * 1000:7.3f} ms/page | {len(pages) / best:8.1f} pages/s | {megabytes / best:6.1f} MB/s")
+
+    print(f"Pages: {len(pages)} ({megabytes:.1f} MB) | Speedup: {results['regex'] / results['single-pass']:.1f}x | Mismatching pages: {mismatches}")
+    if mismatches:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
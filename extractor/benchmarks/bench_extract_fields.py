@@ -0,0 +1,274 @@
+"""
+Per-field profile of the extraction over a fixed fixture corpus - the time of every ExtractRegex pattern, the
+FIELD_ANCHOR scan, tag stripping and unidecode, and the end to end throughput of extract_info and
+extract_info_single_pass in pages/s and MB/s.
+
+Checks, any failure exits with 1:
+- both engines return the same fields for every page, and the same output as the stored baseline
+- every pattern scales linearly - a document of 2x the pages should take 2x as long. A higher exponent means
+  backtracking that rescans the rest of the document (a lookahead with .* or a lazy span without its end tag)
+- no stage is more than --tolerance slower than in the baseline, measured relative to a fixed calibration regex
+  timed alongside, so a busier or slower machine does not count as a regression
+
+The fixture corpus is the committed fixtures_extract_fields.tar.gz - the crawler's synthetic product pages in three
+shapes: minified onto one line (like the replay server serves them), pretty-printed one tag per line and cut off
+mid-page. A corpus other than the one of the baseline fails the run, save a new baseline together with it.
+--write-fixtures regenerates the archive from the crawler's replay server (needs the crawler directory next to
+this one), --data profiles any other extractor input.
+
+Run from the extractor directory:
+    python -m benchmarks.bench_extract_fields [--data fixtures.tar.gz] [--repeat 5] [--save-baseline] [--tolerance 0.5]
+    python -m benchmarks.bench_extract_fields --write-fixtures benchmarks/fixtures_extract_fields.tar.gz --save-baseline
+"""
+import io
+import os
+import re
+import sys
+import math
+import json
+import time
+import random
+import tarfile
+import hashlib
+import argparse
+
+from loguru import logger
+from unidecode import unidecode
+
+from extractor import read_html_file
+from vinf_common.fields import ExtractRegex, FIELD_ANCHOR, extract_info, extract_info_single_pass
+from corpus import DirectoryCorpus, open_corpus
+
+
+BASELINE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline_extract_fields.json')
+FIXTURES_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures_extract_fields.tar.gz')
+
+FIELDS = [regex for regex in ExtractRegex if regex != ExtractRegex.TAG]
+
+SHAPES = ['minified', 'pretty', 'truncated']
+
+# Fixed workload timed with the stages - the baseline comparison is made relative to it, which cancels out
+# how fast the machine is at the moment. Never change it, that invalidates every stored baseline
+CALIBRATION: re.Pattern = re.compile(r'<[a-z]+\s[^>]*>')
+
+# Exponent of time over document size above which a pattern counts as superlinear - linear is 1, quadratic 2
+SUPERLINEAR_EXPONENT = 1.5
+
+
+def make_fixtures(count: int = 300, seed: int = 7) -> list:
+    """
+    Returns [(name, html)] - the synthetic product pages, one shape each in turn. The padding is kept at 1 KB, it is
+    random text that does not compress and would only bloat the committed archive.
+    """
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), '..', 'crawler'))
+    from benchmarks.replay_server import SyntheticCorpus
+    corpus = SyntheticCorpus(products=count, page_kb=1, seed=seed)
+    rng = random.Random(seed)
+    fixtures = []
+    for index in range(count):
+        page, shape = corpus.product_page(index), SHAPES[index % len(SHAPES)]
+        if shape == 'pretty':
+            page = page.replace('>', '>\n')
+        elif shape == 'truncated':
+            # Cut inside the product fields - the end tags of the lazy spans are missing
+            body = page.index('<body>')
+            page = page[:rng.randrange(body, len(page))]
+        fixtures.append((f"{index:05d}-{shape}", page))
+    return fixtures
+
+
+def write_fixtures(fixtures: list, path: str):
+    with tarfile.open(path, 'w:gz') as archive:
+        for name, page in fixtures:
+            data = page.encode('utf-8')
+            member = tarfile.TarInfo(f"{name}.html")
+            member.size, member.mtime = len(data), 0
+            archive.addfile(member, io.BytesIO(data))
+
+
+def load_fixtures(data: str) -> list:
+    """Returns [(url_hash, html)] of any extractor input (folder, archive or page store), sorted by url_hash."""
+    page_store = os.path.isdir(data) and os.path.exists(os.path.join(data, 'index.tsv'))
+    corpus = open_corpus(data, page_store)
+    tasks, _ = corpus.scan(lambda url_hash, signature: True)
+    if isinstance(corpus, DirectoryCorpus):
+        tasks = map(read_html_file, tasks)
+    return sorted(tasks)
+
+
+def time_per_page(function, inputs: list, repeat: int) -> list:
+    """Seconds of function(input) for every input, the best of `repeat` runs each."""
+    best = [math.inf] * len(inputs)
+    for _ in range(repeat):
+        for index, value in enumerate(inputs):
+            start = time.perf_counter()
+            function(value)
+            best[index] = min(best[index], time.perf_counter() - start)
+    return best
+
+
+def profile(pages: list, repeat: int) -> dict:
+    """
+    Returns stage name -> seconds per page, from the single field patterns up to the whole extraction. The stages
+    take turns in every repetition, so a machine slowing down during the run affects all of them alike.
+    """
+    # Cleanup stages get the field matches of each page, exactly what clean_matches receives
+    matches = [[match for regex in FIELDS for match in regex.value.findall(page)] for page in pages]
+    stripped = [[ExtractRegex.TAG.value.sub(' ', match).strip() for match in page_matches] for page_matches in matches]
+    texts = [' '.join(page_stripped).replace('&nbsp;', ' ').replace('\n', '') for page_stripped in stripped]
+
+    stages = {f"field:{regex.name}": (regex.value.findall, pages) for regex in FIELDS}
+    stages['field_anchor'] = (lambda page: list(FIELD_ANCHOR.finditer(page)), pages)
+    stages['tag_strip'] = (lambda page_matches: [ExtractRegex.TAG.value.sub(' ', match).strip() for match in page_matches], matches)
+    stages['unidecode'] = (unidecode, texts)
+    stages['extract_info'] = (extract_info, pages)
+    stages['extract_info_single_pass'] = (extract_info_single_pass, pages)
+    stages['calibration'] = (CALIBRATION.findall, pages)
+
+    timings = {name: [math.inf] * len(values) for name, (_, values) in stages.items()}
+    for _ in range(repeat):
+        for name, (function, values) in stages.items():
+            timings[name] = list(map(min, timings[name], time_per_page(function, values, 1)))
+    return timings
+
+
+def scaling(pages: list, repeat: int, steps: int = 4, block_pages: int = 4) -> dict:
+    """
+    Returns pattern name -> exponent of its time over the document size, fitted (log-log slope) over documents of
+    2, 4, 8, ... copies of the same block of pages - every step adds the same content, so a linear pattern is at 1
+    (a single copy is left out, a lazy span left open at its end has no next copy to run into).
+    Pages on one line and pages with line breaks are measured apart (a lookahead with .* only rescans to the end
+    of the line) and the higher exponent is kept.
+    """
+    groups = [group for group in [[page for page in pages if '\n' not in page], [page for page in pages if '\n' in page]] if group]
+    patterns = {regex.name: regex.value for regex in FIELDS}
+    patterns['field_anchor'] = FIELD_ANCHOR
+
+    exponents = dict.fromkeys(patterns, 0.0)
+    for group in groups:
+        block = ''.join(group[:block_pages])
+        documents = [block * 2 ** step for step in range(1, steps + 1)]
+        xs = [math.log(len(document)) for document in documents]
+        x_mean = sum(xs) / len(xs)
+        for name, pattern in patterns.items():
+            ys = [math.log(max(seconds, 1e-9)) for seconds in time_per_page(pattern.findall, documents, repeat)]
+            y_mean = sum(ys) / len(ys)
+            slope = sum((x - x_mean) * (y - y_mean) for x, y in zip(xs, ys)) / sum((x - x_mean) ** 2 for x in xs)
+            exponents[name] = max(exponents[name], slope)
+    return exponents
+
+
+def output_digest(outputs: list) -> str:
+    digest = hashlib.sha256()
+    for output in outputs:
+        digest.update(json.dumps(output, sort_keys=True).encode('utf-8'))
+    return digest.hexdigest()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Per-field extraction profile and regression check')
+    parser.add_argument('--data', type=str, default=FIXTURES_FILE, help='Fixture corpus (HTML folder, archive or page store)')
+    parser.add_argument('--pages', type=int, default=300, help='Number of generated fixture pages')
+    parser.add_argument('--repeat', type=int, default=5, help='Timing repetitions, the best one of each page is kept')
+    parser.add_argument('--write-fixtures', type=str, default=None, help='Regenerate the fixture corpus into this .tar.gz and profile it')
+    parser.add_argument('--baseline', type=str, default=BASELINE_FILE, help='Baseline JSON to compare with')
+    parser.add_argument('--save-baseline', action='store_true', help='Store this run as the baseline instead of comparing')
+    parser.add_argument('--tolerance', type=float, default=0.5, help='Allowed slowdown against the baseline (0.5 = 50%%)')
+    parser.add_argument('--noise-ms', type=float, default=0.001, help='Slowdowns below this many ms per page are never regressions')
+    parser.add_argument('--output', type=str, default=None, help='Write the results as JSON')
+    args = parser.parse_args()
+
+    if args.write_fixtures:
+        write_fixtures(make_fixtures(args.pages), args.write_fixtures)
+        print(f"Wrote {args.pages} fixture pages to {args.write_fixtures}")
+        args.data = args.write_fixtures
+
+    logger.remove()  # Time the extraction, not the per-field debug logging
+    if not os.path.exists(args.data):
+        parser.error(f"Fixture corpus {args.data} not found - regenerate it with --write-fixtures")
+    fixtures = load_fixtures(args.data)
+    if not fixtures:
+        parser.error(f"No pages found in {args.data}")
+    pages = [page for _, page in fixtures]
+    megabytes = sum(len(page.encode('utf-8')) for page in pages) / (1024 * 1024)
+    corpus_digest = hashlib.sha256(''.join(name + page for name, page in fixtures).encode('utf-8')).hexdigest()
+
+    outputs = [extract_info(page) for page in pages]
+    mismatches = [name for (name, page), output in zip(fixtures, outputs) if extract_info_single_pass(page) != output]
+
+    timings = profile(pages, args.repeat)
+    exponents = scaling(pages, args.repeat)
+    total = sum(timings['extract_info'])
+    results = {
+        'corpus': {'pages': len(pages), 'megabytes': round(megabytes, 3), 'sha256': corpus_digest},
+        'output_sha256': output_digest(outputs),
+        'ms_per_page': {name: sum(seconds) / len(pages) * 1000 for name, seconds in timings.items()},
+        'worst_page_ms': {name: max(seconds) * 1000 for name, seconds in timings.items()},
+        'relative': {name: sum(seconds) / sum(timings['calibration']) for name, seconds in timings.items()},
+        'scaling_exponent': exponents,
+    }
+
+    baseline, failed = None, False
+    if not args.save_baseline:
+        if not os.path.exists(args.baseline):
+            print(f"No baseline at {args.baseline} - store one with --save-baseline")
+            failed = True
+        else:
+            with open(args.baseline, 'r', encoding='utf-8') as f:
+                baseline = json.load(f)
+            if baseline['corpus']['sha256'] != corpus_digest:
+                # Timings and output of another corpus say nothing about this one - a silent pass would hide regressions
+                print(f"Fixture corpus {corpus_digest[:12]} differs from {baseline['corpus']['sha256'][:12]} of {args.baseline} - "
+                      f"save a new baseline with the corpus")
+                baseline, failed = None, True
+
+    print(f"{'stage':<32}{'ms/page':>10}{'worst ms':>10}{'share':>8}{'scaling':>9}{'baseline':>10}")
+    regressions = []
+    for name, seconds in timings.items():
+        ms_per_page = results['ms_per_page'][name]
+        pattern = name.split(':', 1)[-1]
+        exponent = exponents.get(pattern)
+        flags = []
+        if exponent is not None and exponent > SUPERLINEAR_EXPONENT:
+            flags.append('SUPERLINEAR')
+            # Only a new superlinear pattern fails, a known one is reported every run
+            if baseline is not None and baseline['scaling_exponent'].get(pattern, 0) <= SUPERLINEAR_EXPONENT:
+                regressions.append(f"{pattern} became superlinear (exponent {exponent:.2f})")
+        baseline_ms = baseline['ms_per_page'].get(name) if baseline is not None else None
+        if baseline_ms is not None and name != 'calibration':
+            # Compared in units of the calibration workload, absolute times only decide what is noise
+            ratio = results['relative'][name] / baseline['relative'][name] if baseline['relative'][name] else 1
+            if ratio > 1 + args.tolerance and ms_per_page - baseline_ms > args.noise_ms:
+                flags.append('SLOWER')
+                regressions.append(f"{name}: {ratio - 1:.0%} slower relative to the calibration workload ({ms_per_page:.3f} ms/page, {baseline_ms:.3f} in the baseline)")
+        share = f"{sum(seconds) / total:7.1%}" if name.startswith('field') or name in ['tag_strip', 'unidecode'] else ''
+        print(f"{name:<32}{ms_per_page:>10.3f}{results['worst_page_ms'][name]:>10.3f}{share:>8}"
+              f"{'' if exponent is None else f'{exponent:.2f}':>9}{'' if baseline_ms is None else f'{baseline_ms:.3f}':>10}  {' '.join(flags)}")
+
+    for name in ['extract_info', 'extract_info_single_pass']:
+        seconds = sum(timings[name])
+        print(f"{name:>24}: {len(pages) / seconds:8.1f} pages/s | {megabytes / seconds:6.1f} MB/s")
+    print(f"Pages: {len(pages)} ({megabytes:.1f} MB) | Mismatching pages between the engines: {len(mismatches)}")
+
+    failed = failed or bool(mismatches) or bool(regressions)
+    for name in mismatches[:10]:
+        print(f"Engines differ on {name}")
+    if baseline is not None and baseline['output_sha256'] != results['output_sha256']:
+        print("Extracted output differs from the baseline")
+        failed = True
+    for regression in regressions:
+        print(f"Regression - {regression}")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+    if args.save_baseline:
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+        print(f"Baseline saved to {args.baseline}")
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
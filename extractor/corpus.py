@@ -0,0 +1,186 @@
+"""
+Input corpora of the extractor - pages are read straight from their compressed form, no unpacked data/ directory needed:
+
+- a directory of <url_hash>.html files, each one optionally compressed as <url_hash>.html.gz or <url_hash>.html.zst
+- a tar archive (.tar, .tar.gz / .tgz, .tar.zst) of such files, read front to back as one stream
+- the crawler's segmented page store (--page-store)
+
+Every corpus scans its pages with a `select(url_hash, signature)` callback (the manifest check of incremental runs)
+and returns only the selected ones. Pages read by the main process go through `prefetch`, so reading and
+decompressing the next pages overlaps with extracting the current ones.
+"""
+import io
+import os
+import gzip
+import tarfile
+from queue import Queue, Full
+from threading import Thread, Event
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+from vinf_common.page_store import PageStoreReader
+from manifest import file_signature, content_signature, data_signature, store_signature
+
+
+HTML_SUFFIXES = ('.html', '.html.gz', '.html.zst')
+ARCHIVE_SUFFIXES = ('.tar', '.tar.gz', '.tgz', '.tar.zst')
+
+
+def _require_zstandard(path: str):
+    if zstandard is None:
+        raise ImportError(f"Reading {path} needs the 'zstandard' package (pip install zstandard)")
+
+
+def page_hash(name: str):
+    """url_hash of a <url_hash>.html[.gz|.zst] file or archive member name, None for anything else."""
+    name = os.path.basename(name)
+    for suffix in HTML_SUFFIXES:
+        if name.endswith(suffix):
+            return name[:-len(suffix)]
+    return None
+
+
+def open_html(path: str):
+    """Text stream of a plain or compressed HTML file - decoded with universal newlines like a plain open() would."""
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rt', encoding='utf-8')
+    if path.endswith('.zst'):
+        _require_zstandard(path)
+        return zstandard.open(path, 'rt', encoding='utf-8')
+    return open(path, 'r', encoding='utf-8')
+
+
+def decode_html(name: str, data: bytes) -> str:
+    """HTML of the raw bytes of a plain or compressed file called `name`, decoded the same way as open_html."""
+    if name.endswith('.gz'):
+        data = gzip.decompress(data)
+    elif name.endswith('.zst'):
+        _require_zstandard(name)
+        data = zstandard.ZstdDecompressor().decompressobj().decompress(data)
+    return io.TextIOWrapper(io.BytesIO(data), encoding='utf-8').read()
+
+
+def is_archive(path: str) -> bool:
+    return os.path.isfile(path) and path.endswith(ARCHIVE_SUFFIXES)
+
+
+class DirectoryCorpus:
+    """<url_hash>.html[.gz|.zst] files of a directory - selected pages are returned as paths, read where they are extracted."""
+
+    def __init__(self, directory: str, content_hash: bool = False):
+        self.directory = directory
+        self.content_hash = content_hash
+
+    def scan(self, select):
+        paths = []
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                url_hash = page_hash(entry.name)
+                if url_hash is None or not entry.is_file():
+                    continue
+                signature = content_signature(entry.path) if self.content_hash else file_signature(entry.stat())
+                if select(url_hash, signature):
+                    paths.append(entry.path)
+        return paths, len(paths)
+
+
+class PageStoreCorpus:
+    """The crawler's page store - selected pages are read in storage order as (url_hash, html)."""
+
+    def __init__(self, directory: str):
+        self.reader = PageStoreReader(directory)
+
+    def scan(self, select):
+        selected = {url_hash for url_hash, (segment, offset, length, _) in self.reader.entries.items()
+                    if select(url_hash, store_signature(segment, offset, length))}
+        return self.reader.pages(selected), len(selected)
+
+
+class ArchiveCorpus:
+    """
+    Tar archive of HTML files, streamed without seeking - members are selected as the stream reaches them,
+    so the number of selected pages is only known at its end. Members are signed by their size and mtime.
+    """
+
+    def __init__(self, path: str, content_hash: bool = False):
+        if path.endswith('.zst'):
+            _require_zstandard(path)
+        self.path = path
+        self.content_hash = content_hash
+
+    def scan(self, select):
+        return self.pages(select), None
+
+    def pages(self, select):
+        with open(self.path, 'rb') as raw:
+            if self.path.endswith('.zst'):
+                # tarfile only knows gzip, bz2 and xz - zstd is decompressed in front of it
+                archive = tarfile.open(fileobj=zstandard.ZstdDecompressor().stream_reader(raw), mode='r|')
+            else:
+                archive = tarfile.open(fileobj=raw, mode='r|*')
+            with archive:
+                for member in archive:
+                    url_hash = page_hash(member.name)
+                    if url_hash is None or not member.isfile():
+                        continue
+                    if self.content_hash:
+                        data = archive.extractfile(member).read()
+                        if select(url_hash, data_signature(data)):
+                            yield url_hash, decode_html(member.name, data)
+                    elif select(url_hash, f"{member.size}:{member.mtime}"):
+                        yield url_hash, decode_html(member.name, archive.extractfile(member).read())
+
+
+def open_corpus(data: str, page_store: bool = False, content_hash: bool = False):
+    if page_store:
+        return PageStoreCorpus(data)
+    if is_archive(data):
+        return ArchiveCorpus(data, content_hash)
+    return DirectoryCorpus(data, content_hash)
+
+
+_END = object()
+
+
+def prefetch(iterable, size: int = 64):
+    """
+    Iterates `iterable` in a background thread at most `size` items ahead of the consumer. File reads and
+    gzip / zstd decompression release the GIL, so they run while the consumer extracts or dispatches pages.
+    """
+    items = Queue(maxsize=size)
+    stopped = Event()
+
+    def put(item) -> bool:
+        while not stopped.is_set():
+            try:
+                items.put(item, timeout=0.1)
+                return True
+            except Full:
+                continue
+        return False
+
+    def produce():
+        try:
+            for item in iterable:
+                if not put((item, None)):
+                    return
+            put((_END, None))
+        except BaseException as e:
+            put((_END, e))
+
+    thread = Thread(target=produce, name='prefetch', daemon=True)
+    thread.start()
+    try:
+        while True:
+            item, error = items.get()
+            if item is _END:
+                if error is not None:
+                    raise error
+                return
+            yield item
+    finally:
+        stopped.set()
+        thread.join()
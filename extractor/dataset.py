@@ -0,0 +1,164 @@
+"""
+The extracted dataset - one row per page with the ExtractRegex fields and LINK, either as the merged
+tab separated file (header line first) or, for a path ending in .parquet, the same string columns in Parquet.
+"""
+import os
+
+try:
+    import pyarrow
+    import pyarrow.parquet as parquet
+except ImportError:
+    pyarrow = None
+
+
+PARQUET_EXTENSION = '.parquet'
+
+
+def is_parquet(path: str) -> bool:
+    return path.endswith(PARQUET_EXTENSION)
+
+
+def _require_pyarrow(path: str):
+    if pyarrow is None:
+        raise ImportError(f"Reading or writing {path} needs the 'pyarrow' package (pip install pyarrow)")
+
+
+class TsvWriter:
+    """Rows appended to one tab separated file through a large write buffer - no file per page, nothing to merge."""
+
+    def __init__(self, path: str, header: list, buffer_size: int = 1024 * 1024):
+        self.path = path
+        self.file = open(path, 'w', encoding='utf-8', buffering=buffer_size)
+        self.file.write('\t'.join(header) + '\n')
+        self.rows: int = 0
+
+    def write(self, row: list):
+        self.file.write('\t'.join(row) + '\n')
+        self.rows += 1
+
+    def close(self):
+        self.file.close()
+
+
+class ParquetWriter:
+    """Rows collected column-wise and written as one row group per `row_group_size` rows."""
+
+    def __init__(self, path: str, header: list, row_group_size: int = 50_000):
+        _require_pyarrow(path)
+        self.path = path
+        self.header = header
+        self.row_group_size = row_group_size
+        self.schema = pyarrow.schema([(column, pyarrow.string()) for column in header])
+        self.writer = parquet.ParquetWriter(path, self.schema, compression='zstd')
+        self.columns: list = [[] for _ in header]
+        self.rows: int = 0
+
+    def write(self, row: list):
+        for column, value in zip(self.columns, row):
+            column.append(value)
+        self.rows += 1
+        if len(self.columns[0]) >= self.row_group_size:
+            self.flush()
+
+    def flush(self):
+        if self.columns[0]:
+            self.writer.write_table(pyarrow.Table.from_arrays([pyarrow.array(column, pyarrow.string()) for column in self.columns], schema=self.schema))
+            self.columns = [[] for _ in self.header]
+
+    def close(self):
+        self.flush()
+        self.writer.close()
+
+
+def open_writer(path: str, header: list):
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    return ParquetWriter(path, header) if is_parquet(path) else TsvWriter(path, header)
+
+
+def read_header(path: str) -> list:
+    if is_parquet(path):
+        _require_pyarrow(path)
+        return parquet.read_schema(path).names
+    with open(path, 'r', encoding='utf-8') as f:
+        return f.readline().rstrip('\n').split('\t')
+
+
+def count_rows(path: str) -> int:
+    if is_parquet(path):
+        _require_pyarrow(path)
+        return parquet.ParquetFile(path).metadata.num_rows
+    with open(path, 'r', encoding='utf-8') as f:
+        return sum(1 for _ in f) - 1
+
+
+def iter_rows(path: str, batch_size: int = 10_000):
+    """
+    Yields every data row as a list of strings in header order - Parquet is read one record batch at a time.
+    TSV fields are returned exactly as written, empty leading or trailing fields included, so both formats
+    give the same rows.
+    """
+    if is_parquet(path):
+        _require_pyarrow(path)
+        for batch in parquet.ParquetFile(path).iter_batches(batch_size=batch_size):
+            yield from map(list, zip(*(column.to_pylist() for column in batch.columns)))
+        return
+
+    with open(path, 'r', encoding='utf-8') as f:
+        next(f)  # Skip the header line
+        for line in f:
+            yield line.rstrip('\r\n').split(sep='\t')
+
+
+def partitions(path: str, parts: int) -> list:
+    """
+    Splits the data rows into up to `parts` contiguous (start, end) ranges for iter_partition - byte ranges
+    beginning at line starts for TSV, ranges of row groups for Parquet. Together they cover every row once, in order.
+    """
+    if is_parquet(path):
+        _require_pyarrow(path)
+        groups = parquet.ParquetFile(path).metadata.num_row_groups
+        bounds = [groups * part // parts for part in range(parts + 1)]
+        return [(start, end) for start, end in zip(bounds, bounds[1:]) if start < end]
+
+    size = os.path.getsize(path)
+    with open(path, 'rb') as f:
+        f.readline()  # Skip the header line
+        starts = [f.tell()]
+        for part in range(1, parts):
+            # Move to the start of the line running through the split point
+            f.seek(max(size * part // parts, starts[-1]) - 1)
+            f.readline()
+            if starts[-1] < f.tell() < size:
+                starts.append(f.tell())
+    return list(zip(starts, starts[1:] + [size]))
+
+
+def _text_lines(line: str) -> list:
+    """One \\n terminated line of the file split the way a text mode file (universal newlines) splits it."""
+    if '\r' not in line:
+        return [line]
+    lines = line.replace('\r\n', '\n').split('\r')
+    return lines[:-1] if lines[-1] == '' else lines
+
+
+def iter_partition(path: str, partition: tuple, batch_size: int = 10_000):
+    """Yields the data rows of one range from `partitions`, exactly as iter_rows yields them."""
+    start, end = partition
+    if is_parquet(path):
+        _require_pyarrow(path)
+        for batch in parquet.ParquetFile(path).iter_batches(batch_size=batch_size, row_groups=list(range(start, end))):
+            yield from map(list, zip(*(column.to_pylist() for column in batch.columns)))
+        return
+
+    with open(path, 'rb') as f:
+        f.seek(start)
+        position = start
+        while position < end:
+            raw_line = f.readline()
+            if not raw_line:
+                break
+            position += len(raw_line)
+            for line in _text_lines(raw_line.decode('utf-8')):
+                yield line.rstrip('\r\n').split(sep='\t')
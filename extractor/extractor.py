@@ -1,51 +1,15 @@
 
 import os
-from enum import Enum
-import re
-import pandas as pd
-import glob
 from loguru import logger
 import sys
 from tqdm import tqdm
-import csv
-from unidecode import unidecode
 import argparse
-
-class ExtractRegex(Enum):
-    
-    # [\s\S]*?
-
-    TAG: re.Pattern = re.compile(r'<[^>]*>')
-    #END_TAG: re.Pattern = re.compile(r'</[^>]*>')
-    
-    PRODUCT_NAME: re.Pattern = re.compile(r'<h2\s+class=\"title-1\"\s+property=\"food:name\"\s+itemprop=\"name\">[\s\S]*?</h2>')
-    
-    BRANDS: re.Pattern = re.compile(r'<span\s+class=\"field_value\"\s+id=\"field_brands_value\">[\s\S]*?</span>')
-    
-    PACKAGING: re.Pattern = re.compile(r'<span\s+class=\"field_value\"\s+id=\"field_packaging_value\">[\s\S]*?</span>')
-    
-    CATEGORIES: re.Pattern = re.compile(r'<span\s+class=\"field_value\"\s+id=\"field_categories_value\">[\s\S]*?</span>')
-    
-    STORES: re.Pattern = re.compile(r'<span\s+class=\"field_value\"\s+id=\"field_stores_value\">[\s\S]*?</span>')
-    
-    COUNTRIES_WHERE_SOLD: re.Pattern = re.compile(r'<span\s+class=\"field_value\"\s+id=\"field_countries_value\">[\s\S]*?</span>')
-    
-    NUTRI_SCORE: re.Pattern = re.compile(r'<a\s+href=\"#panel_nutriscore_[0-9]{1,4}\"\s+onclick=\"[\s\S]*?\">[\s\S]*?</a>')  # TODO LOOK INTO THIS
-    
-    NOVA_SCORE: re.Pattern = re.compile(r'<a\s+href=\"#panel_nova\"\s+onclick=\"[\s\S]*?\">[\s\S]*?</a>')
-    
-    ECO_SCORE: re.Pattern = re.compile(r'<a\s+href=\"#panel_ecoscore\"\s+onclick=\"[\s\S]*?\">[\s\S]*?</a>')
-    
-    INGREDIENTS: re.Pattern = re.compile(r'<div\s+id=\"panel_ingredients_content\"\s+class=\"content\s+panel_content\s+active\s+expand-for-large\">[\s\S]*?</div>')
-    
-    ALLERGENS: re.Pattern = re.compile(r'(?<=Allergens:)</strong>[\s\S]*?</div>')
-    
-    TRACES: re.Pattern = re.compile(r'(?<=Traces:)</strong>[\s\S]*?</div>')
-    
-    ADDITIVES: re.Pattern = re.compile(r'<a\s+href=\"#panel_additive[\s\S]*?\"[\s\S]*?>[\s\S]*?</h4>')
-    
-    ADDITIVES_ANALYSIS: re.Pattern = re.compile(r'<a\s+href=\"#panel_ingredients_analysis(?!.*_details_content)[^\"]*?\"[^\>]*?>[\s\S]*?</h4>')
-    
+from functools import partial
+from multiprocessing import Pool
+from dataset import open_writer, read_header, iter_rows
+from manifest import ExtractionManifest, manifest_path
+from corpus import DirectoryCorpus, open_corpus, open_html, page_hash, prefetch
+from vinf_common.fields import EXTRACTOR_VERSION, EXTRACT_ENGINES, COLUMNS
 
 def load_url_hashes(file_path):
     url_hashes = {}
@@ -55,108 +19,129 @@ def load_url_hashes(file_path):
             url_hashes[hash_value] = url
     return url_hashes
 
-def extract_info(html: str):
-    #logger.info("Starting information extraction from HTML")
-    extracted_info = {}
-    for regex in ExtractRegex:
-        if regex == ExtractRegex.TAG:
-            continue
-        
-        matches = regex.value.findall(html)
-        if matches:
-            _extracted = [ExtractRegex.TAG.value.sub(' ', match).strip() for match in matches] # CLEAR ALL HTML TAGS + Strip (only deletes whitespaces before and after) and merge to one sentence
-            _extracted_text = unidecode(' '.join(_extracted).replace('&nbsp;', ' ').replace('\n', ''))
-           # _extracted_text = re.sub(r'[^A-Za-z0-9]', ' ', extracted_text).lower()
+def read_html_file(html_file: str):
+    """Returns (file_hash, html) of one data/<hash>.html file, or its .html.gz / .html.zst version."""
+    logger.debug(f"Processing file: {html_file}")
+    with open_html(html_file) as file:
+        html_content = file.read()
+    
+    # Extract hash from html filename
+    return page_hash(html_file), html_content
 
-            _extracted_text = re.sub(r'\s{2,}', ' ', _extracted_text)
-            extracted_info[regex.name] = _extracted_text  # Wrap the extracted text in a list
-            logger.debug(f"Extracted {len(_extracted)} items for {regex.name}")
-        else:
-            extracted_info[regex.name] = ''
-            logger.debug(f"No matches found for {regex.name}")
-    return extracted_info
+def extract_html_file(html_file: str, engine: str = 'regex'):
+    file_hash, html_content = read_html_file(html_file)
+    return file_hash, EXTRACT_ENGINES[engine](html_content)
 
-def merge_files(output_folder: str, merged_output: str):
-    # Merge all files
-    logger.info("Merging all files")
-    files = [f for f in glob.glob(os.path.join(output_folder, '*')) if not os.path.basename(f).startswith('_')]
-    merged_output_path = os.path.join(os.getcwd(), merged_output)
-    
-    with open(merged_output_path, 'w', encoding='utf-8') as outfile:
-        # Write header from the first file
-        with open(files[0], 'r', encoding='utf-8') as first_file:
-            header = first_file.readline().strip()
-            outfile.write(header + '\n')
-        
-        # Process all files
-        for file in tqdm(files, desc="Merging files", unit="files"):
-            with open(file, 'r', encoding='utf-8') as infile:
-                next(infile)  # Skip header
-                
-                # Write all data rows
-                for line in infile:
-                    outfile.write(line)
-    
-    logger.info(f"Saved merged data to {merged_output_path}")
-    
+def extract_page(page: tuple, engine: str = 'regex'):
+    file_hash, html_content = page
+    return file_hash, EXTRACT_ENGINES[engine](html_content)
 
-def process_html_files(data_folder: str, output_folder: str, url_hashes_file: str, merged_output: str, skip_processed: bool = False):
+def init_worker():
+    # Spawned workers start with loguru's default DEBUG sink - extract_info would log every field of every page
+    logger.remove()
+    logger.add(sys.stderr, level="WARNING")
+
+def process_html_files(data_folder: str, url_hashes_file: str, merged_output: str, skip_processed: bool = False, page_store: bool = False,
+                       workers: int = 1, chunksize: int = 16, ordered: bool = False, engine: str = 'regex', content_hash: bool = False,
+                       prefetch_size: int = 64):
     logger.info(f"Starting processing of HTML files from {data_folder}")
-    os.makedirs(output_folder, exist_ok=True)
-    
-    header = None
-    
-    if skip_processed:
-        logger.info("Skipping processed files")
-        merge_files(output_folder, merged_output)
-        return
     
     url_hashes = load_url_hashes(url_hashes_file)
-
-    html_files = glob.glob(os.path.join(data_folder, '*.html'))
-    for html_file in tqdm(html_files, desc="Processing HTML files", unit="files"):
-        logger.debug(f"Processing file: {html_file}")
-        with open(html_file, 'r', encoding='utf-8') as file:
-            html_content = file.read()
-        
-        extracted_info = extract_info(html_content)
-        
-        # Extract hash from html filename
-        file_hash = os.path.splitext(os.path.basename(html_file))[0]
-        
-        # Add LINK to extracted_info
-        extracted_info['LINK'] = url_hashes.get(file_hash, '')
+    corpus = open_corpus(data_folder, page_store, content_hash)
+    
+    # With skip_processed the rows of unchanged pages are carried over from the previous output, rows of changed and
+    # deleted pages are dropped and only new / changed pages are extracted
+    previous = ExtractionManifest.load(manifest_path(merged_output))
+    if not skip_processed or not os.path.exists(merged_output) or read_header(merged_output) != COLUMNS:
+        previous.entries = {}
+    manifest = ExtractionManifest(previous.path)
+    signatures = {}  # url_hash -> signature of every page in the corpus
+    carried = {}  # url_hash -> manifest entry of the unchanged pages
+    
+    def select(url_hash: str, signature: str) -> bool:
+        signatures[url_hash] = signature
+        if previous.is_current(url_hash, signature, EXTRACTOR_VERSION) and previous.entries[url_hash][2]:
+            carried[url_hash] = previous.entries[url_hash]
+            return False
+        return True
+    
+    # Archives are selected while they are streamed, the other corpora are scanned here
+    tasks, total = corpus.scan(select)
+    if isinstance(corpus, DirectoryCorpus) and workers > 1:
+        # Workers read and decompress the files themselves
+        extract = extract_html_file
+    else:
+        if isinstance(corpus, DirectoryCorpus):
+            tasks = map(read_html_file, tasks)
+        tasks, extract = prefetch(tasks, prefetch_size), extract_page
+    extract = partial(extract, engine=engine)
+    
+    pool = None
+    if workers > 1:
+        # Tasks are dispatched in chunks, unordered results are written as soon as any worker finishes them
+        logger.info(f"Extracting with {workers} worker processes | Chunk size: {chunksize} | Ordered: {ordered}")
+        pool = Pool(workers, initializer=init_worker)
+        results = (pool.imap if ordered else pool.imap_unordered)(extract, tasks, chunksize=chunksize)
+    else:
+        results = map(extract, tasks)
+    
+    # Rows go straight into the merged output (TSV, or Parquet for a .parquet path) - no per-file CSVs to merge.
+    # It is written next to the previous one and replaces it at the end
+    temporary_output = os.path.join(os.path.dirname(merged_output), f".tmp-{os.path.basename(merged_output)}")
+    writer = open_writer(temporary_output, COLUMNS)
+    extracted, completed = 0, False
+    try:
+        for file_hash, extracted_info in tqdm(results, total=total, desc="Extracting pages", unit="pages"):
+            # Add LINK to extracted_info
+            extracted_info['LINK'] = url_hashes.get(file_hash, '')
+            writer.write([str(extracted_info.get(column, '')) for column in COLUMNS])
+            extracted += 1
+            if extracted_info['LINK']:
+                # Rows without a LINK cannot be matched on the next run, their pages are always extracted again
+                manifest.record(file_hash, signatures[file_hash], EXTRACTOR_VERSION, extracted_info['LINK'])
         
-        csv_filename = file_hash + '.csv'
-        csv_path = os.path.join(output_folder, csv_filename)
-        
-        if not header:
-            header = '\t'.join(extracted_info.keys()) + '\n'
-        
-        try:
-            with open(csv_path, 'w', encoding='utf-8') as f:
-                row = '\t'.join(str(value) for value in extracted_info.values()) + '\n'
-                f.write(header)
-                f.write(row)
-        except Exception as e:
-            logger.error(f"Error saving extracted data to {csv_path}: {e}")
-            logger.error(f"Extracted data: {extracted_info}")
-        #logger.info(f"Saved extracted data to {csv_path}")
-    
-    merge_files(output_folder, merged_output)
+        # Only known once the whole corpus was scanned
+        kept_links = {link for _, _, link in carried.values()}
+        if kept_links:
+            for row in iter_rows(merged_output):
+                if row[-1] in kept_links:
+                    writer.write(row)
+        completed = True
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+        writer.close()
+        if not completed:
+            # A broken archive or an interrupted run leaves the previous output and manifest as they were
+            os.remove(temporary_output)
+    
+    for url_hash, entry in carried.items():
+        manifest.record(url_hash, *entry)
+    os.replace(temporary_output, merged_output)
+    manifest.save()
+    if skip_processed:
+        logger.info(f"Unchanged: {len(carried)} | New or changed: {extracted} | Deleted: {len(set(previous.entries) - set(signatures))}")
+    logger.info(f"Saved {writer.rows} rows to {merged_output} ({writer.rows - extracted} carried over, {extracted} extracted)")
 
 def main():
     parser = argparse.ArgumentParser(description="Extract and process HTML files.")
-    parser.add_argument("--data", default="data", help="Path to the folder containing HTML files")
-    parser.add_argument("--output-folder", default="extracted_data_single_test", help="Path to the output folder for extracted data")
+    parser.add_argument("--data", default="data", help="Folder of HTML files (.html, .html.gz or .html.zst), or a tar archive of them (.tar, .tar.gz, .tgz, .tar.zst)")
     parser.add_argument("--url-hashes", default="url_hashes.txt", help="Path to the URL hashes file")
-    parser.add_argument("--merged-output", default=os.path.join(os.getcwd(), "_merged_data_test.csv"), help="Path and file name for the merged output CSV")
-    parser.add_argument("--skip-processed", action="store_true", help="Skip processed files")
+    parser.add_argument("--merged-output", default=os.path.join(os.getcwd(), "_merged_data_test.csv"), help="Path and file name for the merged output - TSV, or Parquet when it ends with .parquet")
+    parser.add_argument("--skip-processed", action="store_true", help="Incremental - keep the rows of pages unchanged since the last run (<merged-output>.manifest.tsv), extract only new or changed pages and drop deleted ones")
+    parser.add_argument("--content-hash", action="store_true", help="Detect changed pages by their sha256 instead of size and modification time")
+    parser.add_argument("--page-store", action="store_true", help="Read pages from the crawler's compressed segment store (index.tsv + segments) in --data")
+    parser.add_argument("--workers", type=int, default=1, help="Number of extraction processes (default: extract in this process)")
+    parser.add_argument("--chunksize", type=int, default=16, help="Pages sent to a worker per task")
+    parser.add_argument("--ordered", action="store_true", help="Write the results in input order instead of as soon as they are done")
+    parser.add_argument("--prefetch", type=int, default=64, help="Pages read and decompressed ahead of extraction by a background thread")
+    parser.add_argument("--engine", choices=list(EXTRACT_ENGINES), default="regex", help="regex: one findall per field, single-pass: one scan of the page for all fields (same output)")
     args = parser.parse_args()
 
     logger.info("Starting extraction ...")
-    process_html_files(args.data, args.output_folder, args.url_hashes, args.merged_output, args.skip_processed)
-    logger.info(f"Extraction complete. Check the output folder for results. Merged data saved to {args.merged_output}")
+    process_html_files(args.data, args.url_hashes, args.merged_output, args.skip_processed, args.page_store, args.workers, args.chunksize, args.ordered, args.engine, args.content_hash, args.prefetch)
+    logger.info(f"Extraction complete. Merged data saved to {args.merged_output}")
 
 if __name__ == "__main__":
     logger.remove()
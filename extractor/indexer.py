@@ -1,15 +1,21 @@
 import os
 import json
-import csv
 import re
+import heapq
+import shutil
 import argparse
+from itertools import groupby
+from operator import itemgetter
 from collections import defaultdict
+from multiprocessing import Pool
 from loguru import logger
 from enum import Enum
 from tqdm import tqdm
 import html
 from functools import wraps
 import time
+from dataset import count_rows, iter_rows, partitions, iter_partition
+from postings import PostingsWriter
 
 
 def timeit(func):
@@ -28,40 +34,153 @@ class Regexes(Enum):
     SPECIAL_CHARS = r'[^A-Za-z0-9]'
     MULTIPLE_SPACES = r'\s{2,}'
 
+# Rough size of one posting held in a block (list slot, tuple and two ints) - the memory budget is counted in these
+POSTING_BYTES = 100
+
+class JsonObjectWriter:
+    """Writes one JSON object key by key, formatted exactly like json.dump of the whole dict would."""
+
+    def __init__(self, path: str):
+        self.file = open(path, 'w', buffering=1024 * 1024)
+        self.file.write('{')
+        self.separator = ''
+
+    def write(self, key, value):
+        self.file.write(f'{self.separator}{json.dumps(str(key))}: {value if isinstance(value, str) else json.dumps(value)}')
+        self.separator = ', '
+
+    def close(self):
+        self.file.write('}')
+        self.file.close()
+
+class DocumentLinesWriter:
+    """documents.json entries of a partial index, one `doc_id<TAB>json` line each - renumbered when merged."""
+
+    def __init__(self, path: str):
+        self.file = open(path, 'w', buffering=1024 * 1024)
+
+    def write(self, key, value):
+        self.file.write(f"{key}\t{json.dumps(value)}\n")
+
+    def close(self):
+        self.file.close()
+
+def write_block(path: str, block: dict):
+    """One line per word_id in ascending order - `word_id<TAB>doc_id:tf doc_id:tf ...`, doc_ids ascending."""
+    with open(path, 'w', buffering=1024 * 1024) as f:
+        for word_id in sorted(block):
+            f.write(f"{word_id}\t{' '.join(f'{doc_id}:{tf}' for doc_id, tf in block[word_id])}\n")
+
+def read_block(path: str):
+    """Yields (word_id, [(doc_id, tf)]) of a block file."""
+    with open(path, 'r') as f:
+        for line in f:
+            word_id, postings = line.rstrip('\n').split('\t')
+            yield int(word_id), [tuple(map(int, posting.split(':'))) for posting in postings.split(' ')]
+
 class Indexer:
-    def __init__(self, data_folder: str, output_folder: str, input_file: str):
+    """
+    Single-pass in-memory indexing (SPIMI) - postings of the documents are collected in a block until it holds
+    `memory_mb` worth of them, the block is written to disk sorted by word_id, and at the end all blocks are merged
+    k-way into postings.bin (and posting_list.json with `json_postings`). Documents are streamed to documents.json as they are read, so only the
+    vocabulary and one block are ever in memory.
+    """
+
+    def __init__(self, data_folder: str, output_folder: str, input_file: str, memory_mb: int = 256, workers: int = 1, json_postings: bool = False):
         self.data_folder = data_folder
         self.output_folder = output_folder
         self.input_file = input_file
-        self.documents = {}
-        self.word_ids = {}
-        self.posting_list = defaultdict(lambda: defaultdict(int))
-        self.curr_doc_id = 0
+        self.word_ids = {}  # word_id -> word, saved as word_ids.json
+        self.word_to_id = {}  # word -> word_id, kept up to date with word_ids instead of rebuilt per document
+        self.block = defaultdict(list)  # word_id -> [(doc_id, tf)] since the last flush
+        self.block_postings = 0
+        self.block_files = []
+        self.memory_budget = memory_mb * 1024 * 1024
+        self.block_folder = os.path.join(output_folder, 'blocks')
+        self.documents_count = 0
+        self.workers = workers
+        self.json_postings = json_postings
 
     @timeit
     def index_data(self):
         csv_file = os.path.join(self.data_folder, self.input_file)
-        num_of_rows = 0
-        with open(csv_file, 'r', encoding='utf-8') as f:
-            _dmp_data = list(csv.reader(f))
-            num_of_rows = len(_dmp_data)
-
-        del _dmp_data
+        num_of_rows = count_rows(csv_file)  # Line count of the TSV or the Parquet footer, nothing is kept in memory
+        logger.info(f"Indexing {num_of_rows} rows of {csv_file} | Memory budget: {self.memory_budget // (1024 * 1024)} MB")
 
-        with open(csv_file, 'r', encoding='utf-8') as f:
-            next(f)  # Skip the header line
+        os.makedirs(self.output_folder, exist_ok=True)
+        if os.path.exists(self.block_folder):
+            shutil.rmtree(self.block_folder)  # Left over from an interrupted run
+        os.makedirs(self.block_folder)
 
-            for idx, line in enumerate(f): # tqdm(enumerate(f), desc="Indexing data...", unit=" line", total=num_of_rows):
-                row = line.strip().split(sep='\t')
-                if len(row) >= 2: # Skip empty lines, there is at least Link every time
-                    name, link = row[0], row[-1]
-                    self.documents[idx] = {"name": html.unescape(name), "link": link}
-                    self.process_text(idx, row)
-                    #logger.info(f"Assigned doc_id {idx} to {name}")
-                    
+        if self.workers > 1:
+            self.index_partitions(csv_file)
+        else:
+            documents = JsonObjectWriter(os.path.join(self.output_folder, 'documents.json'))
+            try:
+                # Merged TSV or Parquet output of extractor.py, rows in header order either way
+                self.index_rows(enumerate(iter_rows(csv_file)), documents) # tqdm(enumerate(iter_rows(csv_file)), desc="Indexing data...", unit=" line", total=num_of_rows)
+            finally:
+                documents.close()
 
         self.save_output()
 
+    def index_rows(self, rows, documents) -> int:
+        """Indexes (doc_id, row) pairs, the documents go to `documents` - returns the number of rows read."""
+        count = 0
+        for idx, row in rows:
+            count += 1
+            if len(row) >= 2: # Skip empty lines, there is at least Link every time
+                name, link = row[0], row[-1]
+                documents.write(idx, {"name": html.unescape(name), "link": link})
+                self.documents_count += 1
+                self.process_text(idx, row)
+                #logger.info(f"Assigned doc_id {idx} to {name}")
+                if self.block_postings * POSTING_BYTES >= self.memory_budget:
+                    self.flush_block()
+        return count
+
+    def index_partitions(self, csv_file: str):
+        """
+        Parallel indexing - every worker builds a partial index of one contiguous partition of the rows with its own
+        word_ids and doc_ids from 0. Their vocabularies, taken in partition order and each in its order of first
+        occurrence, give the same global word_ids as a serial run, and the doc_ids are shifted by the rows before.
+        """
+        parts = partitions(csv_file, self.workers)
+        memory_mb = max(1, self.memory_budget // (1024 * 1024) // len(parts))
+        tasks = [(csv_file, part, os.path.join(self.block_folder, f"partition-{number:03d}"), memory_mb) for number, part in enumerate(parts)]
+        logger.info(f"Indexing {len(parts)} partitions with {min(self.workers, len(parts))} worker processes")
+
+        with Pool(min(self.workers, len(parts))) as pool:
+            partial_indexes = pool.map(index_partition, tasks)
+
+            remap_tasks, doc_offset = [], 0
+            for rows, words, block_files, _ in partial_indexes:
+                mapping = []
+                for word in words:
+                    word_id = self.word_to_id.get(word)
+                    if word_id is None:
+                        word_id = len(self.word_ids)
+                        self.word_ids[word_id] = word
+                        self.word_to_id[word] = word_id
+                    mapping.append(word_id)
+                remap_tasks.append((block_files, mapping, doc_offset))
+                doc_offset += rows
+            pool.map(remap_blocks, remap_tasks)
+
+        documents = JsonObjectWriter(os.path.join(self.output_folder, 'documents.json'))
+        try:
+            for (_, _, _, documents_file), (_, _, doc_offset) in zip(partial_indexes, remap_tasks):
+                with open(documents_file, 'r') as f:
+                    for line in f:
+                        doc_id, document = line.rstrip('\n').split('\t', 1)
+                        documents.write(doc_offset + int(doc_id), document)
+                        self.documents_count += 1
+        finally:
+            documents.close()
+
+        # Partitions and their blocks are in document order, like the blocks of a serial run
+        self.block_files = [block_file for _, _, block_files, _ in partial_indexes for block_file in block_files]
+
     @timeit
     def clean_text(self, row: list[str]) -> list[str]:
         text = ' '.join(row[1:-1]).lower()
@@ -77,48 +196,105 @@ class Indexer:
         words = self.clean_text(row)
         word_count = defaultdict(int)
         
-        # Create a reverse mapping of words to word_ids for faster lookup
-        word_to_id = {word: id for id, word in self.word_ids.items()}
-        
         for word in words:
-            # Use the reverse mapping for faster word_id lookup
-            if word in word_to_id:
-                word_id = word_to_id[word]
-            else:
+            word_id = self.word_to_id.get(word)
+            if word_id is None:
                 word_id = len(self.word_ids)
                 self.word_ids[word_id] = word
-                word_to_id[word] = word_id
+                self.word_to_id[word] = word_id
             
             # Count occurrences of each word (by word_id) using defaultdict
             word_count[word_id] += 1
         
-        # Update the posting list with the word counts for this document
+        # Add the word counts of this document to the current block - doc_ids only grow, postings stay sorted
         for word_id, count in word_count.items():
-            self.posting_list[word_id][doc_id] = count
+            self.block[word_id].append((doc_id, count))
+        self.block_postings += len(word_count)
 
-    def save_output(self):
-        os.makedirs(self.output_folder, exist_ok=True)
+    def flush_block(self):
+        path = os.path.join(self.block_folder, f"block-{len(self.block_files):05d}.tsv")
+        write_block(path, self.block)
+        logger.debug(f"Flushed {self.block_postings} postings of {len(self.block)} words to {path}")
+        self.block_files.append(path)
+        self.block = defaultdict(list)
+        self.block_postings = 0
 
-        with open(os.path.join(self.output_folder, 'documents.json'), 'w') as f:
-            json.dump(self.documents, f)
+    def merge_blocks(self):
+        """
+        k-way merge of the block files and the last block (still in memory) - yields (word_id, [(doc_id, tf)]) in
+        word_id order. Blocks hold consecutive document ranges, so the postings of a word_id concatenated in block
+        order stay sorted by doc_id.
+        """
+        last_block = ((word_id, self.block[word_id]) for word_id in sorted(self.block))
+        blocks = [read_block(block_file) for block_file in self.block_files] + [last_block]
+        # heapq.merge is stable - equal word_ids come out in block order
+        for word_id, entries in groupby(heapq.merge(*blocks, key=itemgetter(0)), key=itemgetter(0)):
+            yield word_id, [posting for _, postings in entries for posting in postings]
 
+    def save_output(self):
         with open(os.path.join(self.output_folder, 'word_ids.json'), 'w') as f:
             json.dump(self.word_ids, f)
 
-        with open(os.path.join(self.output_folder, 'posting_list.json'), 'w') as f:
-            json.dump({str(k): v for k, v in self.posting_list.items()}, f)
+        logger.info(f"Merging {len(self.block_files) + 1} posting blocks")
+        postings_writer = PostingsWriter(os.path.join(self.output_folder, 'postings.bin'))
+        posting_list = JsonObjectWriter(os.path.join(self.output_folder, 'posting_list.json')) if self.json_postings else None
+        try:
+            for word_id, postings in self.merge_blocks():
+                postings_writer.add(word_id, postings)
+                if posting_list is not None:
+                    posting_list.write(word_id, '{' + ', '.join(f'"{doc_id}": {tf}' for doc_id, tf in postings) + '}')
+        finally:
+            if posting_list is not None:
+                posting_list.close()
+        postings_writer.close(list(self.word_ids.values()))
+        shutil.rmtree(self.block_folder)
+
+        logger.info(f"Indexing complete. {self.documents_count} documents, {len(self.word_ids)} words. Output saved to {self.output_folder}")
+
+def index_partition(task) -> tuple:
+    """Worker - partial index of one partition, returns (rows, words in word_id order, block files, documents file)."""
+    csv_file, partition, folder, memory_mb = task
+    indexer = Indexer(None, folder, None, memory_mb)
+    indexer.block_folder = folder
+    os.makedirs(folder)
+    documents_file = os.path.join(folder, 'documents.tsv')
+    documents = DocumentLinesWriter(documents_file)
+    try:
+        rows = indexer.index_rows(enumerate(iter_partition(csv_file, partition)), documents)
+    finally:
+        documents.close()
+    if indexer.block:
+        indexer.flush_block()
+    return rows, list(indexer.word_ids.values()), indexer.block_files, documents_file
 
-        logger.info(f"Indexing complete. Output saved to {self.output_folder}")
+def remap_blocks(task):
+    """Worker - rewrites the blocks of a partial index with global word_ids and doc_ids, sorted by the global word_id."""
+    block_files, mapping, doc_offset = task
+    for block_file in block_files:
+        lines = []
+        with open(block_file, 'r') as f:
+            for line in f:
+                word_id, postings = line.rstrip('\n').split('\t')
+                lines.append((mapping[int(word_id)], postings))
+        lines.sort(key=itemgetter(0))
+        with open(block_file, 'w', buffering=1024 * 1024) as f:
+            for word_id, postings in lines:
+                if doc_offset:
+                    postings = ' '.join(f"{int(doc_id) + doc_offset}:{tf}" for doc_id, tf in (posting.split(':') for posting in postings.split(' ')))
+                f.write(f"{word_id}\t{postings}\n")
 
 def main():
     parser = argparse.ArgumentParser(description="Index data from CSV file.")
     parser.add_argument("--data", default=os.getcwd(), help="Path to the folder containing input CSV file")
-    parser.add_argument("--input", default="_merged_data.csv", help="Name of the input CSV file")
+    parser.add_argument("--input", default="_merged_data.csv", help="Name of the input file - merged TSV, or Parquet when it ends with .parquet")
     parser.add_argument("--output", default="indexed_data", help="Path to the output folder for indexed data")
+    parser.add_argument("--memory-mb", type=int, default=256, help="Postings held in memory before a sorted block is written to disk")
+    parser.add_argument("--workers", type=int, default=1, help="Index partitions of the input in this many processes (same index as a serial run)")
+    parser.add_argument("--json-postings", action="store_true", help="Also write the postings as posting_list.json (the format before postings.bin)")
 
     args = parser.parse_args()
 
-    indexer = Indexer(args.data, args.output, args.input)
+    indexer = Indexer(args.data, args.output, args.input, args.memory_mb, args.workers, args.json_postings)
     indexer.index_data()
 
 if __name__ == "__main__":
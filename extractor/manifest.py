@@ -0,0 +1,63 @@
+"""
+Manifest of the pages behind a merged output - lets extractor.py --skip-processed extract only new or changed pages.
+
+Every page is recorded by url hash with the signature of its source (size and mtime of the HTML file or archive
+member, its sha256, or its location in the page store), the extractor version that produced its row and the row's LINK.
+"""
+import os
+import hashlib
+
+
+def manifest_path(merged_output: str) -> str:
+    return f"{merged_output}.manifest.tsv"
+
+
+def file_signature(stat_result: os.stat_result) -> str:
+    return f"{stat_result.st_size}:{stat_result.st_mtime_ns}"
+
+
+def content_signature(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+    return f"sha256:{digest.hexdigest()}"
+
+
+def data_signature(data: bytes) -> str:
+    return f"sha256:{hashlib.sha256(data).hexdigest()}"
+
+
+def store_signature(segment: str, offset: int, length: int) -> str:
+    # Segments are append-only - a re-crawled page is written at a new offset
+    return f"{segment}:{offset}:{length}"
+
+
+class ExtractionManifest:
+    def __init__(self, path: str):
+        self.path = path
+        self.entries: dict = {}  # url_hash -> (signature, version, link)
+
+    @classmethod
+    def load(cls, path: str) -> 'ExtractionManifest':
+        manifest = cls(path)
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    url_hash, signature, version, link = line.rstrip('\n').split('\t', 3)
+                    manifest.entries[url_hash] = (signature, int(version), link)
+        return manifest
+
+    def is_current(self, url_hash: str, signature: str, version: int) -> bool:
+        entry = self.entries.get(url_hash)
+        return entry is not None and entry[0] == signature and entry[1] == version
+
+    def record(self, url_hash: str, signature: str, version: int, link: str):
+        self.entries[url_hash] = (signature, version, link)
+
+    def save(self):
+        temporary_path = f"{self.path}.tmp"
+        with open(temporary_path, 'w', encoding='utf-8') as f:
+            for url_hash, (signature, version, link) in self.entries.items():
+                f.write(f"{url_hash}\t{signature}\t{version}\t{link}\n")
+        os.replace(temporary_path, self.path)
@@ -0,0 +1,165 @@
+"""
+Binary posting lists of the index (postings.bin) - written by indexer.py, memory-mapped by the search engine and
+precalc.py, so opening the index reads only the header and a query touches only the postings of its words.
+
+Layout, little endian, every table 8 byte aligned:
+    header          magic, version, number of words and the positions of the tables below
+    postings        per word_id: df doc_id deltas, then df tfs - unsigned LEB128 varints
+    offsets         u64 * (words + 1) - start of the postings of every word_id, the last one ends the region
+    dfs             u32 * words - documents per word_id
+    word offsets    u64 * (words + 1) - start of every word_id's word in the words blob
+    sorted ids      u32 * words - word_ids in byte order of their words, the term dictionary that is binary searched
+    words           utf-8 words concatenated in word_id order
+"""
+import mmap
+import struct
+
+
+MAGIC = b'VINFPST1'
+VERSION = 1
+HEADER = struct.Struct('<8sIIQQQQQQ')  # magic, version, reserved, words, offsets, dfs, word offsets, sorted ids, words blob
+
+
+def encode_varints(values, out: bytearray):
+    for value in values:
+        while value >= 0x80:
+            out.append((value & 0x7f) | 0x80)
+            value >>= 7
+        out.append(value)
+
+
+def decode_varints(buffer, position: int, count: int) -> tuple:
+    """Returns (values, position after them)."""
+    values = []
+    for _ in range(count):
+        value = shift = 0
+        while True:
+            byte = buffer[position]
+            position += 1
+            value |= (byte & 0x7f) << shift
+            if byte < 0x80:
+                break
+            shift += 7
+        values.append(value)
+    return values, position
+
+
+class PostingsWriter:
+    """Streams the posting lists in ascending word_id order, the tables follow on close()."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.file = open(path, 'wb', buffering=1024 * 1024)
+        self.file.write(b'\0' * HEADER.size)
+        self.position = HEADER.size
+        self.offsets = []
+        self.dfs = []
+
+    def add(self, word_id: int, postings: list):
+        """postings - (doc_id, tf) pairs sorted by doc_id."""
+        if word_id < len(self.offsets):
+            raise ValueError(f"Postings of word_id {word_id} added out of order")
+        while len(self.offsets) <= word_id:  # word_ids without postings get an empty list
+            self.offsets.append(self.position)
+            self.dfs.append(0)
+        self.dfs[word_id] = len(postings)
+
+        doc_ids = [doc_id for doc_id, _ in postings]
+        data = bytearray()
+        encode_varints([doc_id - previous for doc_id, previous in zip(doc_ids, [0] + doc_ids)], data)
+        encode_varints([tf for _, tf in postings], data)
+        self.file.write(data)
+        self.position += len(data)
+
+    def _write_table(self, fmt: str, values: list) -> int:
+        self.file.write(b'\0' * (-self.position % 8))
+        self.position += -self.position % 8
+        start = self.position
+        data = struct.pack(f'<{len(values)}{fmt}', *values)
+        self.file.write(data)
+        self.position += len(data)
+        return start
+
+    def close(self, words: list):
+        """words - the word of every word_id (word_ids.json in order)."""
+        while len(self.offsets) < len(words):
+            self.offsets.append(self.position)
+            self.dfs.append(0)
+        encoded = [word.encode('utf-8') for word in words]
+        word_offsets = [0]
+        for word in encoded:
+            word_offsets.append(word_offsets[-1] + len(word))
+
+        offsets_position = self._write_table('Q', self.offsets + [self.position])
+        dfs_position = self._write_table('I', self.dfs)
+        word_offsets_position = self._write_table('Q', word_offsets)
+        sorted_ids_position = self._write_table('I', sorted(range(len(encoded)), key=encoded.__getitem__))
+        words_position = self.position
+        self.file.write(b''.join(encoded))
+
+        self.file.seek(0)
+        self.file.write(HEADER.pack(MAGIC, VERSION, 0, len(words), offsets_position, dfs_position, word_offsets_position, sorted_ids_position, words_position))
+        self.file.close()
+
+
+class PostingsReader:
+    """Memory-mapped postings.bin - word lookups binary search the sorted ids, postings are decoded on request."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.file = open(path, 'rb')
+        self.buffer = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, _, self.words, offsets, dfs, word_offsets, sorted_ids, self.words_position = HEADER.unpack_from(self.buffer)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path} is not a version {VERSION} postings file")
+
+        view = memoryview(self.buffer)
+        self.offsets = view[offsets:offsets + 8 * (self.words + 1)].cast('Q')
+        self.dfs = view[dfs:dfs + 4 * self.words].cast('I')
+        self.word_offsets = view[word_offsets:word_offsets + 8 * (self.words + 1)].cast('Q')
+        self.sorted_ids = view[sorted_ids:sorted_ids + 4 * self.words].cast('I')
+
+    def __len__(self):
+        return self.words
+
+    def _word_bytes(self, word_id: int) -> bytes:
+        start = self.words_position + self.word_offsets[word_id]
+        return self.buffer[start:self.words_position + self.word_offsets[word_id + 1]]
+
+    def word(self, word_id: int) -> str:
+        return self._word_bytes(word_id).decode('utf-8')
+
+    def word_id(self, word: str):
+        """word_id of `word`, None when it is not in the index."""
+        target = word.encode('utf-8')
+        low, high = 0, self.words
+        while low < high:
+            middle = (low + high) // 2
+            if self._word_bytes(self.sorted_ids[middle]) < target:
+                low = middle + 1
+            else:
+                high = middle
+        if low < self.words and self._word_bytes(self.sorted_ids[low]) == target:
+            return self.sorted_ids[low]
+        return None
+
+    def df(self, word_id: int) -> int:
+        return self.dfs[word_id]
+
+    def postings(self, word_id: int) -> dict:
+        """doc_id -> tf of one word, in doc_id order."""
+        count = self.dfs[word_id]
+        deltas, position = decode_varints(self.buffer, self.offsets[word_id], count)
+        tfs, _ = decode_varints(self.buffer, position, count)
+        doc_ids, doc_id = [], 0
+        for delta in deltas:
+            doc_id += delta
+            doc_ids.append(doc_id)
+        return dict(zip(doc_ids, tfs))
+
+    def close(self):
+        # The views have to go before the map can be closed
+        for table in [self.offsets, self.dfs, self.word_offsets, self.sorted_ids]:
+            table.release()
+        self.buffer.close()
+        self.file.close()
@@ -6,14 +6,14 @@ import math
 from loguru import logger
 from collections import defaultdict
 from typing import List, Dict, Optional, Union
+from postings import PostingsReader
 
 
 class PreCompute:
     def __init__(self, file_path: str):
         self.file_path = file_path
         self.documents = {}
-        self.word_ids = {}
-        self.posting_list = {}
+        self.postings: PostingsReader = None
         
         self.load()
         
@@ -22,11 +22,7 @@ class PreCompute:
         with open(os.path.join(os.getcwd(), self.file_path, 'documents.json'), 'r', encoding='utf-8') as f:
             self.documents = json.load(f)
         
-        with open(os.path.join(os.getcwd(), self.file_path, 'word_ids.json'), 'r', encoding='utf-8') as f:
-            self.word_ids = json.load(f)
-            
-        with open(os.path.join(os.getcwd(), self.file_path, 'posting_list.json'), 'r', encoding='utf-8') as f:
-            self.posting_list = json.load(f)
+        self.postings = PostingsReader(os.path.join(os.getcwd(), self.file_path, 'postings.bin'))
 
     
     def save_document(self):
@@ -35,11 +31,14 @@ class PreCompute:
     
 
     def _compute(self):
+        # One pass over the posting lists in word_id order - the same sums, in the same order, as per document
+        lengths = defaultdict(float)
+        for word_id in range(len(self.postings)):
+            for doc_id, tf in self.postings.postings(word_id).items():
+                lengths[doc_id] += math.log10(1 + tf)
+        
         for doc_id in self.documents.keys():
-            length = 0
-            for _, doc_dict in self.posting_list.items():
-                if doc_id in doc_dict:
-                    length += math.log10(1 + doc_dict[doc_id])
+            length = lengths.get(int(doc_id), 0)
             
             self.documents[doc_id]['wf_length'] = length
             logger.info(f'Computed length for {doc_id}: {length}')
@@ -4,16 +4,15 @@ import re
 from loguru import logger
 import math
 import os
+from postings import PostingsReader
 
 
 class SearchEngine:
-    def __init__(self, index_folder: str, word_index_file: str, documents_file: str, posting_list_file: str):
+    def __init__(self, index_folder: str, documents_file: str, postings_file: str):
         self.index_folder = os.path.join(os.getcwd(), index_folder)
         self.documents_file = os.path.join(self.index_folder, documents_file)
-        self.posting_list_file = os.path.join(self.index_folder, posting_list_file)
-        self.word_index_file = os.path.join(self.index_folder, word_index_file)
-        self.word_ids = {}
-        self.posting_list = {}
+        self.postings_file = os.path.join(self.index_folder, postings_file)
+        self.postings: PostingsReader = None
         self.documents = {}
         
         self.load_indexes()
@@ -22,13 +21,9 @@ class SearchEngine:
 
     def load_indexes(self):
         logger.info(f"Loading index...")
-        logger.info(f"Loading word index...")
-        with open(self.word_index_file, 'r', encoding='utf-8') as f:
-            self.word_ids = json.load(f)
-        
-        logger.info(f"Loading posting list...")
-        with open(self.posting_list_file, 'r', encoding='utf-8') as f:
-            self.posting_list = json.load(f)
+        logger.info(f"Mapping word index and posting lists...")
+        # Memory-mapped - only the postings of the query words are ever read
+        self.postings = PostingsReader(self.postings_file)
             
         logger.info(f"Loading documents...")
         with open(self.documents_file, 'r', encoding='utf-8') as f:
@@ -37,11 +32,8 @@ class SearchEngine:
         logger.success(f"Index loaded successfully")
 
         
-    def _word_to_id(self, word: str) -> Union[str, None]:
-        for word_id, word_str in self.word_ids.items():
-            if word_str == word:
-                return word_id
-        return None
+    def _word_to_id(self, word: str) -> Union[int, None]:
+        return self.postings.word_id(word)
         
     def search_index(self, query_words: List[str]) -> List[Dict[str, str]]:
         results = []
@@ -51,7 +43,7 @@ class SearchEngine:
 
     
     def __compute_idf_query(self, ) -> Dict[str, int]:
-        idf_values = {word_id: math.log10(self.total_documents / len(self.posting_list[str(word_id)])) for word_id in query_words}
+        idf_values = {word_id: math.log10(self.total_documents / self.postings.df(word_id)) for word_id in query_words}
         return idf_values
 
     def __clean_split_query(self, query: str) -> List[str]:
@@ -60,10 +52,10 @@ class SearchEngine:
         _text_arr = _text.split()
         return _text_arr
     
-    def _set_of_docs_containing_word(self, word_list: List[str]) -> Set[str]:
+    def _set_of_docs_containing_word(self, word_list: List[int], posting_list: Dict[int, Dict[int, int]]) -> Set[int]:
         sets_of_docs_containing_words = []
         for word_id in word_list:
-            docs_containing_word = set(self.posting_list[word_id].keys())
+            docs_containing_word = set(posting_list[word_id].keys())
             sets_of_docs_containing_words.append(docs_containing_word)
         
         # Intersect all sets to get documents containing all words
@@ -74,14 +66,17 @@ class SearchEngine:
     def preprocess_document(self, query_info: Dict[str, Dict[str, float]]):
         _doc_info = {}
         
-        docs_containing_all_words = self._set_of_docs_containing_word(query_info.keys())
+        # Postings of the query words, decoded once per query
+        posting_list = {word_id: self.postings.postings(word_id) for word_id in query_info.keys()}
+        docs_containing_all_words = self._set_of_docs_containing_word(query_info.keys(), posting_list)
         
         for word_id in query_info.keys():
-            for doc_id_str in docs_containing_all_words:
+            for doc_id in docs_containing_all_words:
+                doc_id_str = str(doc_id)
                 if doc_id_str not in _doc_info:
                     _doc_info[doc_id_str] = {'total_score': 0}
                 
-                doc_tf = self.posting_list[word_id][doc_id_str]
+                doc_tf = posting_list[word_id][doc_id]
                 wf_log = 1 + math.log10(doc_tf)
                 wtd = wf_log / self.documents[doc_id_str]['wf_length']
                 score = wtd * query_info[word_id]['wtq']
@@ -115,7 +110,7 @@ class SearchEngine:
         
         for word_id in _query_info.keys():
             tf = _query_info[word_id]['tf']
-            df = len(self.posting_list[str(word_id)])
+            df = self.postings.df(word_id)
             idf = math.log10(self.total_documents / df)
             tf_idf = tf * idf
             
@@ -159,7 +154,7 @@ class SearchEngine:
 
 
 if __name__ == '__main__':
-    search_engine = SearchEngine('indexed_data', 'word_ids.json', 'documents_w_length.json', 'posting_list.json')
+    search_engine = SearchEngine('indexed_data', 'documents_w_length.json', 'postings.bin')
     
     search_engine.search()
 
@@ -17,14 +17,50 @@ from org.apache.lucene.search import IndexSearcher, BooleanQuery, BooleanClause,
 from org.apache.lucene.queryparser.classic import QueryParser
 from java.nio.file import Paths
 
+try:
+    import pyarrow.parquet as parquet
+except ImportError:
+    parquet = None
+
 __version__ = "0.1.5"
 
+# Extractor output - the Parquet dataset when there is one, the merged TSV otherwise
+DATA_FILE = "./data.parquet" if os.path.exists("./data.parquet") else "./data.csv"
+
 class DataLoader:
     
     SEP = '\t'
+    
+    # Columns of the extractor's merged output, in order
+    FIELDS = ['product_name', 'brands', 'packaging', 'categories', 'stores', 'countries_where_sold', 'nutri_score', 'nova_score',
+              'eco_score', 'ingredients', 'allergens', 'traces', 'additives', 'additives_analysis', 'link']
      
+    @staticmethod
+    def load_parquet(data_file: str):
+        if parquet is None:
+            raise ImportError(f"Reading {data_file} needs the 'pyarrow' package (pip install pyarrow)")
+        
+        logger.info(f"Loading extracted data from {data_file}...")
+        data_dict = {}
+        parquet_file = parquet.ParquetFile(data_file)
+        _id = 0
+        
+        # One record batch at a time, columns in file order like the TSV
+        with tqdm(total=parquet_file.metadata.num_rows, desc="Loading extracted data...", unit="products") as tqdm_bar:
+            for batch in parquet_file.iter_batches(batch_size=10_000):
+                for row in zip(*(column.to_pylist() for column in batch.columns)):
+                    data_dict[_id] = dict(zip(DataLoader.FIELDS, row))
+                    _id += 1
+                tqdm_bar.update(batch.num_rows)
+        
+        logger.success(f"Loaded {_id} / {parquet_file.metadata.num_rows} products from {data_file}")
+        return data_dict
+    
     @staticmethod
     def load_data(data_file: str):
+        if data_file.endswith('.parquet'):
+            return DataLoader.load_parquet(data_file)
+        
         data_dict = {}
         lines = []
         _file_len = 0
@@ -185,7 +221,7 @@ def _print_header():
     logger.info("#")
     logger.info("#\tDataset: Open Food Facts (https://world.openfoodfacts.org/)")
     logger.info("#")
-    logger.info(f"#\tSize of Processed Data: {os.path.getsize('./data.csv') / 1024 / 1024:.2f} MB")
+    logger.info(f"#\tSize of Processed Data: {os.path.getsize(DATA_FILE) / 1024 / 1024:.2f} MB")
     logger.info("#")
     logger.info("####################################################")
     logger.info("")
@@ -197,7 +233,7 @@ def main():
     
     index_dir = "./index"
     
-    lucene_search_engine = LuceneIndexSearchEngine(index_dir, "./data.csv")
+    lucene_search_engine = LuceneIndexSearchEngine(index_dir, DATA_FILE)
     
     try:
         